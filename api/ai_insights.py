@@ -4,6 +4,9 @@ AI insights endpoints for personality analysis, wellness, and recommendations
 
 from flask import Blueprint, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
+import logging
+
+logger = logging.getLogger(__name__)
 
 ai_bp = Blueprint('ai', __name__)
 
@@ -27,7 +30,7 @@ def get_personality():
             analyzer = EnhancedPersonalityAnalyzer(db_path)
             analysis = analyzer.generate_enhanced_personality(user_id)
             
-            print(f"Personality analysis result: confidence={analysis.get('confidence_score', 0)}")
+            logger.debug("Personality analysis result: confidence=%s", analysis.get('confidence_score', 0))
             
             # NEVER return sample data for authenticated users - return error for low confidence
             if analysis.get('confidence_score', 0) < 0.3:
@@ -42,9 +45,7 @@ def get_personality():
             return jsonify(analysis)
             
         except Exception as e:
-            print(f"Enhanced personality analysis failed: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Enhanced personality analysis failed: %s", e)
             
             # NEVER return sample data for authenticated users - return error instead
             return jsonify({
@@ -55,7 +56,7 @@ def get_personality():
             }), 500
             
     except Exception as e:
-        print(f"Personality endpoint error: {e}")
+        logger.warning("Personality endpoint error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @ai_bp.route('/wellness', methods=['GET'])
@@ -89,7 +90,7 @@ def get_wellness():
             
             return jsonify(wellness_data)
         except Exception as e:
-            print(f"Wellness analysis failed: {e}")
+            logger.warning("Wellness analysis failed: %s", e)
             # NEVER return sample data for authenticated users - return error instead
             return jsonify({
                 'error': 'Failed to generate wellness analysis',
@@ -220,7 +221,7 @@ def get_genre_evolution():
             
             return jsonify(evolution_data)
         except Exception as e:
-            print(f"Genre evolution analysis failed: {e}")
+            logger.warning("Genre evolution analysis failed: %s", e)
             # NEVER return sample data for authenticated users - return error instead
             return jsonify({
                 'error': 'Failed to generate genre evolution analysis',
@@ -263,7 +264,7 @@ def get_stress_analysis():
             return jsonify(stress_data)
             
         except Exception as enhanced_error:
-            print(f"Enhanced stress detector failed: {enhanced_error}")
+            logger.warning("Enhanced stress detector failed: %s", enhanced_error)
             
             # Fallback to wellness analyzer and convert format
             try:
@@ -287,7 +288,7 @@ def get_stress_analysis():
                 
                 return jsonify(stress_data)
             except Exception as wellness_error:
-                print(f"Wellness analyzer also failed: {wellness_error}")
+                logger.warning("Wellness analyzer also failed: %s", wellness_error)
                 # NEVER return sample data for authenticated users - return error instead
                 return jsonify({
                     'error': 'Failed to generate stress analysis',
@@ -295,7 +296,7 @@ def get_stress_analysis():
                 }), 500
         
     except Exception as e:
-        print(f"All stress analysis methods failed: {e}")
+        logger.warning("All stress analysis methods failed: %s", e)
         # NEVER return sample data for authenticated users - return error instead
         return jsonify({
             'error': 'Failed to generate stress analysis',
@@ -350,7 +351,7 @@ def get_recommendations():
             })
             
         except Exception as e:
-            print(f"Recommendations analysis failed: {e}")
+            logger.warning("Recommendations analysis failed: %s", e)
             # NEVER return sample data for authenticated users - return error instead
             return jsonify({
                 'error': 'Failed to generate recommendations',
@@ -467,7 +468,7 @@ def get_enhanced_stress_analysis():
         return jsonify(enhanced_stress_data)
         
     except Exception as e:
-        print(f"Enhanced stress analysis failed: {e}")
+        logger.warning("Enhanced stress analysis failed: %s", e)
         return jsonify({'error': str(e)}), 500
 @ai_bp.route('/genre-evolution-chart', methods=['GET'])
 @jwt_required()
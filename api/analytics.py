@@ -4,14 +4,70 @@ Analytics endpoints for audio features, genres, and listening patterns
 
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
-from modules.database import SpotifyDatabase
-from modules.api import SpotifyAPI
+from modules.database import SpotifyDatabase, get_thread_connection, get_data_version, get_library_stats
+from modules.api import SpotifyAPI, fetch_concurrently, claim_recently_played_poll, TOP_ITEMS_CACHE_TTL
+from modules.genre_extractor import submit_genre_extraction
+import logging
 import pandas as pd
 import json
 import os
 import sqlite3
-
-anlytics_bp = Blueprint('analytics', __name__)
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+analytics_bp = Blueprint('analytics', __name__)
+
+# Wrapped summaries per user, reused until new plays/tracks land or the TTL
+# lapses (the top tracks/artists come from the Spotify API and drift slowly)
+WRAPPED_CACHE_TTL = 600  # seconds
+_wrapped_cache = {}
+_wrapped_cache_lock = threading.Lock()
+
+# Audio feature summaries per user and time range. They only change when the top
+# tracks do, so they share the top-items TTL and skip building a client entirely
+_audio_features_cache = {}
+_audio_features_cache_lock = threading.Lock()
+
+# Heatmap payloads per user; the 7-day window slides with the clock, so these
+# also expire after a minute even when no new plays arrive
+PATTERNS_CACHE_TTL = 60  # seconds
+_patterns_cache = {}
+_patterns_cache_lock = threading.Lock()
+
+# Genre counts read from the database per user. Background extraction keeps adding
+# genres without touching plays/tracks, so these expire on a short TTL instead
+GENRES_CACHE_TTL = 60  # seconds
+_genres_cache = {}
+_genres_cache_lock = threading.Lock()
+
+# Queries run on every request; kept as constants so each thread's connection
+# reuses the compiled statement from sqlite3's statement cache
+_GENRES_EXIST_SQL = "SELECT EXISTS(SELECT 1 FROM genres)"
+_TOP_GENRES_SQL = '''
+    SELECT genre_name as genre, SUM(count) as count
+    FROM genres
+    WHERE genre_name IS NOT NULL AND genre_name != ''
+    GROUP BY genre_name
+    ORDER BY count DESC
+    LIMIT 10
+'''
+_RECENT_HISTORY_EXISTS_SQL = "SELECT EXISTS(SELECT 1 FROM listening_history WHERE user_id = ? AND played_at >= ?)"
+_HEATMAP_SQL = '''
+    SELECT
+        strftime('%w', datetime(played_at, 'localtime')) as day_of_week,
+        strftime('%H', datetime(played_at, 'localtime')) as hour_of_day,
+        COUNT(*) as play_count
+    FROM listening_history h
+    JOIN tracks t ON h.track_id = t.track_id
+    WHERE h.user_id = ?
+    AND h.played_at IS NOT NULL
+    AND h.source IN ('played', 'recently_played', 'current')
+    AND h.played_at >= ?
+    GROUP BY day_of_week, hour_of_day
+'''
 
 def get_user_spotify_api():
     """Get SpotifyAPI instance for current user - simplified version"""
@@ -23,26 +79,27 @@ def get_user_spotify_api():
         redirect_uri = 'http://127.0.0.1:3000/auth/callback'
 
         if not all([client_id, client_secret, spotify_access_token]):
-            print(f"❌ Missing credentials for SpotifyAPI")
+            logger.warning("Missing credentials for SpotifyAPI")
             return None
 
-        # Initialize SpotifyAPI
-        spotify_api = SpotifyAPI(client_id, client_secret, redirect_uri)
+        # Initialize SpotifyAPI; the user ID keeps its token and response caches
+        # separate from other users'
+        spotify_api = SpotifyAPI(client_id, client_secret, redirect_uri, user_id=claims.get('spotify_user_id'))
 
         # Set the access token directly
         if hasattr(spotify_api, 'sp') and spotify_api.sp and hasattr(spotify_api.sp, 'auth_manager'):
             token_info = {
                 'access_token': spotify_access_token,
                 'token_type': 'Bearer',
-                'expires_in': 3600,
+                'expires_at': claims.get('iat', int(time.time())) + 3600,  # Spotify token is issued with the JWT
                 'refresh_token': claims.get('spotify_refresh_token'),
                 'scope': spotify_api.scopes
             }
-            spotify_api.sp.auth_manager.token_info = token_info
+            spotify_api.use_token(token_info)
 
         return spotify_api
     except Exception as e:
-        print(f"❌ Error creating SpotifyAPI: {e}")
+        logger.warning("Error creating SpotifyAPI: %s", e)
         return None
 
 @analytics_bp.route('/audio-features')
@@ -50,32 +107,38 @@ def get_user_spotify_api():
 def get_audio_features():
     """Get audio features analysis for user's top tracks"""
     try:
-        print("🔍 DEBUG: Starting audio features endpoint...")
+        logger.debug("Starting audio features endpoint...")
         user_id = get_jwt_identity()
         time_range = request.args.get('time_range', 'medium_term')
-        print(f"🔍 DEBUG: User ID: {user_id}, Time range: {time_range}")
+        logger.debug("User ID: %s, Time range: %s", user_id, time_range)
+
+        cache_key = (user_id, time_range)
+        with _audio_features_cache_lock:
+            cached = _audio_features_cache.get(cache_key)
+        if cached and time.time() - cached[0] < TOP_ITEMS_CACHE_TTL:
+            return jsonify(cached[1])
 
         # Get user-specific SpotifyAPI instance
         spotify_api = get_user_spotify_api()
         if not spotify_api:
-            print("❌ DEBUG: Could not get SpotifyAPI instance")
+            logger.warning("Could not get SpotifyAPI instance")
             return jsonify({'audio_features': {}})
 
-        print("✅ DEBUG: SpotifyAPI instance created")
+        logger.debug("SpotifyAPI instance created")
 
         # Get top tracks using the same method as original (limit 5 for performance)
         top_tracks = spotify_api.get_top_tracks(time_range=time_range, limit=5)
         if not top_tracks:
             return jsonify({'audio_features': {}})
 
-        # Process tracks individually using get_audio_features_safely like original
+        # Fetch features for all tracks in one request (falls back per track on errors)
         audio_features_data = []
         track_details = []
+        audio_features_map = spotify_api.get_audio_features_batch([track['id'] for track in top_tracks if track.get('id')])
 
         for track in top_tracks:
             if track.get('id'):
-                # Use the safe method like the original implementation
-                features = spotify_api.get_audio_features_safely(track['id'])
+                features = audio_features_map.get(track['id'])
                 if features:
                     # Store individual track data for display
                     track_info = {
@@ -110,16 +173,17 @@ def get_audio_features():
             averages[feature] = round(sum(values) / len(values), 3) if values else 0
 
         # Return both averages and individual track data
-        return jsonify({
+        payload = {
             'audio_features': averages,
             'tracks': audio_features_data,  # Return full track data with features
             'tracks_analyzed': len(audio_features_data)
-        })
+        }
+        with _audio_features_cache_lock:
+            _audio_features_cache[cache_key] = (time.time(), payload)
+        return jsonify(payload)
         
     except Exception as e:
-        print(f"❌ DEBUG: Audio features error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Audio features error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @analytics_bp.route('/genres')
@@ -130,27 +194,28 @@ def get_genres():
         user_id = get_jwt_identity()
         db_path = f'/tmp/user_{user_id}_spotify_data.db'
 
+        with _genres_cache_lock:
+            cached = _genres_cache.get(user_id)
+        if cached and time.time() - cached[0] < GENRES_CACHE_TTL:
+            return jsonify({'genres': cached[1]})
+
         # Check if database exists and has genre data (like original)
         try:
-            with sqlite3.connect(db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT COUNT(*) FROM genres")
-                total_genres = cursor.fetchone()[0]
-
-                if total_genres > 0:
-                    # Use simple fallback query like original
-                    cursor.execute('''
-                        SELECT genre_name as genre, SUM(count) as count
-                        FROM genres
-                        WHERE genre_name IS NOT NULL AND genre_name != ''
-                        GROUP BY genre_name
-                        ORDER BY count DESC
-                        LIMIT 10
-                    ''')
-                    results = cursor.fetchall()
-                    if results:
-                        genre_data = {row[0]: row[1] for row in results}
-                        return jsonify({'genres': genre_data})
+            conn = get_thread_connection(db_path)
+            cursor = conn.cursor()
+            # Only whether any genres exist matters; stop at the first row instead of counting all
+            cursor.execute(_GENRES_EXIST_SQL)
+            has_genres = cursor.fetchone()[0]
+
+            if has_genres:
+                # Use simple fallback query like original
+                cursor.execute(_TOP_GENRES_SQL)
+                results = cursor.fetchall()
+                if results:
+                    genre_data = {row[0]: row[1] for row in results}
+                    with _genres_cache_lock:
+                        _genres_cache[user_id] = (time.time(), genre_data)
+                    return jsonify({'genres': genre_data})
         except sqlite3.Error:
             pass  # Fall through to API method
 
@@ -159,6 +224,10 @@ def get_genres():
         if not spotify_api:
             return jsonify({'genres': {}})
 
+        # Fill the genres table in the background so the next request reads from the database
+        if os.path.exists(db_path):
+            submit_genre_extraction(spotify_api, SpotifyDatabase(db_path), max_artists=50)
+
         # Get top artists and extract genres
         top_artists = spotify_api.get_top_artists(limit=20)
         if not top_artists:
@@ -183,9 +252,7 @@ def get_genres():
         return jsonify({'genres': genre_counts})
 
     except Exception as e:
-        print(f"❌ Genres error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Genres error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @analytics_bp.route('/patterns')
@@ -195,128 +262,112 @@ def get_listening_patterns():
     try:
         user_id = get_jwt_identity()
         db_path = f'/tmp/user_{user_id}_spotify_data.db'
-        print(f"🔍 PATTERNS DEBUG: User ID: {user_id}, DB path: {db_path}")
+        logger.debug("Patterns: User ID: %s, DB path: %s", user_id, db_path)
 
-        # Use direct SQLite connection like original
-        try:
-            with sqlite3.connect(db_path) as conn:
-                cursor = conn.cursor()
-                
-                # First check if database and tables exist
-                cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-                tables = cursor.fetchall()
-                print(f"🔍 PATTERNS DEBUG: Available tables: {[t[0] for t in tables]}")
-                
-                # Check listening history count
-                cursor.execute("SELECT COUNT(*) FROM listening_history WHERE user_id = ?", (user_id,))
-                total_history = cursor.fetchone()[0]
-                print(f"🔍 PATTERNS DEBUG: Total listening history entries for user: {total_history}")
-                
-                # Check recent entries
-                cursor.execute("SELECT COUNT(*) FROM listening_history WHERE user_id = ? AND datetime(played_at) >= datetime('now', '-7 days')", (user_id,))
-                recent_history = cursor.fetchone()[0]
-                print(f"🔍 PATTERNS DEBUG: Recent (7 days) listening history entries: {recent_history}")
-                
-                # If no recent data, try to collect some from Spotify API
-                if recent_history == 0:
-                    print("🔍 PATTERNS DEBUG: No recent data found, attempting to collect from Spotify API...")
-                    spotify_api = get_user_spotify_api()
-                    if spotify_api:
-                        # Get recently played tracks
-                        recently_played = spotify_api.get_recently_played(limit=50)
-                        if recently_played:
-                            print(f"🔍 PATTERNS DEBUG: Got {len(recently_played)} recently played tracks from API")
-                            
-                            # Save to database
-                            from modules.database import SpotifyDatabase
-                            db = SpotifyDatabase(db_path)
-                            
-                            for track in recently_played:
-                                # Save track
-                                db.save_track(track)
-                                
-                                # Save listening history
-                                played_at = track.get('played_at')
-                                if played_at:
-                                    db.save_listening_history(
-                                        user_id=user_id,
-                                        track_id=track['id'],
-                                        played_at=played_at,
-                                        source='recently_played'
-                                    )
-                            print(f"🔍 PATTERNS DEBUG: Saved {len(recently_played)} tracks to database")
-
-                # Use the exact same query as original Dash app
-                cursor.execute('''
-                    SELECT
-                        strftime('%w', datetime(played_at, 'localtime')) as day_of_week,
-                        strftime('%H', datetime(played_at, 'localtime')) as hour_of_day,
-                        COUNT(*) as play_count
-                    FROM listening_history h
-                    JOIN tracks t ON h.track_id = t.track_id
-                    WHERE h.user_id = ?
-                    AND h.played_at IS NOT NULL
-                    AND h.source IN ('played', 'recently_played', 'current')
-                    AND datetime(h.played_at) <= datetime('now')
-                    AND datetime(h.played_at) >= datetime('now', '-7 days')
-                    GROUP BY day_of_week, hour_of_day
-                    ORDER BY day_of_week, hour_of_day
-                ''', (user_id,))
-
-                results = cursor.fetchall()
-                print(f"🔍 PATTERNS DEBUG: Query results: {len(results)} entries found")
-                if results:
-                    print(f"🔍 PATTERNS DEBUG: Sample results: {results[:5]}")
-
-                if not results:
-                    print("🔍 PATTERNS DEBUG: No results found, returning empty data")
-                    # Return empty pattern data
-                    return jsonify({
-                        'listening_patterns': [],
-                        'summary': {
-                            'total_plays': 0,
-                            'most_active_hour': None,
-                            'most_active_day': None
-                        }
-                    })
-
-                # Format data for heatmap like original
-                heatmap_data = []
-                days = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
-
-                # Create lookup for existing data
-                patterns_lookup = {}
-                for day_of_week, hour_of_day, play_count in results:
-                    patterns_lookup[(int(day_of_week), int(hour_of_day))] = play_count
-
-                # Generate complete heatmap data (7 days x 24 hours)
-                for day_num in range(7):
-                    for hour in range(24):
-                        count = patterns_lookup.get((day_num, hour), 0)
-                        heatmap_data.append({
-                            'day': days[day_num],
-                            'day_num': day_num,
-                            'hour': hour,
-                            'count': count
-                        })
-
-                # Calculate summary stats
-                total_plays = sum(row[2] for row in results)
-                most_active = max(results, key=lambda x: x[2]) if results else None
+        # played_at is stored as naive UTC ISO text, so a plain string bound keeps the filters index-friendly
+        week_ago = (datetime.now(timezone.utc) - timedelta(days=7)).replace(tzinfo=None).isoformat(timespec='seconds')
 
+        # Reads go through this worker thread's persistent connection, so the
+        # statements below stay compiled in its statement cache between requests
+        try:
+            conn = get_thread_connection(db_path)
+            cursor = conn.cursor()
+            
+            # Check for recent entries; an index probe instead of counting the whole history
+            cursor.execute(_RECENT_HISTORY_EXISTS_SQL, (user_id, week_ago))
+            has_recent_history = cursor.fetchone()[0]
+            logger.debug("Patterns: Recent (7 days) listening history present: %s", bool(has_recent_history))
+            
+            # If no recent data, try to collect some from Spotify API (at most once a
+            # minute, so users with an empty week don't poll Spotify on every view)
+            if not has_recent_history and claim_recently_played_poll(user_id):
+                logger.debug("Patterns: No recent data found, attempting to collect from Spotify API...")
+                spotify_api = get_user_spotify_api()
+                if spotify_api:
+                    # Get recently played tracks
+                    recently_played = spotify_api.get_recently_played(limit=50)
+                    if recently_played:
+                        logger.debug("Patterns: Got %s recently played tracks from API", len(recently_played))
+                        
+                        # Save tracks and history in one transaction instead of
+                        # opening two connections per track
+                        db = SpotifyDatabase(db_path)
+                        db.save_tracks_with_history_bulk(recently_played, [
+                            (user_id, track['id'], track['played_at'], 'recently_played')
+                            for track in recently_played
+                            if track.get('id') and track.get('played_at')
+                        ])
+                        logger.debug("Patterns: Saved %s tracks to database", len(recently_played))
+
+            # Reuse the last heatmap while nothing new has been ingested
+            data_version = get_data_version(cursor)
+            with _patterns_cache_lock:
+                cached = _patterns_cache.get(user_id)
+            if (data_version is not None and cached and cached[0] == data_version
+                    and time.time() - cached[1] < PATTERNS_CACHE_TTL):
+                return jsonify(cached[2])
+
+            # Use the exact same query as original Dash app
+            cursor.execute(_HEATMAP_SQL, (user_id, week_ago))
+
+            results = cursor.fetchall()
+            logger.debug("Patterns: Query results: %s entries found", len(results))
+            if results:
+                logger.debug("Patterns: Sample results: %s", results[:5])
+
+            if not results:
+                logger.debug("Patterns: No results found, returning empty data")
+                # Return empty pattern data
                 return jsonify({
-                    'listening_patterns': heatmap_data,
+                    'listening_patterns': [],
                     'summary': {
-                        'total_plays': total_plays,
-                        'most_active_hour': int(most_active[1]) if most_active else None,
-                        'most_active_day': days[int(most_active[0])] if most_active else None
+                        'total_plays': 0,
+                        'most_active_hour': None,
+                        'most_active_day': None
                     }
                 })
 
+            # Format data for heatmap like original
+            heatmap_data = []
+            days = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
+
+            # Create lookup for existing data
+            patterns_lookup = {}
+            for day_of_week, hour_of_day, play_count in results:
+                patterns_lookup[(int(day_of_week), int(hour_of_day))] = play_count
+
+            # Generate complete heatmap data (7 days x 24 hours)
+            for day_num in range(7):
+                for hour in range(24):
+                    count = patterns_lookup.get((day_num, hour), 0)
+                    heatmap_data.append({
+                        'day': days[day_num],
+                        'day_num': day_num,
+                        'hour': hour,
+                        'count': count
+                    })
+
+            # Calculate summary stats
+            total_plays = sum(row[2] for row in results)
+            # Rows come back unordered, so break ties on the earliest day/hour explicitly
+            most_active = max(results, key=lambda x: (x[2], -int(x[0]), -int(x[1]))) if results else None
+
+            patterns = {
+                'listening_patterns': heatmap_data,
+                'summary': {
+                    'total_plays': total_plays,
+                    'most_active_hour': int(most_active[1]) if most_active else None,
+                    'most_active_day': days[int(most_active[0])] if most_active else None
+                }
+            }
+            if data_version is not None:
+                with _patterns_cache_lock:
+                    _patterns_cache[user_id] = (data_version, time.time(), patterns)
+
+            return jsonify(patterns)
+
         except sqlite3.Error as e:
-            print(f"❌ Database error in listening patterns: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Database error in listening patterns: %s", e)
             return jsonify({
                 'listening_patterns': [],
                 'summary': {
@@ -327,9 +378,7 @@ def get_listening_patterns():
             })
 
     except Exception as e:
-        print(f"❌ Listening patterns error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Listening patterns error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @analytics_bp.route('/collect-data')
@@ -339,35 +388,28 @@ def collect_listening_data():
     try:
         user_id = get_jwt_identity()
         db_path = f'/tmp/user_{user_id}_spotify_data.db'
+
+        if not claim_recently_played_poll(user_id):
+            return jsonify({'message': 'Listening data was collected moments ago'})
         
         spotify_api = get_user_spotify_api()
         if not spotify_api:
             return jsonify({'error': 'Could not get Spotify API instance'}), 400
             
-        # Get recently played tracks
-        recently_played = spotify_api.get_recently_played(limit=50)
-        if not recently_played:
-            return jsonify({'message': 'No recently played tracks found'})
-            
-        # Save to database
-        from modules.database import SpotifyDatabase
         db = SpotifyDatabase(db_path)
         
-        saved_count = 0
-        for track in recently_played:
-            # Save track
-            db.save_track(track)
+        # Get recently played tracks newer than the latest stored play
+        latest_known_ms = db.get_latest_played_at_ms(user_id)
+        recently_played = spotify_api.get_recently_played(limit=50, after=latest_known_ms)
+        if not recently_played:
+            return jsonify({'message': 'No recently played tracks found'})
             
-            # Save listening history
-            played_at = track.get('played_at')
-            if played_at:
-                db.save_listening_history(
-                    user_id=user_id,
-                    track_id=track['id'],
-                    played_at=played_at,
-                    source='recently_played'
-                )
-                saved_count += 1
+        # Save tracks and listening history in one transaction
+        saved_count = db.save_tracks_with_history_bulk(
+            recently_played,
+            [(user_id, track['id'], track['played_at'], 'recently_played')
+             for track in recently_played if track.get('id') and track.get('played_at')]
+        )
                 
         return jsonify({
             'message': f'Successfully collected {saved_count} listening entries',
@@ -375,9 +417,7 @@ def collect_listening_data():
         })
         
     except Exception as e:
-        print(f"❌ Data collection error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Data collection error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @analytics_bp.route('/wrapped')
@@ -388,47 +428,40 @@ def get_wrapped_summary():
         user_id = get_jwt_identity()
         db_path = f'/tmp/user_{user_id}_spotify_data.db'
         
+        # Get database statistics on this worker thread's pooled connection
+        cursor = get_thread_connection(db_path).cursor()
+
+        # Serve the cached summary if nothing has been ingested since it was built
+        data_version = get_data_version(cursor)
+        with _wrapped_cache_lock:
+            cached = _wrapped_cache.get(user_id)
+        if (data_version is not None and cached and cached[0] == data_version
+                and time.time() - cached[1] < WRAPPED_CACHE_TTL):
+            return jsonify({'wrapped': cached[2]})
+
         # Initialize components
         spotify_api = get_user_spotify_api()
         if not spotify_api:
             return jsonify({'wrapped': {'listening_stats': {'total_minutes_listened': 0, 'total_tracks_played': 0, 'unique_artists_discovered': 0, 'unique_albums_explored': 0}, 'top_tracks': [], 'top_artists': []}})
 
         # Get top tracks and artists from API
-        top_tracks = spotify_api.get_top_tracks(time_range='long_term', limit=5)
-        top_artists = spotify_api.get_top_artists(time_range='long_term', limit=5)
-        
-        # Get database statistics
-        import sqlite3
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
+        top_tracks, top_artists = fetch_concurrently(
+            (spotify_api.get_top_tracks, {'time_range': 'long_term', 'limit': 5}),
+            (spotify_api.get_top_artists, {'time_range': 'long_term', 'limit': 5})
+        )
 
         stats = {}
         try:
-            # Get total listening time in minutes
-            cursor.execute("SELECT SUM(duration_ms) / 60000 FROM tracks")
-            result = cursor.fetchone()
-            stats['total_minutes'] = result[0] if result and result[0] else 0
-
-            # Get total tracks
-            cursor.execute("SELECT COUNT(*) FROM tracks")
-            result = cursor.fetchone()
-            stats['total_tracks'] = result[0] if result and result[0] else 0
-
-            # Get unique artists
-            cursor.execute("SELECT COUNT(DISTINCT artist) FROM tracks")
-            result = cursor.fetchone()
-            stats['unique_artists'] = result[0] if result and result[0] else 0
-
-            # Get unique albums
-            cursor.execute("SELECT COUNT(DISTINCT album) FROM tracks")
-            result = cursor.fetchone()
-            stats['unique_albums'] = result[0] if result and result[0] else 0
+            # One aggregate query, shared with /api/user/stats for the same data version
+            library_stats = get_library_stats(db_path, data_version)
+            stats['total_minutes'] = library_stats['total_duration_ms'] // 60000
+            stats['total_tracks'] = library_stats['total_tracks']
+            stats['unique_artists'] = library_stats['total_artists']
+            stats['unique_albums'] = library_stats['total_albums']
 
         except sqlite3.Error as e:
-            print(f"Database error: {e}")
+            logger.warning("Database error: %s", e)
             stats = {'total_minutes': 0, 'total_tracks': 0, 'unique_artists': 0, 'unique_albums': 0}
-        finally:
-            conn.close()
         
         # Format wrapped summary
         wrapped_summary = {
@@ -455,7 +488,11 @@ def get_wrapped_summary():
                 for artist in (top_artists if top_artists else [])
             ]
         }
-        
+
+        if data_version is not None:
+            with _wrapped_cache_lock:
+                _wrapped_cache[user_id] = (data_version, time.time(), wrapped_summary)
+
         return jsonify({'wrapped': wrapped_summary})
         
     except Exception as e:
@@ -4,42 +4,57 @@ Authentication endpoints for Spotify OAuth and JWT token management
 
 from flask import Blueprint, request, jsonify, redirect, session
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-from datetime import timedelta
+from datetime import datetime, timedelta
 import os
+import logging
+import secrets
+import time
+import urllib.parse
 import requests
 import base64
-from modules.api import SpotifyAPI
+from modules.api import SpotifyAPI, fetch_concurrently, claim_recently_played_poll, spotify_session, remember_user_profile, clear_response_cache
+from modules.database import SpotifyDatabase, get_thread_connection, submit_write
+from modules.genre_extractor import submit_genre_extraction
+
+logger = logging.getLogger(__name__)
 
 auth_bp = Blueprint('auth', __name__)
 
+# Session entry holding an in-progress login's credentials and OAuth state
+LOGIN_SESSION_KEY = 'spotify_login'
+
+def _save_initial_data(spotify_api, user_db, user_id, recently_played, saved_tracks):
+    """Persist a new user's first tracks and history, then queue genre extraction for them."""
+    now = datetime.now().isoformat()
+    user_db.save_tracks_with_history_bulk(
+        recently_played + saved_tracks,
+        [(user_id, track['id'], track.get('played_at', now), 'recently_played') for track in recently_played] +
+        [(user_id, track['id'], track.get('added_at', now), 'saved') for track in saved_tracks]
+    )
+    logger.debug("Saved %s recently played and %s saved tracks for %s", len(recently_played), len(saved_tracks), user_id)
+
+    # Genre extraction reads the rows written above, so it is queued only once they land
+    submit_genre_extraction(spotify_api, user_db, max_artists=30)
+
 @auth_bp.route('/login', methods=['POST'])
 def login():
     """Initiate Spotify OAuth flow with user credentials"""
     try:
-        print("🔍 DEBUG: Login endpoint called")
+        logger.debug("Login endpoint called")
 
         data = request.get_json()
-        print(f"🔍 DEBUG: Request data: {data}")
+        logger.debug("Request data keys: %s", sorted(data) if data else None)
 
         client_id = data.get('client_id') if data else None
         client_secret = data.get('client_secret') if data else None
 
-        print(f"🔍 DEBUG: client_id: {client_id[:8] if client_id else 'None'}...")
-        print(f"🔍 DEBUG: client_secret: {'***' if client_secret else 'None'}")
+        logger.debug("client_id: %s...", client_id[:8] if client_id else 'None')
+        logger.debug("client_secret: %s", '***' if client_secret else 'None')
 
         if not client_id or not client_secret:
-            print("❌ DEBUG: Missing client credentials")
+            logger.warning("Missing client credentials")
             return jsonify({'error': 'Missing client credentials'}), 400
 
-        # Generate secure session ID for this login attempt
-        import secrets
-        session_id = secrets.token_urlsafe(32)
-        
-        # Store credentials with session isolation
-        session['login_session_id'] = session_id
-        session[f'spotify_client_id_{session_id}'] = client_id
-        session[f'spotify_client_secret_{session_id}'] = client_secret
-        print(f"✅ DEBUG: User credentials stored with session ID: {session_id[:8]}...")
 
         # Get redirect URI dynamically based on request origin
         origin = request.headers.get('Origin', 'http://localhost:3000')
@@ -47,22 +62,21 @@ def login():
             redirect_uri = f"{origin}/auth/callback"
         else:
             redirect_uri = os.getenv('SPOTIFY_REDIRECT_URI', 'http://127.0.0.1:3000/auth/callback')
-        print(f"🔍 DEBUG: origin: {origin}")
-        print(f"🔍 DEBUG: redirect_uri: {redirect_uri}")
+        logger.debug("origin: %s", origin)
+        logger.debug("redirect_uri: %s", redirect_uri)
 
         # Create SpotifyAPI instance with user credentials
-        print("🔍 DEBUG: Creating SpotifyAPI instance...")
+        logger.debug("Creating SpotifyAPI instance...")
         spotify_api = SpotifyAPI(
             client_id=client_id,
             client_secret=client_secret,
             redirect_uri=redirect_uri
         )
-        print("✅ DEBUG: SpotifyAPI instance created")
+        logger.debug("SpotifyAPI instance created")
 
-        print("🔍 DEBUG: Getting auth URL...")
+        logger.debug("Getting auth URL...")
         
         # Generate auth URL manually to ensure consistency
-        import urllib.parse
         scope = 'user-top-read user-library-read playlist-read-private user-read-currently-playing user-read-recently-played user-follow-read'
         state = secrets.token_urlsafe(16)
         
@@ -76,54 +90,56 @@ def login():
         }
         
         auth_url = 'https://accounts.spotify.com/authorize?' + urllib.parse.urlencode(auth_params)
-        print(f"🔍 DEBUG: Manual auth_url: {auth_url}")
+        logger.debug("Built auth URL for client %s...", client_id[:8])
         
-        # Store state for validation
-        session[f'oauth_state_{client_id[:8]}'] = state
-        print(f"🔍 DEBUG: Stored OAuth state: {state}")
+        # Store credentials and state for validation as one session entry, so the
+        # login attempt costs a single cookie write
+        session[LOGIN_SESSION_KEY] = {
+            'client_id': client_id,
+            'client_secret': client_secret,
+            'state': state
+        }
+        logger.debug("Stored login session with OAuth state")
 
         if not auth_url:
-            print("❌ DEBUG: Failed to generate authorization URL")
+            logger.warning("Failed to generate authorization URL")
             return jsonify({'error': 'Failed to generate authorization URL'}), 500
 
-        print("✅ DEBUG: Login successful, returning auth URL")
+        logger.debug("Login successful, returning auth URL")
         response = jsonify({'auth_url': auth_url})
         response.headers['Access-Control-Allow-Origin'] = origin
         response.headers['Access-Control-Allow-Credentials'] = 'true'
         return response
 
     except Exception as e:
-        print(f"❌ DEBUG: Login error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Login error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @auth_bp.route('/callback', methods=['POST'])
 def callback():
     """Handle Spotify OAuth callback and create JWT token"""
     try:
-        print("🔍 DEBUG: Callback endpoint called")
+        logger.debug("Callback endpoint called")
 
         data = request.get_json()
-        print(f"🔍 DEBUG: Callback request data: {data}")
-        print(f"🔍 DEBUG: Callback timestamp: {__import__('time').time()}")
+        logger.debug("Callback request data keys: %s", sorted(data) if data else None)
+        logger.debug("Callback timestamp (ns): %s", time.time_ns())
 
         code = data.get('code')
         client_id = data.get('client_id')
         client_secret = data.get('client_secret')
         state = data.get('state')  # Get state parameter
 
-        print(f"🔍 DEBUG: code: {code[:20] if code else 'None'}...")
-        print(f"🔍 DEBUG: code length: {len(code) if code else 0}")
-        print(f"🔍 DEBUG: client_id: {client_id[:8] if client_id else 'None'}...")
-        print(f"🔍 DEBUG: client_secret: {'***' if client_secret else 'None'}")
+        logger.debug("code length: %s", len(code) if code else 0)
+        logger.debug("client_id: %s...", client_id[:8] if client_id else 'None')
+        logger.debug("client_secret: %s", '***' if client_secret else 'None')
 
         if not code:
-            print("❌ DEBUG: No authorization code received")
+            logger.warning("No authorization code received")
             return jsonify({'error': 'No authorization code received'}), 400
 
         if not client_id or not client_secret:
-            print("❌ DEBUG: Missing client credentials")
+            logger.warning("Missing client credentials")
             return jsonify({'error': 'Missing client credentials'}), 400
 
         # Get redirect URI dynamically based on request origin
@@ -132,50 +148,45 @@ def callback():
             redirect_uri = f"{origin}/auth/callback"
         else:
             redirect_uri = os.getenv('SPOTIFY_REDIRECT_URI', 'http://127.0.0.1:3000/auth/callback')
-        print(f"🔍 DEBUG: origin: {origin}")
-        print(f"🔍 DEBUG: redirect_uri: {redirect_uri}")
-        print(f"🔍 DEBUG: redirect_uri matches origin: {redirect_uri == f'{origin}/auth/callback'}")
+        logger.debug("origin: %s", origin)
+        logger.debug("redirect_uri: %s", redirect_uri)
+        logger.debug("redirect_uri matches origin: %s", redirect_uri == f'{origin}/auth/callback')
         
 
         # Validate state parameter if present (temporarily disabled due to session issues)
         if state:
-            stored_state = session.get(f'oauth_state_{client_id[:8]}')
-            print(f"🔍 DEBUG: Received state: {state}")
-            print(f"🔍 DEBUG: Stored state: {stored_state}")
+            login_session = session.get(LOGIN_SESSION_KEY) or {}
+            stored_state = login_session.get('state') if login_session.get('client_id') == client_id else None
+            logger.debug("Stored state found: %s", stored_state is not None)
             if stored_state and state != stored_state:
-                print("❌ DEBUG: OAuth state mismatch")
+                logger.warning("OAuth state mismatch")
                 return jsonify({
                     'error': 'OAuth state mismatch. Please try logging in again.',
                     'code': 'STATE_MISMATCH'
                 }), 400
             elif not stored_state:
-                print("⚠️ DEBUG: No stored state found (session issue), continuing anyway")
-            # Clean up state
-            session.pop(f'oauth_state_{client_id[:8]}', None)
+                logger.warning("No stored state found (session issue), continuing anyway")
         
         # The code should not be decoded as it may already be handled by the client
         decoded_code = code
-        print(f"🔍 DEBUG: Using raw code: {code[:20]}...")
-        print(f"🔍 DEBUG: Code timestamp check: {__import__('time').time()}")
+        logger.debug("Code timestamp check (ns): %s", time.time_ns())
 
         # Create SpotifyAPI instance with user credentials
-        print("🔍 DEBUG: Creating SpotifyAPI instance for callback...")
+        logger.debug("Creating SpotifyAPI instance for callback...")
         spotify_api = SpotifyAPI(
             client_id=client_id,
             client_secret=client_secret,
             redirect_uri=redirect_uri
         )
-        print("✅ DEBUG: SpotifyAPI instance created")
+        logger.debug("SpotifyAPI instance created")
 
         # Exchange code for tokens using direct method (more reliable)
-        print("🔍 DEBUG: Exchanging code for access token...")
-        print(f"🔍 DEBUG: Using redirect_uri for token exchange: {redirect_uri}")
+        logger.debug("Exchanging code for access token...")
+        logger.debug("Using redirect_uri for token exchange: %s", redirect_uri)
         
         # Use direct token exchange with Spotify API (primary method)
-        print("🔍 DEBUG: Using direct token exchange...")
+        logger.debug("Using direct token exchange...")
         try:
-            import requests
-            import base64
             
             # Prepare token exchange request
             auth_string = f"{client_id}:{client_secret}"
@@ -193,23 +204,23 @@ def callback():
                 'redirect_uri': redirect_uri
             }
             
-            print(f"🔍 DEBUG: Direct token exchange with redirect_uri: {redirect_uri}")
-            response = requests.post(
+            logger.debug("Direct token exchange with redirect_uri: %s", redirect_uri)
+            response = spotify_session.post(
                 'https://accounts.spotify.com/api/token',
                 headers=headers,
                 data=token_data,
                 timeout=10
             )
             
-            print(f"🔍 DEBUG: Token exchange response status: {response.status_code}")
+            logger.debug("Token exchange response status: %s", response.status_code)
             
             if response.status_code == 200:
                 token_info = response.json()
-                print(f"✅ DEBUG: Direct token exchange successful")
-                print(f"🔍 DEBUG: Token info keys: {list(token_info.keys())}")
+                logger.debug("Direct token exchange successful")
+                logger.debug("Token info keys: %s", list(token_info.keys()))
             else:
-                print(f"❌ DEBUG: Direct token exchange failed: {response.status_code}")
-                print(f"🔍 DEBUG: Error response: {response.text}")
+                logger.warning("Direct token exchange failed: %s", response.status_code)
+                logger.debug("Error response: %s", response.text)
                 return jsonify({
                     'error': 'Authorization code expired or already used. Please try logging in again.',
                     'code': 'INVALID_GRANT',
@@ -217,7 +228,7 @@ def callback():
                 }), 400
                 
         except Exception as direct_error:
-            print(f"❌ DEBUG: Direct token exchange failed: {direct_error}")
+            logger.warning("Direct token exchange failed: %s", direct_error)
             return jsonify({
                 'error': 'Token exchange failed. Please try logging in again.',
                 'code': 'TOKEN_EXCHANGE_ERROR',
@@ -225,25 +236,31 @@ def callback():
             }), 400
 
         if not token_info:
-            print("❌ DEBUG: Failed to get access token")
+            logger.warning("Failed to get access token")
             return jsonify({
                 'error': 'Failed to get access token. Please try logging in again.',
                 'code': 'NO_TOKEN'
             }), 400
 
+        # Hand the fresh token to the client so the profile and initial fetches use it
+        spotify_api.use_token(token_info)
+
         # Get user profile to create JWT
-        print("🔍 DEBUG: Getting user profile...")
+        logger.debug("Getting user profile...")
         user_profile = spotify_api.get_user_profile()
-        print(f"🔍 DEBUG: User profile received: {user_profile is not None}")
+        logger.debug("User profile received: %s", user_profile is not None)
         if not user_profile:
-            print("❌ DEBUG: Failed to get user profile")
+            logger.warning("Failed to get user profile")
             return jsonify({'error': 'Failed to get user profile'}), 400
 
         # Create secure JWT token with user isolation
         user_id = user_profile['id']
+
+        # The login client isn't tied to a user yet, so share the profile it just
+        # fetched; the dashboard's first profile request is then a cache hit
+        remember_user_profile(user_id, user_profile)
         
         # Generate unique session token for this user
-        import secrets
         user_session_token = secrets.token_urlsafe(16)
         
         access_token = create_access_token(
@@ -260,16 +277,11 @@ def callback():
             }
         )
         
-        # Clear session credentials after JWT creation
-        session.pop('login_session_id', None)
-        for key in list(session.keys()):
-            if key.startswith('spotify_client_'):
-                session.pop(key, None)
+        # Clear session credentials and state after JWT creation
+        session.pop(LOGIN_SESSION_KEY, None)
         
         # Collect essential data immediately for new users
         try:
-            from modules.database import SpotifyDatabase
-            from datetime import datetime
             
             user_id = user_profile['id']
             db_path = f'/tmp/user_{user_id}_spotify_data.db'
@@ -278,64 +290,42 @@ def callback():
             # Save user profile
             user_db.save_user(user_profile)
             
-            # Check if user already has data
-            import sqlite3
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            cursor.execute('SELECT COUNT(*) FROM tracks')
-            track_count = cursor.fetchone()[0]
-            conn.close()
+            # Check if user already has data (an existence probe, not a full count)
+            cursor = get_thread_connection(db_path).cursor()
+            cursor.execute('SELECT EXISTS(SELECT 1 FROM tracks)')
+            has_tracks = cursor.fetchone()[0]
             
             # Only collect data if database is empty
-            if track_count == 0:
-                print(f'🔍 DEBUG: Collecting essential data for new user {user_id}')
+            if not has_tracks:
+                logger.debug("Collecting essential data for new user %s", user_id)
                 
-                # 1. Get recently played tracks (immediate)
-                recently_played = spotify_api.get_recently_played(limit=50)
-                if recently_played:
-                    print(f'🎧 Saving {len(recently_played)} recently played tracks')
-                    for track in recently_played:
-                        user_db.save_track(track)
-                        user_db.save_listening_history(
-                            user_id=user_id,
-                            track_id=track['id'],
-                            played_at=track.get('played_at', datetime.now().isoformat()),
-                            source='recently_played'
-                        )
-                
-                # 2. Get saved tracks (immediate)
-                saved_tracks = spotify_api.get_saved_tracks(limit=50)
-                if saved_tracks:
-                    print(f'💚 Saving {len(saved_tracks)} saved tracks')
-                    for track in saved_tracks:
-                        user_db.save_track(track)
-                        user_db.save_listening_history(
-                            user_id=user_id,
-                            track_id=track['id'],
-                            played_at=track.get('added_at', datetime.now().isoformat()),
-                            source='saved'
-                        )
+                # 1. Get recently played and saved tracks (immediate, fetched in parallel)
+                recently_played, saved_tracks = fetch_concurrently(
+                    (spotify_api.get_recently_played, {'limit': 50}),
+                    (spotify_api.get_saved_tracks, {'limit': 50})
+                )
+                recently_played = recently_played or []
+                saved_tracks = saved_tracks or []
                 
-                # 3. Extract genres for collected artists
-                try:
-                    print('🎭 Starting genre extraction...')
-                    from modules.genre_extractor import GenreExtractor
-                    genre_extractor = GenreExtractor(spotify_api, user_db)
-                    
-                    # Extract genres from recently played tracks (limit to avoid long delays)
-                    genres_extracted = genre_extractor.extract_genres_from_recent_tracks(max_artists=30)
-                    print(f'✅ Extracted {genres_extracted} genres from recent tracks')
-                    
-                except Exception as genre_error:
-                    print(f'⚠️ Genre extraction failed: {genre_error}')
-                    # Continue anyway - genre extraction is not critical
+                # 2. Save them and extract genres on the background writer so the
+                # login response doesn't wait on disk
+                if recently_played or saved_tracks:
+                    logger.debug("Queueing save of %s recently played and %s saved tracks", len(recently_played), len(saved_tracks))
+                    submit_write(_save_initial_data, spotify_api, user_db, user_id, recently_played, saved_tracks)
+
+                # Claiming the poll stops the dashboard's first /patterns request from
+                # fetching recently played again before the background save lands. It is
+                # only claimed once there are plays on the way, so a failed or empty
+                # fetch leaves the dashboard free to poll.
+                if recently_played:
+                    claim_recently_played_poll(user_id)
                 
-                print(f'✅ DEBUG: Essential data collection completed for {user_id}')
+                logger.debug("Essential data collection queued for %s", user_id)
             else:
-                print(f'🔍 DEBUG: User {user_id} already has {track_count} tracks, skipping data collection')
+                logger.debug("User %s already has tracks, skipping data collection", user_id)
                 
         except Exception as e:
-            print(f'⚠️ DEBUG: Data collection failed during auth: {e}')
+            logger.warning("Data collection failed during auth: %s", e)
             # Don't fail the authentication if data collection fails
 
         
@@ -352,9 +342,7 @@ def callback():
         })
 
     except Exception as e:
-        print(f"❌ DEBUG: Callback error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Callback error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @auth_bp.route('/refresh', methods=['POST'])
@@ -382,6 +370,8 @@ def refresh_token():
 @jwt_required()
 def logout():
     """Logout user (client-side token removal)"""
+    # Drop the user's cached Spotify responses, including the copies on disk
+    clear_response_cache(get_jwt_identity())
     return jsonify({'message': 'Logged out successfully'})
 
 @auth_bp.route('/status')
@@ -420,7 +410,7 @@ def validate_credentials():
 
         data = {'grant_type': 'client_credentials'}
 
-        response = requests.post(
+        response = spotify_session.post(
             'https://accounts.spotify.com/api/token',
             headers=headers,
             data=data,
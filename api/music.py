@@ -4,14 +4,112 @@ Music data endpoints for tracks, artists, albums, and playlists
 
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
-from modules.database import SpotifyDatabase
-from modules.api import SpotifyAPI
+from modules.database import SpotifyDatabase, connect, get_thread_connection, get_data_version
+from modules.api import SpotifyAPI, claim_recently_played_poll, release_recently_played_poll
 from modules.top_albums import get_top_albums
+from datetime import datetime
+from functools import lru_cache
+import logging
 import pandas as pd
 import os
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
 
 music_bp = Blueprint('music', __name__)
 
+# Statements for the audio-features fix, kept constant so sqlite3 reuses them
+_AUDIO_FEATURE_COLUMNS = ('danceability', 'energy', 'key', 'loudness', 'mode', 'speechiness',
+                          'acousticness', 'instrumentalness', 'liveness', 'valence', 'tempo')
+_MISSING_FEATURES_SQL = """
+    SELECT track_id, name, artist
+    FROM tracks
+    WHERE energy IS NULL
+    AND track_id NOT LIKE 'genre-%'
+    LIMIT 50
+"""
+# COALESCE keeps stored values for any feature the lookup didn't return, as _TRACK_INSERT_SQL does
+_UPDATE_FEATURES_SQL = (
+    'UPDATE tracks SET ' + ', '.join(f'{column} = COALESCE(?, {column})' for column in _AUDIO_FEATURE_COLUMNS) +
+    ' WHERE track_id = ?'
+)
+
+# Top album cards per (user, limit), reused until new plays are ingested
+TOP_ALBUMS_CACHE_TTL = 300  # seconds
+_top_albums_cache = {}
+_top_albums_cache_lock = threading.Lock()
+
+# Formatted dashboard sections per (view, user, params), so the dashboard's
+# periodic refresh doesn't rebuild the Spotify client and reformat every time
+VIEW_CACHE_TTL = 60  # seconds
+_view_cache = {}
+_view_cache_lock = threading.Lock()
+
+def _cached_view(key):
+    """Return a formatted view payload if it was built within VIEW_CACHE_TTL, else None."""
+    with _view_cache_lock:
+        cached = _view_cache.get(key)
+    if cached and time.time() - cached[0] < VIEW_CACHE_TTL:
+        return cached[1]
+    return None
+
+def _remember_view(key, payload):
+    """Store a formatted view payload for _cached_view."""
+    with _view_cache_lock:
+        _view_cache[key] = (time.time(), payload)
+
+def _format_duration(ms):
+    """Format milliseconds as m:ss, matching the frontend's formatDuration."""
+    seconds = int(ms) // 1000
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+@lru_cache(maxsize=32)
+def _format_current_track(track_id, progress_s, duration_ms, is_playing, name, artist,
+                          album, image_url, preview_url):
+    """
+    Build the currently-playing payload, memoized per track and whole second of progress.
+
+    The dashboard polls this every few seconds, and while a track is paused every
+    poll sees the same state, so repeats reuse the payload. Callers must not mutate it.
+
+    Args:
+        track_id: Spotify track ID
+        progress_s: Playback position in whole seconds
+        duration_ms: Track length in milliseconds
+        is_playing: Whether playback is running
+        name, artist, album, image_url, preview_url: Display fields
+
+    Returns:
+        Formatted track dictionary with progress strings and percentage
+    """
+    progress_ms = progress_s * 1000
+    progress_percent = min(100.0, max(0.0, progress_ms / duration_ms * 100)) if duration_ms > 0 else 0.0
+    return {
+        'id': track_id,
+        'track': name,  # PRIMARY field
+        'name': name,   # Compatibility
+        'artist': artist,
+        'album': album,
+        'duration_ms': duration_ms,
+        'progress_ms': progress_ms,
+        'progress_percent': round(progress_percent, 2),
+        'progress_str': _format_duration(progress_ms),
+        'duration_str': _format_duration(duration_ms),
+        'is_playing': is_playing,
+        'preview_url': preview_url,
+        'external_urls': {'spotify': f"https://open.spotify.com/track/{track_id}"},
+        'images': [{'url': image_url}] if image_url else [],
+        'image_url': image_url
+    }
+
+def clear_view_cache(user_id):
+    """Drop a user's cached views, e.g. after their listening data is refreshed."""
+    with _view_cache_lock:
+        for key in [key for key in _view_cache if key[1] == user_id]:
+            del _view_cache[key]
+
 def validate_user_access(user_id, claims):
     """Validate user has access to their own data only"""
     if not user_id:
@@ -33,7 +131,6 @@ def get_user_database_path(user_id):
         raise Exception('Invalid user ID for database access')
     
     # Sanitize user ID to prevent path traversal
-    import re
     safe_user_id = re.sub(r'[^a-zA-Z0-9_-]', '', user_id)
     if safe_user_id != user_id:
         raise Exception('User ID contains invalid characters')
@@ -80,10 +177,10 @@ def get_spotify_api_for_user():
         spotify_access_token = claims.get('spotify_access_token')
         redirect_uri = os.getenv('SPOTIFY_REDIRECT_URI', 'http://127.0.0.1:3000/auth/callback')
 
-        print(f"🔍 DEBUG: Validated user: {current_user_id}")
-        print(f"🔍 DEBUG: Session token: {user_session_token[:8]}...")
-        print(f"🔍 DEBUG: JWT claims - client_id: {client_id[:8] if client_id else 'None'}...")
-        print(f"🔍 DEBUG: JWT claims - access_token: {'Present' if spotify_access_token else 'Missing'}")
+        logger.debug("Validated user: %s", current_user_id)
+        logger.debug("Session token: %s...", user_session_token[:8])
+        logger.debug("JWT claims - client_id: %s...", client_id[:8] if client_id else 'None')
+        logger.debug("JWT claims - access_token: %s", 'Present' if spotify_access_token else 'Missing')
 
         if not client_id or not client_secret:
             raise Exception('Missing Spotify credentials in JWT token')
@@ -91,11 +188,13 @@ def get_spotify_api_for_user():
         if not spotify_access_token:
             raise Exception('Missing Spotify access token in JWT token')
 
-        # Initialize SpotifyAPI with credentials
+        # Initialize SpotifyAPI with credentials; the user ID keeps its token and
+        # response caches separate from other users'
         spotify_api = SpotifyAPI(
             client_id=client_id,
             client_secret=client_secret,
-            redirect_uri=redirect_uri
+            redirect_uri=redirect_uri,
+            user_id=current_user_id
         )
 
         # Manually set the access token in the spotipy client
@@ -104,19 +203,19 @@ def get_spotify_api_for_user():
             token_info = {
                 'access_token': spotify_access_token,
                 'token_type': 'Bearer',
-                'expires_in': 3600,  # 1 hour
+                'expires_at': claims.get('iat', int(time.time())) + 3600,  # Spotify token is issued with the JWT
                 'refresh_token': claims.get('spotify_refresh_token'),
                 'scope': spotify_api.scopes
             }
 
             # Set the token in the auth manager
-            spotify_api.sp.auth_manager.token_info = token_info
-            print("✅ DEBUG: Access token set in SpotifyAPI")
+            spotify_api.use_token(token_info)
+            logger.debug("Access token set in SpotifyAPI")
 
         return spotify_api
 
     except Exception as e:
-        print(f"❌ DEBUG: Error initializing SpotifyAPI: {e}")
+        logger.warning("Error initializing SpotifyAPI: %s", e)
         raise
 
 @music_bp.route('/tracks/top')
@@ -124,7 +223,7 @@ def get_spotify_api_for_user():
 def get_top_tracks():
     """Get user's top tracks with strict user isolation"""
     try:
-        print("🔍 DEBUG: Top tracks endpoint called")
+        logger.debug("Top tracks endpoint called")
         
         # Get and validate user identity
         user_id = get_jwt_identity()
@@ -132,25 +231,30 @@ def get_top_tracks():
         
         # Security validation
         if not user_id or user_id != claims.get('spotify_user_id'):
-            print(f"❌ SECURITY: User ID mismatch - JWT: {user_id}, Claims: {claims.get('spotify_user_id')}")
+            logger.warning("SECURITY: User ID mismatch - JWT: %s, Claims: %s", user_id, claims.get('spotify_user_id'))
             return jsonify({'error': 'Unauthorized access'}), 403
         
         time_range = request.args.get('time_range', 'medium_term')
         limit = min(int(request.args.get('limit', 20)), 50)
 
-        print(f"🔍 DEBUG: Validated user {user_id} requesting top tracks: time_range={time_range}, limit={limit}")
+        logger.debug("Validated user %s requesting top tracks: time_range=%s, limit=%s", user_id, time_range, limit)
+
+        cache_key = ('top_tracks', user_id, time_range, limit)
+        cached = _cached_view(cache_key)
+        if cached is not None:
+            return jsonify(cached)
 
         spotify_api = get_spotify_api_for_user()
-        print("✅ DEBUG: SpotifyAPI initialized for top tracks")
+        logger.debug("SpotifyAPI initialized for top tracks")
 
         top_tracks = spotify_api.get_top_tracks(time_range=time_range, limit=limit)
-        print(f"🔍 DEBUG: Top tracks response: {top_tracks is not None}")
+        logger.debug("Top tracks response: %s", top_tracks is not None)
 
         if not top_tracks:
-            print("⚠️ DEBUG: No top tracks returned")
+            logger.warning("No top tracks returned")
             return jsonify({'tracks': []})
 
-        print(f"🔍 DEBUG: Top tracks structure: {type(top_tracks)}")
+        logger.debug("Top tracks structure: %s", type(top_tracks))
 
         # Format tracks for frontend
         # Note: SpotifyAPI.get_top_tracks() returns a list of processed tracks, not raw Spotify API format
@@ -170,12 +274,12 @@ def get_top_tracks():
                 'image_url': track.get('image_url', '')  # Add direct image_url field
             })
         
-        return jsonify({'tracks': formatted_tracks})
+        payload = {'tracks': formatted_tracks}
+        _remember_view(cache_key, payload)
+        return jsonify(payload)
         
     except Exception as e:
-        print(f"❌ DEBUG: Top tracks error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Top tracks error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @music_bp.route('/artists/top')
@@ -183,7 +287,7 @@ def get_top_tracks():
 def get_top_artists():
     """Get user's top artists with strict user isolation"""
     try:
-        print("🔍 DEBUG: Top artists endpoint called")
+        logger.debug("Top artists endpoint called")
         
         # Get and validate user identity
         user_id = get_jwt_identity()
@@ -191,19 +295,24 @@ def get_top_artists():
         
         # Security validation
         if not user_id or user_id != claims.get('spotify_user_id'):
-            print(f"❌ SECURITY: User ID mismatch - JWT: {user_id}, Claims: {claims.get('spotify_user_id')}")
+            logger.warning("SECURITY: User ID mismatch - JWT: %s, Claims: %s", user_id, claims.get('spotify_user_id'))
             return jsonify({'error': 'Unauthorized access'}), 403
         
         time_range = request.args.get('time_range', 'medium_term')
         limit = min(int(request.args.get('limit', 20)), 50)
 
-        print(f"🔍 DEBUG: Validated user {user_id} requesting top artists: time_range={time_range}, limit={limit}")
+        logger.debug("Validated user %s requesting top artists: time_range=%s, limit=%s", user_id, time_range, limit)
+
+        cache_key = ('top_artists', user_id, time_range, limit)
+        cached = _cached_view(cache_key)
+        if cached is not None:
+            return jsonify(cached)
 
         spotify_api = get_spotify_api_for_user()
-        print("✅ DEBUG: SpotifyAPI initialized for top artists")
+        logger.debug("SpotifyAPI initialized for top artists")
 
         top_artists = spotify_api.get_top_artists(time_range=time_range, limit=limit)
-        print(f"🔍 DEBUG: Top artists response: {top_artists is not None}")
+        logger.debug("Top artists response: %s", top_artists is not None)
 
         if not top_artists:
             return jsonify({'artists': []})
@@ -224,12 +333,12 @@ def get_top_artists():
                 'image_url': artist.get('image_url', '')  # Add direct image_url field
             })
         
-        return jsonify({'artists': formatted_artists})
+        payload = {'artists': formatted_artists}
+        _remember_view(cache_key, payload)
+        return jsonify(payload)
         
     except Exception as e:
-        print(f"❌ DEBUG: Top artists error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Top artists error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @music_bp.route('/albums/top')
@@ -246,10 +355,19 @@ def get_top_albums_endpoint():
         limit = int(request.args.get('limit', 10))
 
         # Get user-specific database with secure path
-        from modules.database import SpotifyDatabase
         db_path = get_user_database_path(user_id)
         user_db = SpotifyDatabase(db_path)
 
+        # Serve the cached cards while the library hasn't changed, skipping the
+        # ranking query and the DataFrame round-trip
+        cache_key = (user_id, limit)
+        data_version = get_data_version(get_thread_connection(db_path).cursor())
+        with _top_albums_cache_lock:
+            cached = _top_albums_cache.get(cache_key)
+        if (data_version is not None and cached and cached[0] == data_version
+                and time.time() - cached[1] < TOP_ALBUMS_CACHE_TTL):
+            return jsonify({'albums': cached[2]})
+
         # Get Spotify API for user
         spotify_api = get_spotify_api_for_user()
 
@@ -259,23 +377,29 @@ def get_top_albums_endpoint():
         if top_albums_df.empty:
             return jsonify({'albums': []})
 
-        # Convert DataFrame to list
-        albums_list = []
-        for _, album in top_albums_df.iterrows():
-            albums_list.append({
-                'album': album.get('album', 'Unknown Album'),
-                'artist': album.get('artist', 'Unknown Artist'),
-                'total_count': int(album.get('total_count', 0)),
-                'image_url': album.get('image_url', ''),
-                'rank': int(album.get('rank', len(albums_list) + 1))
-            })
+        # Convert DataFrame to list, walking plain tuples instead of per-row Series
+        # (both the database ranking and the legacy fallback provide these columns)
+        card_columns = ['album', 'artist', 'total_count', 'image_url', 'rank']
+        albums_list = [
+            {
+                'album': album,
+                'artist': artist,
+                'total_count': int(total_count) if pd.notna(total_count) else 0,
+                'image_url': image_url,
+                'rank': int(rank)
+            }
+            for album, artist, total_count, image_url, rank
+            in top_albums_df[card_columns].itertuples(index=False, name=None)
+        ]
+
+        if data_version is not None:
+            with _top_albums_cache_lock:
+                _top_albums_cache[cache_key] = (data_version, time.time(), albums_list)
 
         return jsonify({'albums': albums_list})
 
     except Exception as e:
-        print(f"❌ DEBUG: Top albums error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Top albums error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @music_bp.route('/tracks/saved')
@@ -284,8 +408,14 @@ def get_saved_tracks():
     """Get user's saved tracks"""
     try:
         user_id = get_jwt_identity()
+        validate_user_access(user_id, get_jwt())
         limit = min(int(request.args.get('limit', 20)), 50)
         offset = int(request.args.get('offset', 0))
+
+        cache_key = ('saved_tracks', user_id, limit)
+        cached = _cached_view(cache_key)
+        if cached is not None:
+            return jsonify(cached)
         
         spotify_api = get_spotify_api_for_user()
         saved_tracks_data = spotify_api.get_saved_tracks(limit=limit)
@@ -310,10 +440,12 @@ def get_saved_tracks():
                 'external_urls': {'spotify': f"https://open.spotify.com/track/{track.get('id', '')}"}
             })
 
-        return jsonify({
+        payload = {
             'saved_tracks': formatted_tracks,
             'total': len(formatted_tracks)
-        })
+        }
+        _remember_view(cache_key, payload)
+        return jsonify(payload)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -324,8 +456,14 @@ def get_playlists():
     """Get user's playlists"""
     try:
         user_id = get_jwt_identity()
+        validate_user_access(user_id, get_jwt())
         limit = min(int(request.args.get('limit', 20)), 50)
         offset = int(request.args.get('offset', 0))
+
+        cache_key = ('playlists', user_id, limit)
+        cached = _cached_view(cache_key)
+        if cached is not None:
+            return jsonify(cached)
         
         spotify_api = get_spotify_api_for_user()
         playlists_data = spotify_api.get_playlists(limit=limit)
@@ -349,10 +487,12 @@ def get_playlists():
                 'image_url': playlist.get('image_url', '')  # Add direct field
             })
 
-        return jsonify({
+        payload = {
             'playlists': formatted_playlists,
             'total': len(formatted_playlists)
-        })
+        }
+        _remember_view(cache_key, payload)
+        return jsonify(payload)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -363,32 +503,29 @@ def get_current_track():
     """Get currently playing track"""
     try:
         user_id = get_jwt_identity()
-        print(f"🔍 DEBUG: Getting current track for user: {user_id}")
+        logger.debug("Getting current track for user: %s", user_id)
 
         spotify_api = get_spotify_api_for_user()
-        print("✅ DEBUG: SpotifyAPI initialized for current track")
+        logger.debug("SpotifyAPI initialized for current track")
 
         current_track = spotify_api.get_currently_playing()
-        print(f"🔍 DEBUG: Current track response: {current_track is not None}")
+        logger.debug("Current track response: %s", current_track is not None)
         
         if not current_track or not current_track.get('track'):
             return jsonify({'currently_playing': None})
         
         # SpotifyAPI.get_currently_playing() returns processed format, not raw Spotify API
-        formatted_track = {
-            'id': current_track.get('id', ''),
-            'track': current_track.get('track', 'Unknown Track'),  # PRIMARY field
-            'name': current_track.get('track', 'Unknown Track'),   # Compatibility
-            'artist': current_track.get('artist', 'Unknown Artist'),
-            'album': current_track.get('album', 'Unknown Album'),
-            'duration_ms': current_track.get('duration_ms', 0),
-            'progress_ms': current_track.get('progress_ms', 0),
-            'is_playing': current_track.get('is_playing', False),
-            'preview_url': current_track.get('preview_url'),
-            'external_urls': {'spotify': f"https://open.spotify.com/track/{current_track.get('id', '')}"},
-            'images': [{'url': current_track.get('image_url', '')}] if current_track.get('image_url') else [],
-            'image_url': current_track.get('image_url', '')
-        }
+        formatted_track = _format_current_track(
+            current_track.get('id', ''),
+            (current_track.get('progress_ms') or 0) // 1000,
+            current_track.get('duration_ms') or 0,
+            current_track.get('is_playing', False),
+            current_track.get('track', 'Unknown Track'),
+            current_track.get('artist', 'Unknown Artist'),
+            current_track.get('album', 'Unknown Album'),
+            current_track.get('image_url', ''),
+            current_track.get('preview_url')
+        )
         
         return jsonify({'currently_playing': formatted_track})
         
@@ -410,39 +547,42 @@ def refresh_listening_data():
         db_path = get_user_database_path(user_id)
         db = SpotifyDatabase(db_path)
         
-        # Get Spotify API
-        spotify_api = get_spotify_api_for_user()
-        
-        # Get recent listening data
-        recently_played = spotify_api.get_recently_played(limit=50)
-        
-        if not recently_played:
+        # The refresh button should show fresh sections, not the cached ones,
+        # even when the poll below is throttled
+        clear_view_cache(user_id)
+
+        # Nothing new can have been played since a poll a few seconds ago
+        if not claim_recently_played_poll(user_id):
             return jsonify({
-                'message': 'No recent listening data found',
+                'message': 'Listening data was refreshed moments ago',
                 'updated_count': 0
             })
-        
-        updated_count = 0
-        from datetime import datetime
-        
-        for track in recently_played:
-            try:
-                # Save track to database
-                db.save_track(track)
-                
-                # Save listening history
-                db.save_listening_history(
-                    user_id=user_id,
-                    track_id=track['id'],
-                    played_at=track.get('played_at', datetime.now().isoformat()),
-                    source='recently_played'
-                )
-                
-                updated_count += 1
-                
-            except Exception as e:
-                print(f"Error updating track {track.get('id', 'unknown')}: {e}")
-                continue
+
+        try:
+            # Get Spotify API
+            spotify_api = get_spotify_api_for_user()
+
+            # Get recent listening data, only asking Spotify for plays newer than what we have
+            latest_known_ms = db.get_latest_played_at_ms(user_id)
+            recently_played = spotify_api.get_recently_played(limit=50, after=latest_known_ms)
+
+            if not recently_played:
+                return jsonify({
+                    'message': 'No recent listening data found',
+                    'updated_count': 0
+                })
+
+            # Save tracks and listening history in one transaction
+            now = datetime.now().isoformat()
+            updated_count = db.save_tracks_with_history_bulk(
+                recently_played,
+                [(user_id, track.get('id'), track.get('played_at', now), 'recently_played')
+                 for track in recently_played]
+            )
+        except Exception:
+            # A failed poll or save shouldn't hold off the next refresh for the whole interval
+            release_recently_played_poll(user_id)
+            raise
         
         return jsonify({
             'message': f'Updated {updated_count} recent tracks',
@@ -466,18 +606,10 @@ def fix_missing_audio_features():
         # Get Spotify API
         spotify_api = get_spotify_api_for_user()
         
-        # Get tracks without audio features
-        import sqlite3
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
+        # Get tracks without audio features (on this thread's persistent connection)
+        cursor = get_thread_connection(db_path).cursor()
         
-        cursor.execute("""
-            SELECT track_id, name, artist 
-            FROM tracks 
-            WHERE energy IS NULL 
-            AND track_id NOT LIKE 'genre-%'
-            LIMIT 50
-        """)
+        cursor.execute(_MISSING_FEATURES_SQL)
         
         tracks_without_features = cursor.fetchall()
         
@@ -487,52 +619,26 @@ def fix_missing_audio_features():
                 'updated_count': 0
             })
         
-        updated_count = 0
-        
-        # Get audio features for each track and update database
+        # Get audio features for all tracks in one request, then update the database
+        audio_features_map = spotify_api.get_audio_features_batch([row[0] for row in tracks_without_features])
+        update_rows = []
         for track_id, name, artist in tracks_without_features:
-            try:
-                # Get audio features using the API method
-                audio_features = spotify_api.get_audio_features_safely(track_id)
-                
-                # Update the track in database
-                cursor.execute("""
-                    UPDATE tracks SET
-                        danceability = ?,
-                        energy = ?,
-                        key = ?,
-                        loudness = ?,
-                        mode = ?,
-                        speechiness = ?,
-                        acousticness = ?,
-                        instrumentalness = ?,
-                        liveness = ?,
-                        valence = ?,
-                        tempo = ?
-                    WHERE track_id = ?
-                """, (
-                    audio_features.get('danceability'),
-                    audio_features.get('energy'),
-                    audio_features.get('key'),
-                    audio_features.get('loudness'),
-                    audio_features.get('mode'),
-                    audio_features.get('speechiness'),
-                    audio_features.get('acousticness'),
-                    audio_features.get('instrumentalness'),
-                    audio_features.get('liveness'),
-                    audio_features.get('valence'),
-                    audio_features.get('tempo'),
-                    track_id
-                ))
-                
-                updated_count += 1
-                
-            except Exception as e:
-                print(f"Error updating audio features for {track_id}: {e}")
+            audio_features = audio_features_map.get(track_id)
+            if not audio_features:
+                # No features came back (e.g. a 403 or a partial batch); leave the row alone
                 continue
-        
-        conn.commit()
-        conn.close()
+            update_rows.append(tuple(audio_features.get(feature) for feature in _AUDIO_FEATURE_COLUMNS) + (track_id,))
+
+        # The write gets its own connection; the transaction rolls back on failure
+        # instead of being left open on the reused thread connection
+        if update_rows:
+            conn = connect(db_path)
+            try:
+                with conn:
+                    conn.executemany(_UPDATE_FEATURES_SQL, update_rows)
+            finally:
+                conn.close()
+        updated_count = len(update_rows)
         
         return jsonify({
             'message': f'Updated audio features for {updated_count} tracks',
@@ -4,13 +4,27 @@ User profile and statistics endpoints
 
 from flask import Blueprint, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
-from modules.database import SpotifyDatabase
-from modules.api import SpotifyAPI
+from modules.database import SpotifyDatabase, get_thread_connection, get_data_version, get_library_stats
+from modules.api import SpotifyAPI, fetch_concurrently
+from modules.data_collector import submit_historical_collection, is_collection_running
+from modules.genre_extractor import submit_genre_extraction
+import logging
 import os
+import re
 import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
 
 user_bp = Blueprint('user', __name__)
 
+# Stat card payloads per user, reused until new plays/tracks land or the TTL
+# lapses (the playlist count comes from the Spotify API)
+STATS_CACHE_TTL = 300  # seconds
+_stats_cache = {}
+_stats_cache_lock = threading.Lock()
+
 def validate_user_access(user_id, claims):
     """Validate user has access to their own data only"""
     if not user_id:
@@ -32,7 +46,6 @@ def get_secure_database_path(user_id):
         raise Exception('Invalid user ID for database access')
     
     # Sanitize user ID to prevent path traversal
-    import re
     safe_user_id = re.sub(r'[^a-zA-Z0-9_-]', '', user_id)
     if safe_user_id != user_id:
         raise Exception('User ID contains invalid characters')
@@ -65,16 +78,16 @@ def get_user_spotify_api():
             token_info = {
                 'access_token': claims.get('spotify_access_token'),
                 'token_type': 'Bearer',
-                'expires_in': 3600,  # 1 hour
+                'expires_at': claims.get('iat', int(time.time())) + 3600,  # Spotify token is issued with the JWT
                 'refresh_token': claims.get('spotify_refresh_token'),
                 'scope': spotify_api.scopes
             }
-            spotify_api.sp.auth_manager.token_info = token_info
+            spotify_api.use_token(token_info)
 
         return spotify_api
 
     except Exception as e:
-        print(f"❌ Error creating SpotifyAPI: {e}")
+        logger.warning("Error creating SpotifyAPI: %s", e)
         return None
 
 def get_spotify_api_for_user():
@@ -102,16 +115,16 @@ def get_spotify_api_for_user():
             token_info = {
                 'access_token': claims.get('spotify_access_token'),
                 'token_type': 'Bearer',
-                'expires_in': 3600,  # 1 hour
+                'expires_at': claims.get('iat', int(time.time())) + 3600,  # Spotify token is issued with the JWT
                 'refresh_token': claims.get('spotify_refresh_token'),
                 'scope': spotify_api.scopes
             }
-            spotify_api.sp.auth_manager.token_info = token_info
+            spotify_api.use_token(token_info)
 
         return spotify_api
 
     except Exception as e:
-        print(f"❌ DEBUG: Error initializing SpotifyAPI: {e}")
+        logger.warning("Error initializing SpotifyAPI: %s", e)
         raise
 
 @user_bp.route('/profile')
@@ -134,7 +147,7 @@ def get_profile():
         return jsonify(user_data)
 
     except Exception as e:
-        print(f"❌ Profile error: {e}")
+        logger.warning("Profile error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @user_bp.route('/collect-data', methods=['POST'])
@@ -146,27 +159,22 @@ def collect_initial_data():
         db_path = get_secure_database_path(user_id)
         
         # Initialize components
-        from modules.data_collector import SpotifyDataCollector
-        from modules.database import SpotifyDatabase
         spotify_api = get_spotify_api_for_user()
         
         if not spotify_api:
             return jsonify({'error': 'Failed to initialize Spotify API'}), 500
             
-        # Initialize database and data collector
+        # Collection makes many paced Spotify calls, so it runs in the background
+        # and the client is answered straight away
         user_db = SpotifyDatabase(db_path)
-        collector = SpotifyDataCollector(spotify_api, user_db)
-        
-        # Collect basic data using the correct method
-        success = collector.collect_historical_data(user_id)
-        
-        if success:
-            return jsonify({'message': 'Data collection and genre extraction completed successfully'})
-        else:
-            return jsonify({'error': 'Data collection failed'}), 500
+        if submit_historical_collection(spotify_api, user_db, user_id):
+            return jsonify({'message': 'Data collection started, genre extraction will follow in background'}), 202
+        if is_collection_running(user_id):
+            return jsonify({'message': 'Data collection already in progress'}), 202
+        return jsonify({'message': 'Data was collected recently, nothing to do'})
         
     except Exception as e:
-        print(f"❌ Data collection error: {e}")
+        logger.warning("Data collection error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @user_bp.route('/stats')
@@ -184,6 +192,15 @@ def get_stats():
 
         # Initialize components
         db = SpotifyDatabase(db_path)
+
+        # Unchanged data means unchanged cards; skip the queries and API calls
+        data_version = get_data_version(get_thread_connection(db_path).cursor())
+        with _stats_cache_lock:
+            cached = _stats_cache.get(user_id)
+        if (data_version is not None and cached and cached[0] == data_version
+                and time.time() - cached[1] < STATS_CACHE_TTL):
+            return jsonify(cached[2])
+
         spotify_api = get_spotify_api_for_user()
 
         # Get basic statistics from database
@@ -194,47 +211,28 @@ def get_stats():
             'listening_time_minutes': 0
         }
 
-        # Query database for statistics using proper database connection
+        # One aggregate query, shared with the wrapped summary for the same data version
         try:
-            import sqlite3
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-
-            # Count tracks
-            cursor.execute("SELECT COUNT(*) FROM tracks")
-            result = cursor.fetchone()
-            db_stats['total_tracks'] = result[0] if result and result[0] else 0
-
-            # Count unique artists
-            cursor.execute("SELECT COUNT(DISTINCT artist) FROM tracks")
-            result = cursor.fetchone()
-            db_stats['total_artists'] = result[0] if result and result[0] else 0
-
-            # Count unique albums
-            cursor.execute("SELECT COUNT(DISTINCT album) FROM tracks")
-            result = cursor.fetchone()
-            db_stats['total_albums'] = result[0] if result and result[0] else 0
-
-            # Calculate total listening time
-            cursor.execute("SELECT SUM(duration_ms) FROM tracks")
-            result = cursor.fetchone()
-            total_duration_ms = result[0] if result and result[0] else 0
+            library_stats = get_library_stats(db_path, data_version)
+            db_stats['total_tracks'] = library_stats['total_tracks']
+            db_stats['total_artists'] = library_stats['total_artists']
+            db_stats['total_albums'] = library_stats['total_albums']
+            total_duration_ms = library_stats['total_duration_ms']
             db_stats['listening_time_minutes'] = round(total_duration_ms / 60000, 2) if total_duration_ms else 0
 
-            conn.close()
-
         except Exception as db_error:
-            print(f"Database query error: {db_error}")
+            logger.warning("Database query error: %s", db_error)
 
         # Get additional stats from Spotify API
         api_stats = {}
         try:
-            # Get playlists count
-            playlists = spotify_api.get_playlists()
+            # Get playlists (for the count) and top tracks (for real-time display) in parallel
+            playlists, top_tracks = fetch_concurrently(
+                (spotify_api.get_playlists, {}),
+                (spotify_api.get_top_tracks, {'limit': 20})
+            )
             api_stats['total_playlists'] = len(playlists) if playlists else 0
 
-            # Get top tracks for real-time display
-            top_tracks = spotify_api.get_top_tracks(limit=20)
             if top_tracks:
                 api_stats['api_tracks'] = len(top_tracks)
                 artists = set(track.get('artist', '') for track in top_tracks)
@@ -251,7 +249,7 @@ def get_stats():
                 })
                 
         except Exception as api_error:
-            print(f"API query error: {api_error}")
+            logger.warning("API query error: %s", api_error)
 
         # Combine stats (prefer database stats if available, otherwise use API stats)
         final_stats = {
@@ -262,6 +260,10 @@ def get_stats():
             'listening_time_minutes': db_stats['listening_time_minutes'] or api_stats.get('listening_time_minutes', 0)
         }
 
+        if data_version is not None:
+            with _stats_cache_lock:
+                _stats_cache[user_id] = (data_version, time.time(), final_stats)
+
         return jsonify(final_stats)
 
     except Exception as e:
@@ -270,31 +272,26 @@ def get_stats():
 @user_bp.route('/extract-genres', methods=['POST'])
 @jwt_required()
 def extract_genres():
-    """Extract genres for user's artists"""
+    """Start genre extraction for user's artists in the background"""
     try:
         user_id = get_jwt_identity()
         db_path = get_secure_database_path(user_id)
         
         # Initialize components
-        from modules.genre_extractor import GenreExtractor
-        from modules.database import SpotifyDatabase
         spotify_api = get_spotify_api_for_user()
         
         if not spotify_api:
             return jsonify({'error': 'Failed to initialize Spotify API'}), 500
             
-        # Initialize database and genre extractor
+        # Queue extraction from recent tracks; the genres endpoint picks up results as they land
         user_db = SpotifyDatabase(db_path)
-        genre_extractor = GenreExtractor(spotify_api, user_db)
-        
-        # Extract genres from recent tracks
-        genres_extracted = genre_extractor.extract_genres_from_recent_tracks(max_artists=50)
+        started = submit_genre_extraction(spotify_api, user_db, max_artists=50)
         
         return jsonify({
-            'message': f'Successfully extracted {genres_extracted} genres',
-            'genres_extracted': genres_extracted
-        })
+            'message': 'Genre extraction started' if started else 'Genre extraction already in progress',
+            'status': 'started' if started else 'running'
+        }), 202
         
     except Exception as e:
-        print(f"❌ Genre extraction error: {e}")
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        logger.warning("Genre extraction error: %s", e)
+        return jsonify({'error': str(e)}), 500
@@ -8,25 +8,24 @@ from flask_jwt_extended import JWTManager, create_access_token, jwt_required, ge
 from flask_cors import CORS
 from dotenv import load_dotenv
 import os
+import logging
 from datetime import timedelta, datetime
 
-# Import existing modules
-from modules.api import SpotifyAPI
-from modules.database import SpotifyDatabase
-from modules.data_collector import SpotifyDataCollector
-from modules.analyzer import ListeningPersonalityAnalyzer
-from modules.ai_personality_enhancer import EnhancedPersonalityAnalyzer
-from modules.enhanced_stress_detector import EnhancedStressDetector
-from modules.genre_evolution_tracker import GenreEvolutionTracker
-from modules.wellness_analyzer import WellnessAnalyzer
-from modules.top_albums import get_top_albums
-from modules.genre_extractor import GenreExtractor
+# The AI/ML modules (Gemini, sklearn) are imported by the ai_insights endpoints
+# on first use, so workers don't load them at boot
+from modules.json_provider import install_json_provider
 
 # Load environment variables
 load_dotenv()
 
+# LOG_LEVEL=DEBUG turns on the per-request debug output
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper(),
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
 def create_app():
     app = Flask(__name__)
+    install_json_provider(app)
 
     # Security Configuration
     import secrets
@@ -50,7 +49,7 @@ def create_app():
 
     # CORS configuration for production
     allowed_origins = os.getenv('ALLOWED_ORIGINS', 'http://localhost:3000').split(',')
-    print(f"🔍 CORS: Allowed origins: {allowed_origins}")
+    logger.info("CORS: Allowed origins: %s", allowed_origins)
     
     CORS(app,
          origins=allowed_origins,
@@ -63,11 +62,12 @@ def create_app():
     import time
     request_counts = defaultdict(list)
     
-    # Add CORS debugging
-    @app.before_request
-    def log_request():
-        print(f"🔍 Request: {request.method} {request.path} from {request.headers.get('Origin', 'No Origin')}")
-        print(f"🔍 Headers: {dict(request.headers)}")
+    # Add CORS debugging (only registered when debug logging is on)
+    if logger.isEnabledFor(logging.DEBUG):
+        @app.before_request
+        def log_request():
+            logger.debug("Request: %s %s from %s", request.method, request.path, request.headers.get('Origin', 'No Origin'))
+            logger.debug("Headers: %s", dict(request.headers))
     
     # Security middleware
     @app.before_request
@@ -118,7 +118,8 @@ def create_app():
     # Security headers
     @app.after_request
     def add_security_headers(response):
-        print(f"🔍 Response headers: {dict(response.headers)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Response headers: %s", dict(response.headers))
         response.headers['X-Content-Type-Options'] = 'nosniff'
         response.headers['X-Frame-Options'] = 'DENY'
         response.headers['X-XSS-Protection'] = '1; mode=block'
@@ -159,9 +160,7 @@ def create_app():
     
     @app.errorhandler(500)
     def internal_error(error):
-        import traceback
-        error_details = traceback.format_exc()
-        print(f"❌ 500 Error: {error_details}")
+        logger.exception("500 Error: %s", error)
         return jsonify({
             'error': 'Internal server error',
             'details': str(error) if app.debug else 'Check server logs'
@@ -174,4 +173,4 @@ if __name__ == '__main__':
     # Disable debug mode in production to avoid multiprocessing issues
     debug_mode = os.getenv('FLASK_ENV') == 'development'
     port = int(os.getenv('PORT', 5000))
-    app.run(debug=debug_mode, host='0.0.0.0', port=port)
+    app.run(debug=debug_mode, threaded=True, host='0.0.0.0', port=port)
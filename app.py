@@ -13,20 +13,22 @@ import sqlite3
 # Import blueprints
 from api.auth import auth_bp
 from api.user import user_bp
-from api.music import music_bp
+from api.music import music_bp, clear_view_cache
 from api.analytics import analytics_bp
 from api.ai_insights import ai_bp
 
 # Import modules
 from modules.database import SpotifyDatabase
-from modules.api import SpotifyAPI
+from modules.api import SpotifyAPI, clear_token_cache, clear_response_cache, clear_auth_codes
 from modules.sample_data_generator import SampleDataGenerator
+from modules.json_provider import install_json_provider
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+# Configure logging; LOG_LEVEL=DEBUG turns on the per-request debug output
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper(), format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+install_json_provider(app)
 
 # Load configuration from environment variables
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', secrets.token_urlsafe(32)) # Change this in production!
@@ -169,6 +171,10 @@ def clear_all_data():
         # The cache path is constructed in modules/api.py, so we need to replicate it
         client_id_prefix = get_jwt().get('client_id', '')[:8]
         user_cache_pattern = f'/tmp/.spotify_cache_{user_id}_{client_id_prefix}*'
+        clear_token_cache(f'/tmp/.spotify_cache_{user_id}_{client_id_prefix}')
+        clear_response_cache(user_id)
+        clear_auth_codes(user_id)
+        clear_view_cache(user_id)
         for cache_file in glob.glob(user_cache_pattern):
             try:
                 os.remove(cache_file)
@@ -225,6 +231,8 @@ def cleanup_old_dbs():
 
         # Clean up old Spotify cache files
         spotify_cache_pattern = '/tmp/.spotify_cache_*'
+        clear_token_cache()
+        clear_auth_codes()
         for cache_file in glob.glob(spotify_cache_pattern):
             try:
                 os.remove(cache_file)
@@ -251,5 +259,6 @@ if __name__ == '__main__':
     # In a production environment like Leapcell, this block might not be directly executed
     # as the server is typically run by a WSGI server (e.g., Gunicorn).
     # However, for local testing or specific deployment setups, it's useful.
-    logger.info("Starting Flask app in development mode")
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    debug_mode = os.getenv('FLASK_ENV') == 'development'
+    logger.info(f"Starting Flask app (debug={debug_mode})")
+    app.run(debug=debug_mode, threaded=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -11,6 +11,85 @@ import os
 import threading
 import time
 
+# The pages are static apart from the error message, so they are built once
+_SUCCESS_HTML = '''
+<!DOCTYPE html>
+<html>
+<head>
+    <title>Spotify Authorization Successful</title>
+    <style>
+        body { 
+            font-family: Arial, sans-serif; 
+            background: #191414; 
+            color: #1DB954; 
+            text-align: center; 
+            padding: 50px; 
+        }
+        .success { 
+            background: #1DB954; 
+            color: #000; 
+            padding: 20px; 
+            border-radius: 10px; 
+            display: inline-block; 
+            margin: 20px;
+        }
+    </style>
+    <script>
+        setTimeout(function() {
+            window.close();
+            // Try to redirect parent window
+            if (window.opener) {
+                window.opener.location.href = 'http://127.0.0.1:8000/';
+            }
+        }, 3000);
+    </script>
+</head>
+<body>
+    <div class="success">
+        <h2>🎵 Authorization Successful!</h2>
+        <p>You can now close this window.</p>
+        <p>Redirecting back to the app...</p>
+        <p><a href="http://127.0.0.1:8000/" style="color: #000;">Click here if not redirected automatically</a></p>
+    </div>
+</body>
+</html>
+'''
+_SUCCESS_HTML_BYTES = _SUCCESS_HTML.encode('utf-8')
+_SUCCESS_HTML_LENGTH = str(len(_SUCCESS_HTML_BYTES))
+
+_ERROR_HTML_TEMPLATE = '''
+<!DOCTYPE html>
+<html>
+<head>
+    <title>Spotify Authorization Error</title>
+    <style>
+        body { 
+            font-family: Arial, sans-serif; 
+            background: #191414; 
+            color: #FF5555; 
+            text-align: center; 
+            padding: 50px; 
+        }
+        .error { 
+            background: #FF5555; 
+            color: #000; 
+            padding: 20px; 
+            border-radius: 10px; 
+            display: inline-block; 
+            margin: 20px;
+        }
+    </style>
+</head>
+<body>
+    <div class="error">
+        <h2>❌ Authorization Error</h2>
+        <p>%s</p>
+        <p><a href="http://127.0.0.1:8000/" style="color: #000;">Return to app</a></p>
+    </div>
+</body>
+</html>
+'''
+
 class CallbackHandler(BaseHTTPRequestHandler):
     def do_GET(self):
         """Handle GET requests to the callback endpoint."""
@@ -50,92 +129,22 @@ class CallbackHandler(BaseHTTPRequestHandler):
     def send_success_response(self):
         """Send a success response with auto-redirect."""
         self.send_response(200)
-        self.send_header('Content-type', 'text/html')
-        self.end_headers()
-        
-        html_response = '''
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>Spotify Authorization Successful</title>
-            <style>
-                body { 
-                    font-family: Arial, sans-serif; 
-                    background: #191414; 
-                    color: #1DB954; 
-                    text-align: center; 
-                    padding: 50px; 
-                }
-                .success { 
-                    background: #1DB954; 
-                    color: #000; 
-                    padding: 20px; 
-                    border-radius: 10px; 
-                    display: inline-block; 
-                    margin: 20px;
-                }
-            </style>
-            <script>
-                setTimeout(function() {
-                    window.close();
-                    // Try to redirect parent window
-                    if (window.opener) {
-                        window.opener.location.href = 'http://127.0.0.1:8000/';
-                    }
-                }, 3000);
-            </script>
-        </head>
-        <body>
-            <div class="success">
-                <h2>🎵 Authorization Successful!</h2>
-                <p>You can now close this window.</p>
-                <p>Redirecting back to the app...</p>
-                <p><a href="http://127.0.0.1:8000/" style="color: #000;">Click here if not redirected automatically</a></p>
-            </div>
-        </body>
-        </html>
-        '''
-        self.wfile.write(html_response.encode())
+        self._send_html_headers(_SUCCESS_HTML_LENGTH)
+        self.wfile.write(_SUCCESS_HTML_BYTES)
     
     def send_error_response(self, error_message):
         """Send an error response."""
+        body = (_ERROR_HTML_TEMPLATE % error_message).encode('utf-8')
         self.send_response(400)
-        self.send_header('Content-type', 'text/html')
+        self._send_html_headers(str(len(body)))
+        self.wfile.write(body)
+    
+    def _send_html_headers(self, content_length):
+        """Send headers for an HTML page; the pages carry one-time OAuth results, so they are never cached."""
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', content_length)
+        self.send_header('Cache-Control', 'private, max-age=0, no-store')
         self.end_headers()
-        
-        html_response = f'''
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>Spotify Authorization Error</title>
-            <style>
-                body {{ 
-                    font-family: Arial, sans-serif; 
-                    background: #191414; 
-                    color: #FF5555; 
-                    text-align: center; 
-                    padding: 50px; 
-                }}
-                .error {{ 
-                    background: #FF5555; 
-                    color: #000; 
-                    padding: 20px; 
-                    border-radius: 10px; 
-                    display: inline-block; 
-                    margin: 20px;
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="error">
-                <h2>❌ Authorization Error</h2>
-                <p>{error_message}</p>
-                <p><a href="http://127.0.0.1:8000/" style="color: #000;">Return to app</a></p>
-            </div>
-        </body>
-        </html>
-        '''
-        self.wfile.write(html_response.encode())
     
     def log_message(self, format, *args):
         """Override to reduce log noise."""
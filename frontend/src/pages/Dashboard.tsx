@@ -32,6 +32,9 @@ interface Track {
   popularity: number
   duration_ms: number
   progress_ms?: number
+  progress_percent?: number
+  progress_str?: string
+  duration_str?: string
   is_playing?: boolean
   images: Array<{ url: string }>
 }
@@ -59,11 +62,13 @@ const Dashboard: React.FC = () => {
     fetchDashboardData()
   }, [isDemoMode])
 
-  // Auto-refresh currently playing track every 30 seconds
+  // Auto-refresh currently playing track every 30 seconds while the tab is visible
   useEffect(() => {
     if (isDemoMode) return
     
     const refreshCurrentTrack = async () => {
+      // Skip ticks for background tabs; the visibility handler catches up on return
+      if (document.hidden) return
       try {
         const { default: api } = await import('../api')
         const currentRes = await api.get('/music/tracks/current')
@@ -74,8 +79,12 @@ const Dashboard: React.FC = () => {
     }
     
     const interval = setInterval(refreshCurrentTrack, 30000) // 30 seconds
+    document.addEventListener('visibilitychange', refreshCurrentTrack)
     
-    return () => clearInterval(interval)
+    return () => {
+      clearInterval(interval)
+      document.removeEventListener('visibilitychange', refreshCurrentTrack)
+    }
   }, [isDemoMode])
 
   const refreshListeningData = async () => {
@@ -321,18 +330,20 @@ const Dashboard: React.FC = () => {
                     <div 
                       className="progress-fill"
                       style={{ 
-                        width: currentTrack.duration_ms > 0 
-                          ? `${Math.min(100, Math.max(0, (currentTrack.progress_ms || 0) / currentTrack.duration_ms * 100))}%`
-                          : '0%'
+                        width: currentTrack.progress_percent !== undefined
+                          ? `${currentTrack.progress_percent}%`
+                          : currentTrack.duration_ms > 0 
+                            ? `${Math.min(100, Math.max(0, (currentTrack.progress_ms || 0) / currentTrack.duration_ms * 100))}%`
+                            : '0%'
                       }}
                     />
                   </div>
                   <div className="time-indicators">
                     <span className="current-time">
-                      {formatDuration(currentTrack.progress_ms || 0)}
+                      {currentTrack.progress_str ?? formatDuration(currentTrack.progress_ms || 0)}
                     </span>
                     <span className="total-time">
-                      {formatDuration(currentTrack.duration_ms)}
+                      {currentTrack.duration_str ?? formatDuration(currentTrack.duration_ms)}
                     </span>
                   </div>
                 </div>
@@ -1,12 +1,12 @@
 """AI-powered personality enhancement and content-based recommendations."""
 import google.generativeai as genai
-import sqlite3
 import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 import os
 from dotenv import load_dotenv
+from modules.database import get_thread_connection
 
 load_dotenv()
 
@@ -69,7 +69,8 @@ class EnhancedPersonalityAnalyzer:
     
     def _get_user_listening_data(self, user_id: str) -> Dict:
         """Get comprehensive user listening data from database."""
-        conn = sqlite3.connect(self.db_path)
+        # Read-only, on this thread's persistent connection
+        conn = get_thread_connection(self.db_path)
         cursor = conn.cursor()
         
         try:
@@ -91,12 +92,16 @@ class EnhancedPersonalityAnalyzer:
             
             stats = cursor.fetchone()
             
-            # Get top artist
+            # Get top artist, counting plays per track before joining tracks
             cursor.execute('''
-                SELECT t.artist, COUNT(*) as play_count
-                FROM listening_history h
-                JOIN tracks t ON h.track_id = t.track_id
-                WHERE h.user_id = ?
+                SELECT t.artist, SUM(plays.play_count) as play_count
+                FROM (
+                    SELECT track_id, COUNT(*) as play_count
+                    FROM listening_history
+                    WHERE user_id = ?
+                    GROUP BY track_id
+                ) plays
+                JOIN tracks t ON t.track_id = plays.track_id
                 GROUP BY t.artist
                 ORDER BY play_count DESC
                 LIMIT 1
@@ -192,8 +197,6 @@ class EnhancedPersonalityAnalyzer:
                 'avg_valence': 0.5,
                 'avg_danceability': 0.5
             }
-        finally:
-            conn.close()
     
     def _generate_llm_description(self, user_data: Dict) -> str:
         """Generate personality description using Gemini."""
@@ -332,7 +335,8 @@ class EnhancedPersonalityAnalyzer:
 
     def _get_content_based_recommendations(self, user_id: str, limit: int = 5) -> List[Dict]:
         """Get recommendations based on user's personal music DNA (content-based filtering)."""
-        conn = sqlite3.connect(self.db_path)
+        # Read-only, on this thread's persistent connection
+        conn = get_thread_connection(self.db_path)
         cursor = conn.cursor()
 
         try:
@@ -474,8 +478,6 @@ class EnhancedPersonalityAnalyzer:
         except Exception as e:
             print(f"Error generating content-based recommendations: {e}")
             return []
-        finally:
-            conn.close()
 
     def _generate_recommendation_reason(self, similarity: float, user_features: np.array, track_features: np.array, is_genre_match: bool = False) -> str:
         """Generate a personalized reason for the recommendation."""
@@ -4,6 +4,8 @@ from datetime import datetime, timedelta
 from collections import Counter
 from typing import Dict, List, Any, Tuple
 
+from modules.api import fetch_concurrently
+
 class ListeningPersonalityAnalyzer:
     """
     Analyzes a user's listening habits to determine their music personality.
@@ -26,11 +28,14 @@ class ListeningPersonalityAnalyzer:
             Dictionary with personality traits and metrics
         """
         try:
-            # Collect all necessary data
-            recently_played = self.spotify_api.get_recently_played(limit=50)
-            top_tracks = self.spotify_api.get_top_tracks(limit=50)
-            top_artists = self.spotify_api.get_top_artists(limit=20)
-            audio_features = self.spotify_api.get_audio_features_for_top_tracks(limit=50)
+            # Collect all necessary data; the four calls are independent and the
+            # scoring below is light, so the fetches dominate and run in parallel
+            recently_played, top_tracks, top_artists, audio_features = fetch_concurrently(
+                (self.spotify_api.get_recently_played, {'limit': 50}),
+                (self.spotify_api.get_top_tracks, {'limit': 50}),
+                (self.spotify_api.get_top_artists, {'limit': 20}),
+                (self.spotify_api.get_audio_features_for_top_tracks, {'limit': 50})
+            )
             
             # Check if we have enough data
             if not recently_played or not top_tracks or not top_artists:
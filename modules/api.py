@@ -1,11 +1,23 @@
 import spotipy
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from spotipy.oauth2 import SpotifyOAuth
+from spotipy.cache_handler import CacheFileHandler
 import os
+import re
+import glob
+import json
+import hashlib
 import time
 import pandas as pd
 import random
 import logging
-from functools import lru_cache
+import threading
+import inspect
+import stat
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, wraps
 from typing import Dict, List, Optional, Union, Any
 
 # Import the AI audio feature extractor
@@ -14,10 +26,406 @@ from modules.genre_cache import get_genre_cache
 from modules.sample_data_generator import SampleDataGenerator
 
 # Configure logging
-logging.basicConfig(level=logging.WARNING,  # Changed from INFO to WARNING
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'WARNING').upper(),  # Changed from INFO to WARNING
                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger('spotify_api')
 
+# Profiles are shared across SpotifyAPI instances: the REST layer builds a fresh
+# instance per request, so a per-instance cache alone never gets a hit.
+USER_PROFILE_CACHE_TTL = 300  # seconds
+_user_profile_cache = {}
+_user_profile_cache_lock = threading.Lock()
+
+def remember_user_profile(user_id, profile):
+    """Seed the shared profile cache, e.g. with the profile fetched during login."""
+    with _user_profile_cache_lock:
+        _user_profile_cache[user_id] = (time.time(), profile)
+
+# OAuth tokens by cache path, shared the same way so each request's client
+# reuses the token (and any refresh of it) instead of re-reading the cache file
+_token_cache = {}
+_token_cache_lock = threading.Lock()
+
+class TokenCacheHandler(CacheFileHandler):
+    """
+    Cache file handler that keeps the token in memory.
+
+    spotipy asks the handler for the token before every API call and refreshes it
+    itself once it is within 60 seconds of expires_at, so holding it in memory
+    skips a file read and JSON parse per call. Handlers created with shared=True
+    also share the token with other SpotifyAPI instances for the same cache path;
+    anonymous clients keep it to themselves so users can't pick up each other's tokens.
+    """
+
+    def __init__(self, cache_path, shared=True):
+        super().__init__(cache_path=cache_path)
+        self.shared = shared
+        self._token_info = None
+
+    def get_cached_token(self):
+        if self._token_info is None and self.shared:
+            with _token_cache_lock:
+                self._token_info = _token_cache.get(self.cache_path)
+        if self._token_info is None:
+            self._token_info = super().get_cached_token()
+            if self._token_info and self.shared:
+                with _token_cache_lock:
+                    _token_cache.setdefault(self.cache_path, self._token_info)
+        return self._token_info
+
+    def save_token_to_cache(self, token_info):
+        self._token_info = token_info
+        if self.shared:
+            with _token_cache_lock:
+                _token_cache[self.cache_path] = token_info
+            super().save_token_to_cache(token_info)
+
+def clear_token_cache(path_prefix=''):
+    """Forget in-memory tokens whose cache path starts with path_prefix (all by default)."""
+    with _token_cache_lock:
+        for cache_path in [p for p in _token_cache if p.startswith(path_prefix)]:
+            del _token_cache[cache_path]
+
+# is_authenticated() probes Spotify with current_user(); a token that passed the
+# probe moments ago is trusted without another round-trip
+AUTH_CHECK_TTL = 30  # seconds
+_auth_checks = {}
+_auth_checks_lock = threading.Lock()
+
+# Authorization codes handed over by the OAuth callback, keyed by user and client.
+# They live in memory so checking for one doesn't touch the filesystem.
+_pending_auth_codes = {}
+_pending_auth_codes_lock = threading.Lock()
+
+def _auth_code_key(user_id, client_id):
+    return f'{user_id}_{client_id[:8] if client_id else "anon"}'
+
+def submit_auth_code(user_id, client_id, code):
+    """Hand an authorization code from the OAuth callback to the user's next SpotifyAPI."""
+    with _pending_auth_codes_lock:
+        _pending_auth_codes[_auth_code_key(user_id, client_id)] = code
+
+def pop_auth_code(user_id, client_id):
+    """Take the pending authorization code for a user, if there is one."""
+    with _pending_auth_codes_lock:
+        return _pending_auth_codes.pop(_auth_code_key(user_id, client_id), None)
+
+def clear_auth_codes(user_id=None):
+    """Drop pending authorization codes for one user (all users by default)."""
+    with _pending_auth_codes_lock:
+        for key in [k for k in _pending_auth_codes if user_id is None or k.startswith(f'{user_id}_')]:
+            del _pending_auth_codes[key]
+
+# Spotify may ask for waits of minutes or hours; longer ones fail the call instead
+RATE_LIMIT_MAX_WAIT = 30  # seconds
+
+def _retry_wait(error):
+    """
+    Return seconds to wait before retrying a failed Spotify call, or None if it shouldn't be retried.
+
+    Only real 429s, which carry a Retry-After header, are retried here. 5xx responses
+    were already retried with backoff by spotify_session's transport-level Retry, so
+    retrying them again would multiply the attempts. spotipy also reports transport
+    errors (e.g. exhausted retries) as a 429 with code -1 and no headers; those
+    aren't rate limits and aren't retried.
+    """
+    retry_after = _retry_after(error)
+    if retry_after is None or retry_after > RATE_LIMIT_MAX_WAIT:
+        return None
+    return retry_after
+
+def _retry_after(error):
+    """Seconds a 429 from Spotify asked us to wait, or None if it isn't a real rate limit."""
+    if getattr(error, 'http_status', None) != 429 or getattr(error, 'code', None) == -1:
+        return None
+    headers = getattr(error, 'headers', None) or {}
+    try:
+        return float(headers['Retry-After'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+# When a 429 can't be waited out, calls made with the same app credentials fail
+# fast until Retry-After has passed rather than spending more of the quota
+_rate_limited_until = {}
+_rate_limited_lock = threading.Lock()
+
+def _rate_limit_key(fn):
+    """Client ID of the app a bound spotipy method calls Spotify as."""
+    auth_manager = getattr(getattr(fn, '__self__', None), 'auth_manager', None)
+    return getattr(auth_manager, 'client_id', None)
+
+def rate_limit_remaining(client_id):
+    """Seconds until Spotify accepts calls for client_id again (0 if it isn't rate limited)."""
+    with _rate_limited_lock:
+        return max(0.0, _rate_limited_until.get(client_id, 0) - time.time())
+
+def _note_rate_limit(client_id, error):
+    """Start a rate-limit window for client_id from a 429's Retry-After header."""
+    retry_after = _retry_after(error)
+    if retry_after is None:
+        return
+    with _rate_limited_lock:
+        _rate_limited_until[client_id] = max(_rate_limited_until.get(client_id, 0), time.time() + retry_after)
+
+def call_with_retry(fn, *args, max_attempts=3, **kwargs):
+    """
+    Call a spotipy method, retrying rate limits.
+
+    429s wait for the Retry-After the response asks for (5xx errors are retried by
+    the shared session before they get here). Anything else, or the last failed
+    attempt, is raised as usual. A rate limit that isn't retried opens a window (as long
+    as its Retry-After) during which calls for the same client fail immediately with a
+    synthetic 429.
+
+    Args:
+        fn: Bound spotipy method, e.g. self.sp.current_user_top_tracks
+        max_attempts: Total number of attempts
+        *args, **kwargs: Passed through to fn
+
+    Returns:
+        Whatever fn returns
+    """
+    client_id = _rate_limit_key(fn)
+    remaining = rate_limit_remaining(client_id)
+    if remaining:
+        raise spotipy.SpotifyException(429, -1, f"Rate limited by Spotify for another {remaining:.0f}s",
+                                       headers={'Retry-After': str(int(remaining) + 1)})
+
+    for attempt in range(max_attempts):
+        try:
+            return fn(*args, **kwargs)
+        except spotipy.SpotifyException as e:
+            wait_time = _retry_wait(e)
+            if wait_time is None or attempt == max_attempts - 1:
+                if e.http_status == 429:
+                    _note_rate_limit(client_id, e)
+                raise
+            logger.warning(f"Spotify returned {e.http_status}, retrying in {wait_time:.0f}s "
+                           f"(attempt {attempt + 1}/{max_attempts})")
+            time.sleep(wait_time)
+
+# Recently played is the only data that changes minute to minute, but a play
+# takes a few minutes, so polling it more often than this per user just
+# re-fetches the same page. Stable data (profile, top lists) is cached longer.
+RECENTLY_PLAYED_POLL_INTERVAL = 60  # seconds
+_recent_polls = {}
+_recent_polls_lock = threading.Lock()
+
+def claim_recently_played_poll(user_id, min_interval=RECENTLY_PLAYED_POLL_INTERVAL):
+    """
+    Check whether a user's recently played tracks may be fetched again, and record the fetch if so.
+
+    Args:
+        user_id: User whose listening history would be polled
+        min_interval: Minimum seconds between polls for the same user
+
+    Returns:
+        True if the caller should poll Spotify now, False if the last poll is still fresh
+    """
+    now = time.time()
+    with _recent_polls_lock:
+        if now - _recent_polls.get(user_id, 0) < min_interval:
+            return False
+        _recent_polls[user_id] = now
+        return True
+
+def release_recently_played_poll(user_id):
+    """Give back a poll claimed by claim_recently_played_poll whose fetch didn't go through."""
+    with _recent_polls_lock:
+        _recent_polls.pop(user_id, None)
+
+# Responses of the slow-changing endpoints, shared across SpotifyAPI instances:
+# (user_id, method, arguments) -> (timestamp, result). Top lists move over days,
+# the library and playlists when the user edits them.
+TOP_ITEMS_CACHE_TTL = 3600  # seconds
+LIBRARY_CACHE_TTL = 600  # seconds
+RESPONSE_CACHE_MAX_ENTRIES = 1024
+_response_cache = {}
+_response_cache_lock = threading.Lock()
+
+# Responses are also written to disk so they survive restarts and are shared by
+# the gunicorn workers; a file's mtime is its fetch time. They hold users' profiles
+# and listening data, so the directory is private to the app's user (0700, files 0600)
+RESPONSE_CACHE_DIR = '/tmp/.spotifiwrapped_responses'
+
+def _response_cache_dir_ready():
+    """Create RESPONSE_CACHE_DIR if needed; False if it isn't a private directory we own."""
+    try:
+        os.makedirs(RESPONSE_CACHE_DIR, mode=0o700, exist_ok=True)
+        st = os.lstat(RESPONSE_CACHE_DIR)
+    except OSError:
+        return False
+    # Refuse a symlink or a directory someone else created or can read
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        return False
+    return True
+
+def _response_cache_prefix(user_id):
+    """Path prefix of a user's persisted responses."""
+    safe_user_id = re.sub(r'[^a-zA-Z0-9_-]', '', str(user_id))
+    return os.path.join(RESPONSE_CACHE_DIR, f'.spotify_responses_{safe_user_id}_')
+
+def _response_cache_path(key):
+    """File a cached response is persisted to; the arguments are hashed into the name."""
+    digest = hashlib.sha1(repr(key[2:]).encode()).hexdigest()[:16]
+    return f'{_response_cache_prefix(key[0])}{key[1]}_{digest}.json'
+
+def _load_persisted_response(key, ttl, now):
+    """Return (fetched_at, result) from disk if the file is younger than ttl, else None."""
+    if not _response_cache_dir_ready():
+        return None
+    path = _response_cache_path(key)
+    try:
+        fetched_at = os.path.getmtime(path)
+        if now - fetched_at >= ttl:
+            return None
+        with open(path, 'r') as f:
+            return fetched_at, json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _persist_response(key, result):
+    """Write a response to disk atomically; results that aren't plain JSON are kept in memory only."""
+    if not _response_cache_dir_ready():
+        return
+    path = _response_cache_path(key)
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(result, f)
+        os.replace(tmp_path, path)
+    except (OSError, TypeError, ValueError) as e:
+        logger.debug(f"Not persisting {key[1]} response: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+def _remember_response(key, fetched_at, result):
+    """Store a response in the in-memory cache, evicting old entries when it is full."""
+    with _response_cache_lock:
+        if len(_response_cache) >= RESPONSE_CACHE_MAX_ENTRIES:
+            # Evict the oldest quarter rather than tracking per-entry TTLs
+            for old_key in sorted(_response_cache, key=lambda k: _response_cache[k][0])[:RESPONSE_CACHE_MAX_ENTRIES // 4]:
+                del _response_cache[old_key]
+        _response_cache[key] = (fetched_at, result)
+
+def cached_response(ttl):
+    """
+    Cache a SpotifyAPI method's list result per user and arguments for ttl seconds.
+
+    Empty results (the methods' error value) and anonymous or sample-data clients
+    are never cached. Callers get fresh dict copies so they can annotate tracks freely.
+    While Spotify is rate limiting the client, an expired entry is served instead
+    of the empty error result.
+    Results are also persisted under RESPONSE_CACHE_DIR, so a restarted or different
+    worker reuses a fetch that is still within ttl instead of calling Spotify.
+    """
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        @wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            if self.use_sample_data or self.user_id == 'anonymous':
+                return fn(self, *args, **kwargs)
+
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            key = (self.user_id, fn.__name__) + tuple(bound.arguments.values())[1:]
+
+            now = time.time()
+            with _response_cache_lock:
+                cached = stale = _response_cache.get(key)
+            if not (cached and now - cached[0] < ttl):
+                # Another worker, or this one before a restart, may have fetched it already
+                cached = _load_persisted_response(key, ttl, now)
+                if cached:
+                    _remember_response(key, *cached)
+            if cached and now - cached[0] < ttl:
+                return [dict(item) for item in cached[1]]
+
+            result = fn(self, *args, **kwargs)
+            if result:
+                _remember_response(key, now, [dict(item) for item in result])
+                _persist_response(key, result)
+            elif stale and rate_limit_remaining(self.client_id):
+                logger.warning(f"Rate limited, serving cached {fn.__name__} from {now - stale[0]:.0f}s ago")
+                return [dict(item) for item in stale[1]]
+            return result
+        return wrapper
+    return decorator
+
+def clear_response_cache(user_id=None):
+    """Forget cached Spotify responses for one user (all users by default), on disk too."""
+    with _response_cache_lock:
+        for key in [k for k in _response_cache if user_id is None or k[0] == user_id]:
+            del _response_cache[key]
+
+    prefix = _response_cache_prefix(user_id) if user_id is not None else os.path.join(RESPONSE_CACHE_DIR, '.spotify_responses_')
+    for path in glob.glob(f'{glob.escape(prefix)}*'):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+class _SharedSession(requests.Session):
+    """
+    A requests session that outlives the clients using it.
+
+    spotipy's Spotify and SpotifyOAuth close the session they were given when they
+    are garbage collected, and a client is discarded after every request, so close()
+    is a no-op here to keep the pooled connections open for the other threads.
+    """
+
+    def close(self):
+        pass
+
+def _build_spotify_session():
+    """
+    Build the HTTP session every Spotify client shares.
+
+    spotipy otherwise opens a new session per client, and with a client per request
+    every request paid a fresh TCP + TLS handshake. The retry policy mirrors spotipy's
+    own, except 429s are left to call_with_retry so Retry-After is honoured, and POSTs
+    aren't retried: the token endpoint's authorization codes are single-use.
+    """
+    retry = Retry(
+        total=3,
+        connect=None,
+        read=False,
+        allowed_methods=frozenset(['GET', 'PUT', 'DELETE']),
+        status=3,
+        backoff_factor=0.3,
+        status_forcelist=(500, 502, 503, 504),
+        # Hand the last 5xx back to spotipy rather than a RetryError, which it
+        # would report as a 429
+        raise_on_status=False
+    )
+    # Enough pooled connections for the request threads plus the fetch and genre pools
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32, max_retries=retry)
+    session = _SharedSession()
+    session.mount('https://', adapter)
+    return session
+
+spotify_session = _build_spotify_session()
+
+# Spotify calls are network-bound, so independent ones run side by side
+_fetch_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='spotify-fetch')
+
+def fetch_concurrently(*calls):
+    """
+    Run independent Spotify API calls in parallel.
+
+    Args:
+        *calls: (function, kwargs) pairs, e.g. (api.get_top_tracks, {'limit': 5})
+
+    Returns:
+        List of results in the same order as calls; exceptions propagate as if called directly
+    """
+    futures = [_fetch_executor.submit(fn, **kwargs) for fn, kwargs in calls]
+    return [future.result() for future in futures]
+
 class SpotifyAPI:
     def __init__(self, client_id=None, client_secret=None, redirect_uri=None, use_sample_data=False, user_id=None):
         """Initialize Spotify API with credentials. Can be dynamically set or use sample data."""
@@ -43,9 +451,9 @@ class SpotifyAPI:
 
     def set_credentials(self, client_id, client_secret, redirect_uri):
         """Dynamically set Spotify API credentials and re-initialize connection."""
-        print(f"🔧 DEBUG: Setting credentials - Client ID: {client_id[:8] if client_id else 'None'}...")
-        print(f"🔧 DEBUG: Client Secret length: {len(client_secret) if client_secret else 0}")
-        print(f"🔧 DEBUG: Redirect URI: {redirect_uri}")
+        logger.debug("Setting credentials - Client ID: %s...", client_id[:8] if client_id else 'None')
+        logger.debug("Client Secret length: %s", len(client_secret) if client_secret else 0)
+        logger.debug("Redirect URI: %s", redirect_uri)
 
         # Only clear cache if credentials actually changed
         credentials_changed = (
@@ -55,13 +463,19 @@ class SpotifyAPI:
         )
         
         if credentials_changed:
-            print(f"🔧 DEBUG: Credentials changed, clearing cache files...")
+            logger.debug("Credentials changed, clearing cache files...")
             self.clear_cache_files()
             # Clear user profile cache
             self._user_profile_cache = None
             self._user_profile_cache_time = 0
+            with _user_profile_cache_lock:
+                _user_profile_cache.pop(self.user_id, None)
+            clear_response_cache(self.user_id)
+        elif self.sp is not None and not self.use_sample_data:
+            logger.debug("Credentials unchanged, keeping existing connection...")
+            return
         else:
-            print(f"🔧 DEBUG: Credentials unchanged, keeping existing cache...")
+            logger.debug("Credentials unchanged, keeping existing cache...")
 
         self.client_id = client_id
         self.client_secret = client_secret
@@ -72,9 +486,9 @@ class SpotifyAPI:
         if credentials_changed:
             self.sp = None  # Clear existing connection
 
-        print(f"🔧 DEBUG: Credentials set, initializing connection...")
+        logger.debug("Credentials set, initializing connection...")
         self.initialize_connection()
-        print(f"🔧 DEBUG: Connection initialized, sp object: {self.sp is not None}")
+        logger.debug("Connection initialized, sp object: %s", self.sp is not None)
 
     def clear_cache_files(self):
         """Clear only Spotify OAuth cache files."""
@@ -82,13 +496,14 @@ class SpotifyAPI:
         import tempfile
 
         # Clear Spotify OAuth cache files
+        clear_token_cache()
         cache_files = glob.glob('/tmp/.spotify_cache*')
         for cache_file in cache_files:
             try:
                 os.remove(cache_file)
-                print(f"🗑️ DEBUG: Removed cache file: {cache_file}")
+                logger.debug("Removed cache file: %s", cache_file)
             except Exception as e:
-                print(f"⚠️ DEBUG: Could not remove cache file {cache_file}: {e}")
+                logger.warning("Could not remove cache file %s: %s", cache_file, e)
 
         # Also check for cache files in temp directory
         temp_dir = tempfile.gettempdir()
@@ -97,9 +512,9 @@ class SpotifyAPI:
         for cache_file in temp_cache_files:
             try:
                 os.remove(cache_file)
-                print(f"🗑️ DEBUG: Removed temp cache file: {cache_file}")
+                logger.debug("Removed temp cache file: %s", cache_file)
             except Exception as e:
-                print(f"⚠️ DEBUG: Could not remove temp cache file {cache_file}: {e}")
+                logger.warning("Could not remove temp cache file %s: %s", cache_file, e)
 
     def clear_all_cached_data(self):
         """Clear all cached data including CSV files and Spotify cache."""
@@ -107,13 +522,14 @@ class SpotifyAPI:
         import tempfile
 
         # Clear Spotify OAuth cache files
+        clear_token_cache()
         cache_files = glob.glob('/tmp/.spotify_cache*')
         for cache_file in cache_files:
             try:
                 os.remove(cache_file)
-                print(f"Removed Spotify cache file: {cache_file}")
+                logger.debug("Removed Spotify cache file: %s", cache_file)
             except Exception as e:
-                print(f"Could not remove cache file {cache_file}: {e}")
+                logger.warning("Could not remove cache file %s: %s", cache_file, e)
 
         # Also check for cache files in temp directory
         temp_dir = tempfile.gettempdir()
@@ -122,9 +538,9 @@ class SpotifyAPI:
         for cache_file in temp_cache_files:
             try:
                 os.remove(cache_file)
-                print(f"Removed temp cache file: {cache_file}")
+                logger.debug("Removed temp cache file: %s", cache_file)
             except Exception as e:
-                print(f"Could not remove temp cache file {cache_file}: {e}")
+                logger.warning("Could not remove temp cache file %s: %s", cache_file, e)
 
         # Clear CSV data files
         csv_files = [
@@ -143,38 +559,39 @@ class SpotifyAPI:
             try:
                 if os.path.exists(csv_file):
                     os.remove(csv_file)
-                    print(f"Removed CSV file: {csv_file}")
+                    logger.debug("Removed CSV file: %s", csv_file)
             except Exception as e:
-                print(f"Could not remove CSV file {csv_file}: {e}")
+                logger.warning("Could not remove CSV file %s: %s", csv_file, e)
 
         # Clear the connection and reset credentials
         self.sp = None
         self.client_id = None
         self.client_secret = None
         self.use_sample_data = False
-        print("All cached data cleared successfully")
+        logger.debug("All cached data cleared successfully")
 
     def initialize_connection(self):
         """Create Spotify API connection with proper authentication."""
-        print(f"🚀 DEBUG: Starting initialize_connection...")
-        print(f"🚀 DEBUG: client_id: {self.client_id[:8] if self.client_id else 'None'}...")
-        print(f"🚀 DEBUG: client_secret: {'***' if self.client_secret else 'None'}")
-        print(f"🚀 DEBUG: redirect_uri: {self.redirect_uri}")
-        print(f"🚀 DEBUG: use_sample_data: {self.use_sample_data}")
+        logger.debug("Starting initialize_connection...")
+        logger.debug("client_id: %s...", self.client_id[:8] if self.client_id else 'None')
+        logger.debug("client_secret: %s", '***' if self.client_secret else 'None')
+        logger.debug("redirect_uri: %s", self.redirect_uri)
+        logger.debug("use_sample_data: %s", self.use_sample_data)
 
         if not self.client_id or not self.client_secret or not self.redirect_uri:
-            print(f"❌ DEBUG: Missing required credentials!")
-            print(f"   - client_id: {bool(self.client_id)}")
-            print(f"   - client_secret: {bool(self.client_secret)}")
-            print(f"   - redirect_uri: {bool(self.redirect_uri)}")
+            logger.warning("Missing required credentials!")
+            logger.debug("   - client_id: %s", bool(self.client_id))
+            logger.debug("   - client_secret: %s", bool(self.client_secret))
+            logger.debug("   - redirect_uri: %s", bool(self.redirect_uri))
             self.sp = None
             return
 
         try:
-            print(f"🔐 DEBUG: Creating SpotifyOAuth manager...")
+            logger.debug("Creating SpotifyOAuth manager...")
             # Use /tmp for writable cache on serverless platforms
             user_cache_path = f'/tmp/.spotify_cache_{self.user_id}_{self.client_id[:8] if self.client_id else "anon"}'
-            print(f"🔐 DEBUG: Using user-specific cache: {user_cache_path}")
+            logger.debug("Using user-specific cache: %s", user_cache_path)
+            cache_handler = TokenCacheHandler(user_cache_path, shared=self.user_id != 'anonymous')
             auth_manager = SpotifyOAuth(
                 client_id=self.client_id,
                 client_secret=self.client_secret,
@@ -182,72 +599,86 @@ class SpotifyAPI:
                 scope=self.scopes,
                 open_browser=False,  # Don't auto-open browser to avoid conflicts
                 show_dialog=True,  # Always show auth dialog
-                cache_path=user_cache_path  # User-specific cache to prevent token sharing
+                cache_handler=cache_handler,  # User-specific cache to prevent token sharing
+                requests_session=spotify_session
             )
-            print(f"✅ DEBUG: SpotifyOAuth manager created successfully")
+            logger.debug("SpotifyOAuth manager created successfully")
 
             # Try to get token, but don't force if not available
-            print(f"🎫 DEBUG: Attempting to get access token...")
+            logger.debug("Attempting to get access token...")
             try:
                 # Check if we have a cached token first
                 token_info = auth_manager.get_cached_token()
                 if token_info:
-                    print(f"✅ DEBUG: Using cached token")
+                    logger.debug("Using cached token")
                 else:
                     # Check for authorization code from callback (user-specific)
-                    import tempfile
-                    import os
-                    temp_dir = tempfile.gettempdir()
-                    # SECURITY FIX: Use user-specific auth code file
-                    code_file = os.path.join(temp_dir, f'spotify_auth_code_{self.user_id}_{self.client_id[:8] if self.client_id else "anon"}.txt')
-                    if os.path.exists(code_file):
-                        with open(code_file, 'r') as f:
-                            auth_code = f.read().strip()
-                        
-                        print(f"✅ DEBUG: Found user-specific authorization code, exchanging for token...")
+                    auth_code = pop_auth_code(self.user_id, self.client_id)
+                    if auth_code:
+                        logger.debug("Found user-specific authorization code, exchanging for token...")
                         token_info = auth_manager.get_access_token(auth_code, as_dict=True)
-                        # Clean up the temporary file
-                        os.remove(code_file)
-                        print(f"✅ DEBUG: Token exchange successful")
+                        logger.debug("Token exchange successful")
                     else:
-                        print(f"⚠️ DEBUG: No cached token or auth code available")
+                        logger.warning("No cached token or auth code available")
                         # Generate auth URL for user (but don't prompt in terminal)
                         auth_url = auth_manager.get_authorize_url()
-                        print(f"🔗 DEBUG: Auth URL available for web interface: {auth_url}")
+                        logger.debug("Auth URL available for web interface: %s", auth_url)
             except Exception as e:
-                print(f"⚠️ DEBUG: Could not get access token during initialization: {e}")
+                logger.warning("Could not get access token during initialization: %s", e)
                 # Continue without token - will be requested when needed
 
             # Create Spotify client with increased timeout (default is 5 seconds)
-            print(f"🎵 DEBUG: Creating Spotify client...")
-            self.sp = spotipy.Spotify(auth_manager=auth_manager, requests_timeout=15)
-            print(f"✅ DEBUG: Spotify client created successfully")
+            logger.debug("Creating Spotify client...")
+            self.sp = spotipy.Spotify(auth_manager=auth_manager, requests_timeout=15,
+                                      requests_session=spotify_session)
+            logger.debug("Spotify client created successfully")
 
             # Test connection (but don't fail if not authenticated yet)
-            print(f"🧪 DEBUG: Testing connection...")
+            logger.debug("Testing connection...")
             try:
                 # Only test if we have a cached token, don't prompt for auth
                 cached_token = auth_manager.get_cached_token()
-                if cached_token:
+                if cached_token and self._cached_auth_check(cached_token):
+                    # The token passed a /me probe or profile fetch moments ago
+                    logger.debug("Connected (recently verified token)")
+                elif cached_token:
                     user = self.sp.current_user()
+                    self._remember_auth_check(cached_token, user is not None)
                     if user:
-                        print(f"✅ DEBUG: Successfully connected as {user.get('display_name', 'Unknown')}")
-                        logger.warning(f"Successfully connected as {user.get('display_name', 'Unknown')}")
+                        logger.info("Successfully connected as %s", user.get('display_name', 'Unknown'))
                     else:
-                        print(f"⚠️ DEBUG: No user profile available - authentication may be needed")
                         logger.warning("No user profile available - authentication may be needed")
                 else:
-                    print(f"⚠️ DEBUG: No cached token - authentication will be needed")
                     logger.warning("No cached token - authentication will be needed")
             except Exception as e:
-                print(f"⚠️ DEBUG: Could not test connection during initialization: {e}")
-                logger.warning(f"Could not test connection during initialization: {e}")
+                logger.warning("Could not test connection during initialization: %s", e)
                 # Keep the client - authentication will happen when needed
         except Exception as e:
-            print(f"❌ DEBUG: Error connecting to Spotify API: {e}")
-            logger.error(f"Error connecting to Spotify API: {e}")
+            logger.error("Error connecting to Spotify API: %s", e)
             self.sp = None
 
+    def use_token(self, token_info):
+        """
+        Hand an access token obtained outside spotipy (e.g. from the JWT claims) to the client.
+
+        Args:
+            token_info: Token dict with access_token, refresh_token and expires_in or expires_at
+        """
+        if not self.sp or not hasattr(self.sp, 'auth_manager'):
+            return
+
+        cache_handler = self.sp.auth_manager.cache_handler
+        cached = cache_handler.get_cached_token()
+        if (cached and cached.get('refresh_token') == token_info.get('refresh_token')
+                and cached.get('expires_at', 0) - 60 > time.time()):
+            # Same session and still valid - keep it, it may be a newer refresh
+            return
+
+        token_info = dict(token_info)
+        if 'expires_at' not in token_info:
+            token_info['expires_at'] = int(time.time()) + token_info.get('expires_in', 3600)
+        cache_handler.save_token_to_cache(token_info)
+
     def get_auth_url(self):
         """Get the authorization URL for OAuth flow."""
         if self.sp and hasattr(self.sp, 'auth_manager'):
@@ -256,65 +687,86 @@ class SpotifyAPI:
 
     def get_access_token(self, code):
         """Exchange authorization code for access token."""
-        print(f"🔍 DEBUG: SpotifyAPI.get_access_token called with code: {code[:20] if code else 'None'}...")
+        logger.debug("SpotifyAPI.get_access_token called with code: %s...", code[:20] if code else 'None')
 
         if not self.sp or not hasattr(self.sp, 'auth_manager'):
-            print("❌ DEBUG: No Spotify auth manager available")
+            logger.warning("No Spotify auth manager available")
             return None
 
         try:
-            print("🔍 DEBUG: Getting access token from auth manager...")
+            logger.debug("Getting access token from auth manager...")
             # Use the auth manager to get the token
             token_info = self.sp.auth_manager.get_access_token(code)
-            print(f"✅ DEBUG: Token info received: {token_info is not None}")
+            logger.debug("Token info received: %s", token_info is not None)
             return token_info
         except Exception as e:
-            print(f"❌ DEBUG: Error getting access token: {e}")
+            logger.warning("Error getting access token: %s", e)
             return None
 
+    def _cached_auth_check(self, token_info):
+        """Return a recent /me probe result for this token, or None if it needs probing again."""
+        # A fresh cached profile means /me succeeded moments ago
+        with _user_profile_cache_lock:
+            cached_profile = _user_profile_cache.get(self.user_id)
+        now = time.time()
+        if (self.user_id != 'anonymous' and cached_profile
+                and now - cached_profile[0] < USER_PROFILE_CACHE_TTL):
+            return True
+
+        with _auth_checks_lock:
+            checked = _auth_checks.get((self.user_id, self.client_id, token_info.get('access_token')))
+        if checked and now - checked[0] < AUTH_CHECK_TTL:
+            return checked[1]
+        return None
+
+    def _remember_auth_check(self, token_info, authenticated):
+        """Record a /me probe result so the next check within AUTH_CHECK_TTL can skip it."""
+        now = time.time()
+        with _auth_checks_lock:
+            if len(_auth_checks) >= 1024:
+                for old_key in [k for k, v in _auth_checks.items() if now - v[0] >= AUTH_CHECK_TTL]:
+                    del _auth_checks[old_key]
+            _auth_checks[(self.user_id, self.client_id, token_info.get('access_token'))] = (now, authenticated)
+
     def is_authenticated(self):
         """Check if the user is authenticated without triggering prompts."""
         if not self.sp:
             return False
         try:
             # First check for authorization code from callback (user-specific)
-            import tempfile
-            temp_dir = tempfile.gettempdir()
-            # SECURITY FIX: Use user-specific auth code file
-            code_file = os.path.join(temp_dir, f'spotify_auth_code_{self.user_id}_{self.client_id[:8] if self.client_id else "anon"}.txt')
-            if os.path.exists(code_file):
-                with open(code_file, 'r') as f:
-                    auth_code = f.read().strip()
-                    print(f"✅ DEBUG: Found user-specific authorization code, exchanging for token...")
-                    try:
-                        token_info = self.sp.auth_manager.get_access_token(auth_code, as_dict=True)
-                        if token_info:
-                            print(f"✅ DEBUG: Token exchange successful!")
-                            # Clean up the temporary file
-                            os.remove(code_file)
-                            return True
-                    except Exception as e:
-                        print(f"❌ DEBUG: Token exchange failed: {e}")
-                        # Clean up the file anyway
-                        try:
-                            os.remove(code_file)
-                        except:
-                            pass
+            auth_code = pop_auth_code(self.user_id, self.client_id)
+            if auth_code:
+                logger.debug("Found user-specific authorization code, exchanging for token...")
+                try:
+                    token_info = self.sp.auth_manager.get_access_token(auth_code, as_dict=True)
+                    if token_info:
+                        logger.debug("Token exchange successful!")
+                        return True
+                except Exception as e:
+                    # Codes are single-use, so a failed one is not put back
+                    logger.warning("Token exchange failed: %s", e)
 
             # Check if we have a cached token
             if hasattr(self.sp, 'auth_manager'):
                 cached_token = self.sp.auth_manager.get_cached_token()
                 if cached_token:
+                    checked = self._cached_auth_check(cached_token)
+                    if checked is not None:
+                        return checked
+
                     # Test the token by making a simple API call
                     try:
                         user = self.sp.current_user()
-                        return user is not None
+                        authenticated = user is not None
                     except Exception as e:
-                        print(f"⚠️ DEBUG: Token test failed: {e}")
-                        return False
+                        logger.warning("Token test failed: %s", e)
+                        authenticated = False
+
+                    self._remember_auth_check(cached_token, authenticated)
+                    return authenticated
             return False
         except Exception as e:
-            print(f"⚠️ DEBUG: Error checking authentication: {e}")
+            logger.warning("Error checking authentication: %s", e)
             return False
 
     @lru_cache(maxsize=100)
@@ -421,10 +873,31 @@ class SpotifyAPI:
         if not uncached_ids:
             return {tid: self.audio_features_cache[tid] for tid in track_ids}
 
-        # If using AI features, we need to process one by one
         if self.use_ai_audio_features:
-            for track_id in uncached_ids:
-                self.get_audio_features_safely(track_id)
+            # The AI extractor needs each track's preview URL; fetch those 50 tracks per
+            # request (Spotify's limit) instead of one track lookup per ID
+            for i in range(0, len(uncached_ids), 50):
+                batch = uncached_ids[i:i+50]
+                try:
+                    tracks_batch = self.sp.tracks(batch).get('tracks', [])
+                except Exception as e:
+                    logger.error(f"Error fetching tracks for audio features: {e}")
+                    for track_id in batch:
+                        self.get_audio_features_safely(track_id)
+                    continue
+
+                preview_urls = {track['id']: track.get('preview_url') for track in tracks_batch if track}
+                for track_id in batch:
+                    preview_url = preview_urls.get(track_id)
+                    if not preview_url:
+                        self.audio_features_cache[track_id] = self._generate_fallback_audio_features()
+                        continue
+                    try:
+                        self.audio_features_cache[track_id] = get_track_audio_features(track_id, preview_url)
+                    except Exception as e:
+                        logger.warning(f"Error using AI audio features for track {track_id}: {e}")
+                        # Same fallback chain as a single lookup (Spotify API, then generated)
+                        self.get_audio_features_safely(track_id)
         else:
             # Process in batches of 100 (Spotify API limit)
             for i in range(0, len(uncached_ids), 100):
@@ -438,6 +911,11 @@ class SpotifyAPI:
                             self.audio_features_cache[batch[j]] = self._generate_fallback_audio_features()
                 except Exception as e:
                     logger.error(f"Error fetching batch audio features: {e}")
+                    if "403" in str(e):
+                        # Per-track requests would be refused as well
+                        for track_id in batch:
+                            self.audio_features_cache[track_id] = self._generate_fallback_audio_features()
+                        continue
                     # If batch request fails, fall back to individual requests
                     for track_id in batch:
                         self.get_audio_features_safely(track_id)
@@ -469,6 +947,7 @@ class SpotifyAPI:
             'duration_ms': random.randint(180000, 240000)
         }
 
+    @cached_response(TOP_ITEMS_CACHE_TTL)
     def get_top_tracks(self, limit: int = 10, time_range: str = 'short_term') -> List[Dict[str, Any]]:
         """
         Fetch user's top tracks.
@@ -481,13 +960,13 @@ class SpotifyAPI:
             List of track dictionaries or empty list if error
         """
         if not self.sp:
-            print("❌ DEBUG: No Spotify connection available")
+            logger.warning("No Spotify connection available")
             if self.use_sample_data:
                 return self.sample_generator.generate_top_tracks(limit=limit)
             return []
 
         try:
-            results = self.sp.current_user_top_tracks(limit=limit, time_range=time_range)
+            results = call_with_retry(self.sp.current_user_top_tracks, limit=limit, time_range=time_range)
             tracks_data = []
 
             # Get all track IDs for batch processing
@@ -533,6 +1012,7 @@ class SpotifyAPI:
 
 
 
+    @cached_response(LIBRARY_CACHE_TTL)
     def get_saved_tracks(self, limit=50, offset=0):
         """
         Fetch user's saved tracks.
@@ -542,18 +1022,21 @@ class SpotifyAPI:
             offset: The index of the first track to return
         """
         if not self.sp:
-            print("❌ DEBUG: No Spotify connection available")
+            logger.warning("No Spotify connection available")
             return []
 
         try:
-            results = self.sp.current_user_saved_tracks(limit=limit, offset=offset)
+            results = call_with_retry(self.sp.current_user_saved_tracks, limit=limit, offset=offset)
             tracks_data = []
 
+            # Get audio features for the whole page in one request
+            audio_features_map = self.get_audio_features_batch([item['track']['id'] for item in results['items']])
+
             for idx, item in enumerate(results['items'], 1):
                 track = item['track']
 
-                # Get audio features for this track
-                audio_features = self.get_audio_features_safely(track['id'])
+                # Get audio features from the batch results
+                audio_features = audio_features_map.get(track['id'], self._generate_fallback_audio_features())
                 
                 tracks_data.append({
                     'track': track['name'],
@@ -586,11 +1069,12 @@ class SpotifyAPI:
 
             return tracks_data
         except Exception as e:
-            print(f"Error fetching saved tracks: {e}")
+            logger.warning("Error fetching saved tracks: %s", e)
             return []
 
 
 
+    @cached_response(LIBRARY_CACHE_TTL)
     def get_playlists(self, limit=10):
         """
         Fetch user's playlists.
@@ -602,11 +1086,11 @@ class SpotifyAPI:
             List of playlist dictionaries
         """
         if not self.sp:
-            print("❌ DEBUG: No Spotify connection available")
+            logger.warning("No Spotify connection available")
             return []
 
         try:
-            results = self.sp.current_user_playlists(limit=limit)
+            results = call_with_retry(self.sp.current_user_playlists, limit=limit)
             playlists_data = []
 
             for idx, playlist in enumerate(results['items'], 1):
@@ -628,7 +1112,7 @@ class SpotifyAPI:
 
             return playlists_data
         except Exception as e:
-            print(f"Error fetching playlists: {e}")
+            logger.warning("Error fetching playlists: %s", e)
             return []
 
 
@@ -636,7 +1120,7 @@ class SpotifyAPI:
     def get_currently_playing(self):
         """Fetch currently playing track."""
         if not self.sp:
-            print("❌ DEBUG: No Spotify connection available")
+            logger.warning("No Spotify connection available")
             return None
 
         try:
@@ -664,19 +1148,34 @@ class SpotifyAPI:
                 }
             return None
         except Exception as e:
-            print(f"Error fetching currently playing track: {e}")
+            logger.warning("Error fetching currently playing track: %s", e)
             return None
 
-    def get_user_profile(self):
-        """Fetch user profile information with caching to improve performance."""
-        # Check cache first (cache for 30 seconds)
+    def get_user_profile(self, max_age=USER_PROFILE_CACHE_TTL):
+        """
+        Fetch user profile information with caching to improve performance.
+
+        Args:
+            max_age: Oldest cached profile (in seconds) the caller will accept
+
+        Returns:
+            Dict with display_name, id, followers, following, image_url and product
+        """
+        # Check cache first (instance cache, then the cross-request cache for this user)
         current_time = time.time()
         if (self._user_profile_cache and
-            current_time - self._user_profile_cache_time < 30):
+            current_time - self._user_profile_cache_time < max_age):
             return self._user_profile_cache
 
+        if self.user_id != 'anonymous':
+            with _user_profile_cache_lock:
+                cached = _user_profile_cache.get(self.user_id)
+            if cached and current_time - cached[0] < max_age:
+                self._user_profile_cache_time, self._user_profile_cache = cached
+                return self._user_profile_cache
+
         if not self.sp:
-            print("❌ DEBUG: No Spotify connection available")
+            logger.warning("No Spotify connection available")
             if self.use_sample_data:
                 return self.sample_generator.generate_user_profile()
             return {}
@@ -687,40 +1186,39 @@ class SpotifyAPI:
             # Get the number of artists the user is following
             following_count = 0
             try:
-                print("🔍 DEBUG: Attempting to fetch followed artists...")
+                logger.debug("Attempting to fetch followed artists...")
                 # Get followed artists with more detailed error handling
                 followed_artists = self.sp.current_user_followed_artists(limit=1)
-                print(f"🔍 DEBUG: Followed artists response: {followed_artists}")
+                logger.debug("Followed artists response: %s", followed_artists)
 
                 if followed_artists and 'artists' in followed_artists:
                     following_count = followed_artists['artists']['total']
-                    print(f"✅ DEBUG: Successfully got following count: {following_count}")
+                    logger.debug("Successfully got following count: %s", following_count)
                 else:
-                    print("⚠️ DEBUG: No 'artists' key in followed artists response")
+                    logger.warning("No 'artists' key in followed artists response")
                     following_count = 0
 
             except Exception as e:
-                print(f"❌ Error fetching followed artists: {e}")
-                print(f"❌ Error type: {type(e).__name__}")
+                logger.warning("Error fetching followed artists: %s", e)
+                logger.warning("Error type: %s", type(e).__name__)
 
                 # Check if this is a scope permission error
                 if "insufficient client scope" in str(e).lower() or "scope" in str(e).lower():
-                    print("🔐 DEBUG: This appears to be a scope permission error.")
-                    print("🔐 DEBUG: The user may need to re-authenticate with updated permissions.")
-                    print("🔐 DEBUG: Added 'user-follow-read' scope to fix this issue.")
+                    logger.warning("This appears to be a scope permission error; the user may need "
+                                   "to re-authenticate to grant 'user-follow-read'.")
 
                 # Try alternative approach - get followed artists with different parameters
                 try:
-                    print("🔄 DEBUG: Trying alternative approach for followed artists...")
+                    logger.debug("Trying alternative approach for followed artists...")
                     followed_artists_alt = self.sp.current_user_followed_artists(limit=50)
                     if followed_artists_alt and 'artists' in followed_artists_alt and 'items' in followed_artists_alt['artists']:
                         following_count = len(followed_artists_alt['artists']['items'])
-                        print(f"✅ DEBUG: Alternative approach got following count: {following_count}")
+                        logger.debug("Alternative approach got following count: %s", following_count)
                     else:
                         following_count = 0
-                        print("⚠️ DEBUG: Alternative approach also failed")
+                        logger.warning("Alternative approach also failed")
                 except Exception as alt_e:
-                    print(f"❌ Alternative approach also failed: {alt_e}")
+                    logger.warning("Alternative approach also failed: %s", alt_e)
                     following_count = 0
 
             user_data = {
@@ -735,10 +1233,13 @@ class SpotifyAPI:
             # Cache the result
             self._user_profile_cache = user_data
             self._user_profile_cache_time = current_time
+            if self.user_id != 'anonymous':
+                with _user_profile_cache_lock:
+                    _user_profile_cache[self.user_id] = (current_time, user_data)
 
             return user_data
         except Exception as e:
-            print(f"Error fetching user profile: {e}")
+            logger.warning("Error fetching user profile: %s", e)
             return {
                 'display_name': 'Sample User',
                 'id': 'sample-user-id',
@@ -749,9 +1250,14 @@ class SpotifyAPI:
                 'product': 'premium'
             }
 
+    def is_premium(self):
+        """Return True if the user has a Premium subscription, using the cached profile."""
+        # The subscription tier rarely changes, so an hour-old profile is fine here
+        return self.get_user_profile(max_age=3600).get('product') == 'premium'
+
     def get_recently_played(self, limit=50, before=None, after=None, max_retries=3):
         """
-        Fetch recently played tracks with retry logic.
+        Fetch recently played tracks, waiting out rate limits per Retry-After.
 
         Args:
             limit: Number of tracks to fetch
@@ -760,83 +1266,65 @@ class SpotifyAPI:
             max_retries: Maximum number of retry attempts
         """
         if not self.sp:
-            print("❌ DEBUG: No Spotify connection available")
+            logger.warning("No Spotify connection available")
             if self.use_sample_data:
                 return self.sample_generator.generate_recently_played(limit=limit)
             return []
 
-        for attempt in range(max_retries + 1):
-            try:
-                params = {'limit': limit}
-                if before:
-                    params['before'] = before
-                elif after:
-                    params['after'] = after
-
-                results = self.sp.current_user_recently_played(**params)
-                tracks_data = []
-
-                for idx, item in enumerate(results['items'], 1):
-                    track = item['track']
-                    played_at = pd.to_datetime(item['played_at'], format='ISO8601')
-
-                    # Get audio features for this track
-                    audio_features = self.get_audio_features_safely(track['id'])
-                    
-                    tracks_data.append({
-                        'track': track['name'],
-                        'artist': track['artists'][0]['name'],
-                        'album': track['album']['name'],
-                        'played_at': item['played_at'],
-                        'id': track['id'],
-                        'duration_ms': track['duration_ms'],
-                        'name': track['name'],  # Add this to satisfy NOT NULL constraint
-                        'image_url': track['album']['images'][0]['url'] if track['album']['images'] else '',
-                        'preview_url': track.get('preview_url', ''),
-                        'popularity': track.get('popularity', 0),
-                        'day_of_week': played_at.day_name(),
-                        'hour_of_day': played_at.hour,
-                        # Audio features - include ALL features for database storage
-                        'danceability': audio_features.get('danceability', 0),
-                        'energy': audio_features.get('energy', 0),
-                        'key': audio_features.get('key', 0),
-                        'loudness': audio_features.get('loudness', 0),
-                        'mode': audio_features.get('mode', 0),
-                        'speechiness': audio_features.get('speechiness', 0),
-                        'acousticness': audio_features.get('acousticness', 0),
-                        'instrumentalness': audio_features.get('instrumentalness', 0),
-                        'liveness': audio_features.get('liveness', 0),
-                        'valence': audio_features.get('valence', 0),
-                        'tempo': audio_features.get('tempo', 0)
-                    })
+        params = {'limit': limit}
+        if before:
+            params['before'] = before
+        elif after:
+            params['after'] = after
 
-                print(f"Retrieved {len(tracks_data)} recently played tracks")
-                return tracks_data
+        try:
+            results = call_with_retry(self.sp.current_user_recently_played,
+                                      max_attempts=max_retries + 1, **params)
+            tracks_data = []
 
-            except Exception as e:
-                print(f"Error fetching recently played tracks (attempt {attempt + 1}/{max_retries + 1}): {e}")
+            # Get audio features for the whole page in one request
+            audio_features_map = self.get_audio_features_batch([item['track']['id'] for item in results['items']])
 
-                # Check if it's a rate limit error
-                if "429" in str(e) or "rate limit" in str(e).lower():
-                    if attempt < max_retries:
-                        wait_time = (attempt + 1) * 5  # Progressive backoff: 5, 10, 15 seconds
-                        print(f"Rate limit detected, waiting {wait_time} seconds before retry...")
-                        time.sleep(wait_time)
-                        continue
-                    else:
-                        print("Max retries reached for rate limit")
-                        return []
-                elif attempt < max_retries:
-                    # For other errors, wait a shorter time
-                    wait_time = (attempt + 1) * 2  # 2, 4, 6 seconds
-                    print(f"Retrying in {wait_time} seconds...")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    print("Max retries reached")
-                    return []
+            for idx, item in enumerate(results['items'], 1):
+                track = item['track']
+                played_at = pd.to_datetime(item['played_at'], format='ISO8601')
+
+                # Get audio features from the batch results
+                audio_features = audio_features_map.get(track['id'], self._generate_fallback_audio_features())
+                
+                tracks_data.append({
+                    'track': track['name'],
+                    'artist': track['artists'][0]['name'],
+                    'album': track['album']['name'],
+                    'played_at': item['played_at'],
+                    'id': track['id'],
+                    'duration_ms': track['duration_ms'],
+                    'name': track['name'],  # Add this to satisfy NOT NULL constraint
+                    'image_url': track['album']['images'][0]['url'] if track['album']['images'] else '',
+                    'preview_url': track.get('preview_url', ''),
+                    'popularity': track.get('popularity', 0),
+                    'day_of_week': played_at.day_name(),
+                    'hour_of_day': played_at.hour,
+                    # Audio features - include ALL features for database storage
+                    'danceability': audio_features.get('danceability', 0),
+                    'energy': audio_features.get('energy', 0),
+                    'key': audio_features.get('key', 0),
+                    'loudness': audio_features.get('loudness', 0),
+                    'mode': audio_features.get('mode', 0),
+                    'speechiness': audio_features.get('speechiness', 0),
+                    'acousticness': audio_features.get('acousticness', 0),
+                    'instrumentalness': audio_features.get('instrumentalness', 0),
+                    'liveness': audio_features.get('liveness', 0),
+                    'valence': audio_features.get('valence', 0),
+                    'tempo': audio_features.get('tempo', 0)
+                })
 
-        return []  # If all retries failed
+            logger.debug("Retrieved %s recently played tracks", len(tracks_data))
+            return tracks_data
+
+        except Exception as e:
+            logger.warning("Error fetching recently played tracks: %s", e)
+            return []
 
 
 
@@ -852,11 +1340,11 @@ class SpotifyAPI:
             List of track dictionaries with audio features
         """
         if not self.sp:
-            print("❌ DEBUG: No Spotify connection available")
+            logger.warning("No Spotify connection available")
             return []
 
         try:
-            top_tracks = self.sp.current_user_top_tracks(limit=limit, time_range=time_range)
+            top_tracks = call_with_retry(self.sp.current_user_top_tracks, limit=limit, time_range=time_range)
             track_ids = [track['id'] for track in top_tracks['items']]
 
             if not track_ids:
@@ -864,14 +1352,16 @@ class SpotifyAPI:
 
             features_data = []
 
-            # Process tracks individually to handle potential 403 errors
+            # One batch request; 403s fall back to generated features per track
+            audio_features_map = self.get_audio_features_batch(track_ids)
+
             for i, track_id in enumerate(track_ids):
                 if i >= len(top_tracks['items']):
                     continue
 
                 track = top_tracks['items'][i]
                 preview_url = track.get('preview_url')
-                features = self.get_audio_features_safely(track_id)
+                features = audio_features_map[track_id]
 
                 features_data.append({
                     'track': track['name'],
@@ -897,11 +1387,12 @@ class SpotifyAPI:
 
             return features_data
         except Exception as e:
-            print(f"Error fetching audio features: {e}")
+            logger.warning("Error fetching audio features: %s", e)
             return []
 
 
 
+    @cached_response(TOP_ITEMS_CACHE_TTL)
     def get_top_artists(self, limit=10, time_range='short_term'):
         """
         Fetch user's top artists.
@@ -914,11 +1405,11 @@ class SpotifyAPI:
             List of artist dictionaries with name and image_url
         """
         if not self.sp:
-            print("❌ DEBUG: No Spotify connection available")
+            logger.warning("No Spotify connection available")
             return []
 
         try:
-            results = self.sp.current_user_top_artists(limit=limit, time_range=time_range)
+            results = call_with_retry(self.sp.current_user_top_artists, limit=limit, time_range=time_range)
             artists_data = []
 
             for idx, artist in enumerate(results['items'], 1):
@@ -938,7 +1429,7 @@ class SpotifyAPI:
 
             return artists_data
         except Exception as e:
-            print(f"Error fetching top artists: {e}")
+            logger.warning("Error fetching top artists: %s", e)
             return []
 
 
@@ -978,7 +1469,7 @@ class SpotifyAPI:
             return artists
 
         except Exception as e:
-            print(f"Error getting artists for genre {genre_name}: {e}")
+            logger.warning("Error getting artists for genre %s: %s", genre_name, e)
             return []
 
     def get_artist_genres(self, artist_name):
@@ -1047,7 +1538,7 @@ class SpotifyAPI:
                 retry_count += 1
                 if "429" in str(e):  # Rate limiting error
                     wait_time = min(2 ** retry_count, 5)  # Cap wait time at 5 seconds
-                    print(f"Rate limit hit, retrying in {wait_time} seconds (attempt {retry_count}/{max_retries})")
+                    logger.debug("Rate limit hit, retrying in %s seconds (attempt %s/%s)", wait_time, retry_count, max_retries)
                     time.sleep(wait_time)
                 else:
                     if retry_count < max_retries:
@@ -1,11 +1,25 @@
 """Module for collecting historical Spotify data and storing it in the database."""
 import logging
+import threading
 import time
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from typing import Optional, List, Dict, Any
 
+from modules.api import fetch_concurrently
+
 logger = logging.getLogger(__name__)
 
+# Historical collection makes a dozen or more paced Spotify calls, so the endpoint
+# hands it to this pool and returns. Jobs are keyed by user so repeat requests
+# don't start a second collection while one is running.
+_collection_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='collector')
+_collections_in_flight = set()
+_collections_lock = threading.Lock()
+
+# A finished collection covers the past two weeks, so it is repeated at most daily
+HISTORICAL_COLLECTION_TTL = 24 * 3600  # seconds
+
 class SpotifyDataCollector:
     def __init__(self, spotify_api, database):
         """Initialize collector with API and database instances."""
@@ -26,47 +40,62 @@ class SpotifyDataCollector:
         logger.info(f"Starting historical data collection for user {user_id} from {start_date}")
 
         try:
-            # 1. Get and save user profile
-            user_data = self.api.get_user_profile()
+            # 1. Get and save user profile; only id/display_name/followers are stored,
+            # so an hour-old cached profile saves a round-trip on repeat collections
+            user_data = self.api.get_user_profile(max_age=3600)
             if user_data:
                 self.db.save_user(user_data)
                 logger.info("Saved user profile")
 
-            # 2. Get saved tracks from the past two weeks
-            saved_tracks = self._get_recent_saved_tracks(start_date)
+            # Rows from every source are buffered and written in one transaction at the end
+            tracks_buffer = []
+            history_buffer = []
+
+            # 2-4. Saved tracks, played history and the three top-track ranges are
+            # independent, so they are fetched side by side; 429s are retried per call
+            time_ranges = ['short_term', 'medium_term', 'long_term']
+            saved_tracks, played_tracks, *top_by_range = fetch_concurrently(
+                (self._get_recent_saved_tracks, {'start_date': start_date}),
+                (self._get_historical_played_tracks, {'user_id': user_id, 'start_date': start_date}),
+                *((self.api.get_top_tracks, {'limit': 50, 'time_range': time_range}) for time_range in time_ranges)
+            )
+
             if saved_tracks:
-                self._save_tracks_batch(saved_tracks, user_id, 'saved')
-                logger.info(f"Saved {len(saved_tracks)} saved tracks")
+                self._buffer_tracks(saved_tracks, user_id, 'saved', tracks_buffer, history_buffer)
+                logger.info(f"Collected {len(saved_tracks)} saved tracks")
 
-            # 3. Get historical recently played tracks
-            played_tracks = self._get_historical_played_tracks(user_id, start_date)
             if played_tracks:
-                self._save_tracks_batch(played_tracks, user_id, 'played')
-                logger.info(f"Saved {len(played_tracks)} played tracks")
+                self._buffer_tracks(played_tracks, user_id, 'played', tracks_buffer, history_buffer)
+                logger.info(f"Collected {len(played_tracks)} played tracks")
 
-            # 4. Get top tracks for different time ranges
-            for time_range in ['short_term', 'medium_term', 'long_term']:
-                top_tracks = self.api.get_top_tracks(limit=50, time_range=time_range)
+            for time_range, top_tracks in zip(time_ranges, top_by_range):
                 if top_tracks:
-                    self._save_tracks_batch(top_tracks, user_id, f'top_{time_range}')
-                    logger.info(f"Saved {len(top_tracks)} top tracks for {time_range}")
+                    self._buffer_tracks(top_tracks, user_id, f'top_{time_range}', tracks_buffer, history_buffer)
+                    logger.info(f"Collected {len(top_tracks)} top tracks for {time_range}")
 
-                self._handle_rate_limit()
-
-            # 5. Extract genres for collected artists
-            logger.info("Starting genre extraction...")
+            # A run only counts as collected once rows were written; an empty or failed
+            # one (e.g. every fetch was rate limited) stays unmarked so it is retried
             try:
-                from modules.genre_extractor import GenreExtractor
-                genre_extractor = GenreExtractor(self.api, self.db)
-                
-                # Extract genres from recently played tracks (limit to avoid long delays)
-                genres_extracted = genre_extractor.extract_genres_from_recent_tracks(max_artists=50)
-                logger.info(f"Extracted {genres_extracted} genres from recent tracks")
-                
+                saved = self.db.save_tracks_with_history_bulk(tracks_buffer, history_buffer)
             except Exception as e:
-                logger.error(f"Error during genre extraction: {e}")
+                logger.error(f"Error saving batch of {len(tracks_buffer)} tracks: {e}")
+                return False
+            if not saved:
+                logger.warning(f"No listening history collected for user {user_id}")
+                return False
+            logger.info(f"Saved {len(tracks_buffer)} collected tracks")
+
+            # 5. Extract genres for collected artists on the background pool
+            logger.info("Queueing genre extraction...")
+            try:
+                from modules.genre_extractor import submit_genre_extraction
+                submit_genre_extraction(self.api, self.db, max_artists=50)
+
+            except Exception as e:
+                logger.error(f"Error queueing genre extraction: {e}")
                 # Continue anyway - genre extraction is not critical
 
+            self.db.mark_historical_collected(user_id)
             logger.info("Historical data collection completed successfully")
             return True
 
@@ -183,68 +212,39 @@ class SpotifyDataCollector:
         Works backwards from now until start_date.
         """
         all_tracks = []
-        current_timestamp = datetime.now()
+        before_ms = None  # Start from the most recent play
 
-        # Ensure start_date is timezone-naive for consistent comparison
-        if start_date.tzinfo is not None:
-            start_date = start_date.replace(tzinfo=None)
+        # Spotify's 'before' cursor is a Unix timestamp in milliseconds
+        start_ms = int(start_date.timestamp() * 1000)
 
-        while current_timestamp > start_date:
+        while True:
             try:
-                tracks = self.api.get_recently_played(limit=50, before=current_timestamp.isoformat())
+                tracks = self.api.get_recently_played(limit=50, before=before_ms)
                 if not tracks:
                     break
 
-                # Filter out tracks before start_date
+                # Filter out tracks before start_date, parsing each played_at once
                 valid_tracks = []
+                oldest_ms = None
                 for track in tracks:
-                    played_at = track.get('played_at')
-                    if played_at:
-                        try:
-                            # Handle different datetime formats
-                            if 'Z' in played_at:
-                                # ISO format with Z (UTC)
-                                dt = datetime.fromisoformat(played_at.replace('Z', '+00:00'))
-                            elif 'T' in played_at and '+' in played_at:
-                                # ISO format with timezone offset
-                                dt = datetime.fromisoformat(played_at)
-                            else:
-                                # Simple ISO format
-                                dt = datetime.fromisoformat(played_at)
+                    played_ms = self._played_at_ms(track)
+                    if played_ms is None:
+                        # If parsing fails, include the track anyway
+                        valid_tracks.append(track)
+                        continue
 
-                            # Remove timezone info for comparison
-                            dt = dt.replace(tzinfo=None)
-
-                            if dt >= start_date:
-                                valid_tracks.append(track)
-                        except ValueError:
-                            # If parsing fails, include the track anyway
-                            valid_tracks.append(track)
+                    if played_ms >= start_ms:
+                        valid_tracks.append(track)
+                    oldest_ms = played_ms if oldest_ms is None else min(oldest_ms, played_ms)
 
                 all_tracks.extend(valid_tracks)
 
-                # Update timestamp for next iteration
-                if tracks:
-                    last_played_at = tracks[-1].get('played_at')
-                    if last_played_at:
-                        try:
-                            if 'Z' in last_played_at:
-                                last_dt = datetime.fromisoformat(last_played_at.replace('Z', '+00:00'))
-                            elif 'T' in last_played_at and '+' in last_played_at:
-                                last_dt = datetime.fromisoformat(last_played_at)
-                            else:
-                                last_dt = datetime.fromisoformat(last_played_at)
+                # Stop once we've paged past start_date or can't build the next cursor
+                if oldest_ms is None or oldest_ms < start_ms:
+                    break
 
-                            current_timestamp = last_dt.replace(tzinfo=None)
-                        except ValueError:
-                            # If parsing fails, use a fallback approach
-                            current_timestamp = current_timestamp - timedelta(days=1)
-                    else:
-                        # If no played_at, move back by a day
-                        current_timestamp = current_timestamp - timedelta(days=1)
-                else:
-                    # If no tracks, move back by a day
-                    current_timestamp = current_timestamp - timedelta(days=1)
+                # Subtract 1 millisecond to avoid getting the same track again
+                before_ms = oldest_ms - 1
 
                 self._handle_rate_limit()
 
@@ -254,17 +254,38 @@ class SpotifyDataCollector:
 
         return all_tracks
 
-    def _save_tracks_batch(self, tracks: List[Dict[str, Any]], user_id: str, source: str):
-        """Save a batch of tracks and their listening history."""
+    def _played_at_ms(self, track: Dict[str, Any]) -> Optional[int]:
+        """Return a track's played_at as a Unix timestamp in milliseconds, cached on the track."""
+        if '_played_at_ms' in track:
+            return track['_played_at_ms']
+
+        played_at_ms = None
+        played_at = track.get('played_at')
+        if played_at:
+            try:
+                dt = datetime.fromisoformat(played_at.replace('Z', '+00:00'))
+                if dt.tzinfo is None:
+                    dt = dt.replace(tzinfo=timezone.utc)
+                played_at_ms = int(dt.timestamp() * 1000)
+            except ValueError:
+                pass
+
+        track['_played_at_ms'] = played_at_ms
+        return played_at_ms
+
+    def _buffer_tracks(self, tracks: List[Dict[str, Any]], user_id: str, source: str,
+                       tracks_buffer: list, history_buffer: list):
+        """Prepare tracks and their listening history rows, appending them to the buffers."""
+        # Ensure tracks have audio features, fetching the missing ones in one batch
+        missing_ids = [track['id'] for track in tracks if not track.get('energy') and track.get('id')]
+        audio_features_map = self.api.get_audio_features_batch(missing_ids) if missing_ids else {}
+
         for track in tracks:
             try:
-                # Ensure track has audio features - get them if missing
-                if not track.get('energy'):
-                    audio_features = self.api.get_audio_features_safely(track['id'])
-                    track.update(audio_features)
-                
-                # Save track data (now includes audio features)
-                self.db.save_track(track)
+                if track.get('id') in audio_features_map:
+                    track.update(audio_features_map[track['id']])
+
+                tracks_buffer.append(track)
 
                 # Get timestamp (played_at or added_at)
                 timestamp = track.get('played_at') or track.get('added_at')
@@ -289,16 +310,10 @@ class SpotifyDataCollector:
                     # If no timestamp, use current time
                     played_at = datetime.now().isoformat()
 
-                # Save listening history
-                self.db.save_listening_history(
-                    user_id=user_id,
-                    track_id=track['id'],
-                    played_at=played_at,
-                    source=source
-                )
+                history_buffer.append((user_id, track['id'], played_at, source))
 
             except Exception as e:
-                logger.error(f"Error saving track {track.get('id')}: {e}")
+                logger.error(f"Error preparing track {track.get('id')}: {e}")
 
     def _handle_rate_limit(self):
         """Handle rate limiting with exponential backoff."""
@@ -306,4 +321,50 @@ class SpotifyDataCollector:
         # Increase delay if we're getting close to rate limit
         # Reset it periodically
         if self.rate_limit_delay < 4:  # Max 4 second delay
-            self.rate_limit_delay *= 1.5
\ No newline at end of file
+            self.rate_limit_delay *= 1.5
+
+
+def is_collection_running(user_id: str) -> bool:
+    """Return True if a background historical collection is in flight for this user."""
+    with _collections_lock:
+        return user_id in _collections_in_flight
+
+
+def submit_historical_collection(spotify_api, database, user_id: str, start_date: datetime = None,
+                                 force: bool = False) -> bool:
+    """
+    Queue collect_historical_data on the background collection pool.
+
+    Args:
+        spotify_api: SpotifyAPI instance for the user
+        database: SpotifyDatabase the collected rows are written to
+        user_id: User to collect for
+        start_date: Earliest date to collect from (default: two weeks ago)
+        force: Collect even if one finished within HISTORICAL_COLLECTION_TTL
+
+    Returns:
+        True if a job was queued, False if one is already running for this user
+        or finished recently
+    """
+    if not force and database.historical_collection_is_fresh(user_id, HISTORICAL_COLLECTION_TTL):
+        logger.info(f"Historical collection for {user_id} is recent, skipping")
+        return False
+
+    with _collections_lock:
+        if user_id in _collections_in_flight:
+            logger.info(f"Historical collection already running for {user_id}")
+            return False
+        _collections_in_flight.add(user_id)
+
+    def _run():
+        try:
+            return SpotifyDataCollector(spotify_api, database).collect_historical_data(user_id, start_date)
+        except Exception as e:
+            logger.error(f"Background historical collection failed: {e}")
+            return False
+        finally:
+            with _collections_lock:
+                _collections_in_flight.discard(user_id)
+
+    _collection_executor.submit(_run)
+    return True
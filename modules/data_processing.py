@@ -1,10 +1,17 @@
 import pandas as pd
+import numpy as np
 import os
 import json
 import sqlite3
 from datetime import datetime, timezone
 from typing import Optional, Union
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 def normalize_timestamp(timestamp: Union[str, datetime, None]) -> Optional[str]:
     """
     Normalize various timestamp formats to ISO format string.
@@ -48,6 +55,19 @@ def normalize_timestamp(timestamp: Union[str, datetime, None]) -> Optional[str]:
 
     return None
 
+def normalize_timestamp_series(timestamps: pd.Series) -> pd.Series:
+    """
+    Vectorized normalize_timestamp, parsed straight to datetimes.
+
+    Args:
+        timestamps: Series of ISO timestamps, with or without a timezone
+
+    Returns:
+        Series of naive UTC datetimes truncated to the second (NaT where invalid)
+    """
+    parsed = pd.to_datetime(timestamps, errors='coerce', utc=True, format='ISO8601')
+    return parsed.dt.tz_convert(None).dt.floor('s')
+
 def calculate_duration_minutes(duration_ms: Optional[int]) -> float:
     """
     Calculate duration in minutes from milliseconds.
@@ -62,6 +82,19 @@ def calculate_duration_minutes(duration_ms: Optional[int]) -> float:
         return 0.0
     return round(duration_ms / 60000, 2)
 
+def calculate_duration_minutes_series(duration_ms: pd.Series) -> pd.Series:
+    """
+    Vectorized calculate_duration_minutes for a whole DataFrame column.
+
+    Args:
+        duration_ms: Series of durations in milliseconds
+
+    Returns:
+        Series of durations in minutes (rounded to 2 decimal places)
+    """
+    durations = pd.to_numeric(duration_ms, errors='coerce').fillna(0).clip(lower=0)
+    return (durations / 60000).round(2)
+
 def calculate_total_listening_time(tracks_data: list) -> dict:
     """
     Calculate total listening time statistics from tracks data.
@@ -98,9 +131,11 @@ class DataProcessor:
         """Initialize data processor with data directory."""
         self.data_dir = data_dir
         os.makedirs(self.data_dir, exist_ok=True)
+        # Track ID last written to current_track.csv; polls of the same song skip the write
+        self._last_current_track_id = None
 
-    def save_data(self, data, filename, index=False):
-        """Save data to CSV file."""
+    def _build_frame(self, data, filename):
+        """Build the DataFrame save_data writes, with the file's default columns when data is empty."""
         if not data:
             # Create empty DataFrame with appropriate columns
             if filename == 'top_tracks.csv':
@@ -127,8 +162,20 @@ class DataProcessor:
                 df = pd.DataFrame()
         else:
             df = pd.DataFrame(data)
+        return df
 
+    def save_data(self, data, filename, index=False):
+        """Save data to CSV file."""
+        df = self._build_frame(data, filename)
         file_path = os.path.join(self.data_dir, filename)
+
+        if filename == 'current_track.csv':
+            # The current track is saved on every poll; only a new song is worth a write
+            track_id = data[0].get('id') if data else None
+            if track_id is not None and track_id == self._last_current_track_id and os.path.exists(file_path):
+                return df
+            self._last_current_track_id = track_id
+
         df.to_csv(file_path, index=index)
         return df
 
@@ -147,34 +194,33 @@ class DataProcessor:
 
     def process_top_tracks(self, data):
         """Process top tracks data."""
-        df = self.save_data(data, 'top_tracks.csv')
+        # Written once below, after the derived columns are added
+        df = self._build_frame(data, 'top_tracks.csv')
 
         # Create additional derived metrics
         if not df.empty and 'danceability' in df.columns and 'energy' in df.columns:
             # Calculate "vibe score" (custom metric)
             df['vibe_score'] = (df['danceability'] * 0.6 + df['energy'] * 0.4) * 100
 
-            # Save the enhanced data
-            df.to_csv(os.path.join(self.data_dir, 'top_tracks.csv'), index=False)
-
+        df.to_csv(os.path.join(self.data_dir, 'top_tracks.csv'), index=False)
         return df
 
     def process_saved_tracks(self, data):
         """Process saved tracks data with improved timestamp handling."""
-        df = self.save_data(data, 'saved_tracks.csv')
+        # Written once below, after the derived columns are added
+        df = self._build_frame(data, 'saved_tracks.csv')
 
         # Convert date columns to datetime with proper normalization
         if not df.empty and 'added_at' in df.columns:
-            # Normalize timestamps
-            df['added_at'] = df['added_at'].apply(normalize_timestamp)
-            df['added_at'] = pd.to_datetime(df['added_at'], errors='coerce')
+            # Normalize timestamps (naive UTC) in one vectorized parse
+            df['added_at'] = normalize_timestamp_series(df['added_at'])
 
             # Remove rows with invalid timestamps
             df = df.dropna(subset=['added_at'])
 
             # Calculate duration in minutes if duration_ms exists
             if 'duration_ms' in df.columns:
-                df['duration_minutes'] = df['duration_ms'].apply(calculate_duration_minutes)
+                df['duration_minutes'] = calculate_duration_minutes_series(df['duration_ms'])
 
             # Remove artificial end_date if it exists (we don't need it for timeline)
             if 'end_date' in df.columns:
@@ -183,9 +229,7 @@ class DataProcessor:
             # Sort by added_at date (most recent first)
             df = df.sort_values('added_at', ascending=False)
 
-            # Save the processed data
-            df.to_csv(os.path.join(self.data_dir, 'saved_tracks.csv'), index=False)
-
+        df.to_csv(os.path.join(self.data_dir, 'saved_tracks.csv'), index=False)
         return df
 
     def _process_playlists(self):
@@ -226,20 +270,20 @@ class DataProcessor:
 
     def process_recently_played(self, data):
         """Process recently played tracks data with improved timestamp handling."""
-        df = self.save_data(data, 'recently_played.csv')
+        # Written once below, after the derived columns are added
+        df = self._build_frame(data, 'recently_played.csv')
 
         # Convert date columns to datetime with proper normalization
         if not df.empty and 'played_at' in df.columns:
-            # Normalize timestamps
-            df['played_at'] = df['played_at'].apply(normalize_timestamp)
-            df['played_at'] = pd.to_datetime(df['played_at'], errors='coerce')
+            # Normalize timestamps (naive UTC) in one vectorized parse
+            df['played_at'] = normalize_timestamp_series(df['played_at'])
 
             # Remove rows with invalid timestamps
             df = df.dropna(subset=['played_at'])
 
             # Calculate duration in minutes if duration_ms exists
             if 'duration_ms' in df.columns:
-                df['duration_minutes'] = df['duration_ms'].apply(calculate_duration_minutes)
+                df['duration_minutes'] = calculate_duration_minutes_series(df['duration_ms'])
 
             # Remove artificial end_time if it exists
             if 'end_time' in df.columns:
@@ -253,9 +297,7 @@ class DataProcessor:
             df['day_of_week'] = df['played_at'].dt.day_name()
             df['hour_of_day'] = df['played_at'].dt.hour
 
-            # Save the processed data
-            df.to_csv(os.path.join(self.data_dir, 'recently_played.csv'), index=False)
-
+        df.to_csv(os.path.join(self.data_dir, 'recently_played.csv'), index=False)
         return df
 
     def process_audio_features(self, data):
@@ -269,18 +311,13 @@ class DataProcessor:
                              'acousticness', 'instrumentalness', 'liveness', 'valence']
 
             if all(feature in df.columns for feature in radar_features):
-                # Create a separate file for radar chart data
-                radar_data = []
-
-                for _, row in df.iterrows():
-                    for feature in radar_features:
-                        radar_data.append({
-                            'track': row['track'],
-                            'feature': feature,
-                            'value': row[feature]
-                        })
-
-                radar_df = pd.DataFrame(radar_data)
+                # Create a separate file for radar chart data: one row per
+                # (track, feature), built from the feature matrix in row-major order
+                radar_df = pd.DataFrame({
+                    'track': np.repeat(df['track'].to_numpy(), len(radar_features)),
+                    'feature': np.tile(radar_features, len(df)),
+                    'value': df[radar_features].to_numpy().ravel()
+                })
                 radar_df.to_csv(os.path.join(self.data_dir, 'radar_chart_data.csv'), index=False)
 
         return df
@@ -291,22 +328,11 @@ class DataProcessor:
 
         # Extract genres for genre analysis
         if not df.empty and 'genres' in df.columns:
-            all_genres = []
-
-            for _, row in df.iterrows():
-                genres = row['genres'].split(', ') if row['genres'] != 'Unknown' else []
-                for genre in genres:
-                    all_genres.append({
-                        'genre': genre,
-                        'artist': row['artist'],
-                        'count': 1
-                    })
-
-            if all_genres:
-                genres_df = pd.DataFrame(all_genres)
-                # Aggregate by genre
-                genre_counts = genres_df.groupby('genre')['count'].sum().reset_index()
-                genre_counts = genre_counts.sort_values('count', ascending=False)
+            # One row per (artist, genre), then count artists per genre
+            all_genres = df.loc[df['genres'] != 'Unknown', 'genres'].str.split(', ').explode().dropna()
+
+            if not all_genres.empty:
+                genre_counts = all_genres.value_counts().rename_axis('genre').reset_index(name='count')
                 genre_counts.to_csv(os.path.join(self.data_dir, 'genre_analysis.csv'), index=False)
 
         return df
@@ -316,32 +342,28 @@ class DataProcessor:
         saved_df = self.load_data('saved_tracks.csv')
         recent_df = self.load_data('recently_played.csv')
 
-        history_data = []
+        def _history_frame(df, timestamp_column, entry_type):
+            """Select the history columns from a saved/played frame."""
+            return pd.DataFrame({
+                'track': df['track'],
+                'artist': df['artist'],
+                'timestamp': df[timestamp_column],
+                'type': entry_type,
+                'album': df['album'] if 'album' in df.columns else 'Unknown'
+            })
+
+        history_frames = []
 
         # Process saved tracks
         if not saved_df.empty and 'added_at' in saved_df.columns:
-            for _, row in saved_df.iterrows():
-                history_data.append({
-                    'track': row['track'],
-                    'artist': row['artist'],
-                    'timestamp': row['added_at'],
-                    'type': 'Saved',
-                    'album': row.get('album', 'Unknown')
-                })
+            history_frames.append(_history_frame(saved_df, 'added_at', 'Saved'))
 
         # Process recently played
         if not recent_df.empty and 'played_at' in recent_df.columns:
-            for _, row in recent_df.iterrows():
-                history_data.append({
-                    'track': row['track'],
-                    'artist': row['artist'],
-                    'timestamp': row['played_at'],
-                    'type': 'Played',
-                    'album': row.get('album', 'Unknown')
-                })
+            history_frames.append(_history_frame(recent_df, 'played_at', 'Played'))
 
-        if history_data:
-            history_df = pd.DataFrame(history_data)
+        if history_frames:
+            history_df = pd.concat(history_frames, ignore_index=True)
             history_df['timestamp'] = pd.to_datetime(history_df['timestamp'], format='ISO8601')
             history_df = history_df.sort_values('timestamp', ascending=False)
             history_df.to_csv(os.path.join(self.data_dir, 'listening_history.csv'), index=False)
@@ -383,25 +405,29 @@ class DataProcessor:
                     'artist': top_track['artist']
                 }
             else:
-                # Fallback to database if Spotify API fails
+                # Fallback to database if Spotify API fails; plays are counted over
+                # listening_history alone (index-only on track_id) before joining tracks
                 cursor.execute('''
                     SELECT t.track_id as id,
                         t.name as track,
                         t.artist,
-                        COUNT(h.history_id) as play_count
-                    FROM tracks t
-                    JOIN listening_history h ON t.track_id = h.track_id
-                    WHERE t.track_id NOT LIKE 'artist-%' AND t.track_id NOT LIKE 'genre-%'
-                    GROUP BY t.track_id
-                    ORDER BY play_count DESC
+                        plays.play_count
+                    FROM (
+                        SELECT track_id, COUNT(*) as play_count
+                        FROM listening_history
+                        WHERE track_id NOT LIKE 'artist-%' AND track_id NOT LIKE 'genre-%'
+                        GROUP BY track_id
+                    ) plays
+                    JOIN tracks t ON t.track_id = plays.track_id
+                    ORDER BY plays.play_count DESC
                     LIMIT 1
                 ''')
                 top_track_row = cursor.fetchone()
                 if top_track_row:
-                    track = dict(top_track_row)
+                    _, track_name, track_artist, _ = top_track_row
                     summary['top_track'] = {
-                        'name': track['track'],
-                        'artist': track['artist']
+                        'name': track_name,
+                        'artist': track_artist
                     }
 
             # Get top artist from Spotify's official API
@@ -424,15 +450,28 @@ class DataProcessor:
                     ORDER BY count DESC
                     LIMIT 5
                 ''', (artist_name,))
-                genres = [dict(row)['genre_name'] for row in cursor.fetchall()]
+                genres = [row[0] for row in cursor.fetchall()]
                 summary['top_genres'] = genres[:3] if genres else ['Unknown']
             else:
                 # Fallback to database if Spotify API fails
+                # The artist's top genres ride along in the same statement, and
+                # plays are counted per track first so the join sees one row per track
                 cursor.execute('''
                     SELECT t.artist,
-                        COUNT(h.history_id) as play_count
-                    FROM tracks t
-                    JOIN listening_history h ON t.track_id = h.track_id
+                        SUM(plays.play_count) as play_count,
+                        (SELECT GROUP_CONCAT(genre_name, '|')
+                         FROM (SELECT genre_name
+                               FROM genres
+                               WHERE artist_name = t.artist
+                               GROUP BY genre_name
+                               ORDER BY count DESC
+                               LIMIT 3)) as genres
+                    FROM (
+                        SELECT track_id, COUNT(*) as play_count
+                        FROM listening_history
+                        GROUP BY track_id
+                    ) plays
+                    JOIN tracks t ON t.track_id = plays.track_id
                     WHERE t.artist IS NOT NULL AND t.artist != ''
                     GROUP BY t.artist
                     ORDER BY play_count DESC
@@ -440,56 +479,46 @@ class DataProcessor:
                 ''')
                 top_artist_row = cursor.fetchone()
                 if top_artist_row:
-                    artist = dict(top_artist_row)
-                    artist_name = artist['artist']
+                    artist_name, _, artist_genres = top_artist_row
                     summary['top_artist'] = artist_name
-                    # Get genres for this artist
-                    cursor.execute('''
-                        SELECT genre_name
-                        FROM genres
-                        WHERE artist_name = ?
-                        GROUP BY genre_name
-                        ORDER BY count DESC
-                        LIMIT 5
-                    ''', (artist_name,))
-                    genres = [dict(row)['genre_name'] for row in cursor.fetchall()]
-                    summary['top_genres'] = genres[:3] if genres else ['Unknown']
-
-            # Calculate music mood based on audio features
+                    summary['top_genres'] = artist_genres.split('|') if artist_genres else ['Unknown']
+
+            # Calculate music mood based on audio features. AVG already skips tracks without
+            # features, so the 0.5 default only applies when none of them have any
             cursor.execute('''
                 SELECT
-                    AVG(CASE WHEN t.valence IS NULL THEN 0.5 ELSE t.valence END) as avg_valence,
-                    AVG(CASE WHEN t.energy IS NULL THEN 0.5 ELSE t.energy END) as avg_energy,
-                    COUNT(*) as track_count
-                FROM tracks t
-                JOIN listening_history h ON t.track_id = h.track_id
+                    avg_valence,
+                    avg_energy,
+                    track_count,
+                    total_minutes,
+                    CASE
+                        WHEN avg_valence > 0.5 AND avg_energy > 0.5 THEN 'Happy & Energetic'
+                        WHEN avg_valence > 0.5 THEN 'Peaceful & Positive'
+                        WHEN avg_energy > 0.5 THEN 'Angry & Intense'
+                        ELSE 'Sad & Chill'
+                    END as mood
+                FROM (
+                    SELECT
+                        COALESCE(AVG(t.valence), 0.5) as avg_valence,
+                        COALESCE(AVG(t.energy), 0.5) as avg_energy,
+                        COUNT(*) as track_count,
+                        SUM(t.duration_ms) / 60000.0 as total_minutes
+                    FROM tracks t
+                    JOIN listening_history h ON t.track_id = h.track_id
+                )
             ''')
             features_row = cursor.fetchone()
             if features_row and features_row['track_count'] > 0:
-                features = dict(features_row)
-                avg_valence = features.get('avg_valence', 0.5) or 0.5
-                avg_energy = features.get('avg_energy', 0.5) or 0.5
-
-                # Determine mood quadrant
-                if avg_valence > 0.5 and avg_energy > 0.5:
-                    mood = "Happy & Energetic"
-                elif avg_valence > 0.5 and avg_energy <= 0.5:
-                    mood = "Peaceful & Positive"
-                elif avg_valence <= 0.5 and avg_energy > 0.5:
-                    mood = "Angry & Intense"
-                else:
-                    mood = "Sad & Chill"
-
                 summary['music_mood'] = {
-                    'mood': mood,
-                    'valence': avg_valence,
-                    'energy': avg_energy
+                    'mood': features_row['mood'],
+                    'valence': features_row['avg_valence'],
+                    'energy': features_row['avg_energy']
                 }
 
             # Get top genre from genres table linked to listening history (consistent with other components)
             cursor.execute('''
                 SELECT g.genre_name as genre,
-                    COUNT(DISTINCT h.history_id) as play_count
+                    COUNT(*) as play_count
                 FROM genres g
                 JOIN tracks t ON g.artist_name = t.artist
                 JOIN listening_history h ON t.track_id = h.track_id
@@ -503,28 +532,27 @@ class DataProcessor:
             ''')
             top_genre_row = cursor.fetchone()
             if top_genre_row:
-                genre = dict(top_genre_row)
+                genre_name, genre_play_count = top_genre_row
                 summary['genre_highlight'] = {
-                    'name': genre['genre'],
-                    'count': int(genre['play_count'])
+                    'name': genre_name,
+                    'count': int(genre_play_count)
                 }
 
-            # Calculate total listening minutes from track durations
-            cursor.execute('''
-                SELECT SUM(t.duration_ms) / 60000.0 as total_minutes
-                FROM tracks t
-                JOIN listening_history h ON t.track_id = h.track_id
-            ''')
-            minutes_row = cursor.fetchone()
-            if minutes_row:
-                summary['total_minutes'] = round(minutes_row['total_minutes'] or 0)
+            # Total listening minutes come from the same join as the mood averages
+            if features_row:
+                summary['total_minutes'] = round(features_row['total_minutes'] or 0)
 
         finally:
             cursor.close()
             conn.close()
 
-        # Save summary to JSON for caching
-        with open(os.path.join(self.data_dir, 'wrapped_summary.json'), 'w') as f:
-            json.dump(summary, f, indent=2)
+        # Save summary to JSON for caching (orjson also serializes numpy scalars natively)
+        summary_path = os.path.join(self.data_dir, 'wrapped_summary.json')
+        if ORJSON_AVAILABLE:
+            with open(summary_path, 'wb') as f:
+                f.write(orjson.dumps(summary, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+        else:
+            with open(summary_path, 'w') as f:
+                json.dump(summary, f, indent=2)
 
         return summary
\ No newline at end of file
@@ -2,11 +2,231 @@
 import sqlite3
 import os
 import logging
-from datetime import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 
 logger = logging.getLogger(__name__)
 
+# Per-connection tuning; journal_mode=WAL is persistent and set once per file in SpotifyDatabase
+_CONNECTION_PRAGMAS = (
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA cache_size=-65536',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA busy_timeout=5000',
+)
+
+# Bumped whenever _migrate_schema gains a step; tracked in PRAGMA user_version
+SCHEMA_VERSION = 6
+
+def _canonical_timestamp(value: str):
+    """Convert an ISO timestamp to naive UTC ISO format, or None if it can't be parsed."""
+    try:
+        dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (ValueError, AttributeError):
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt.isoformat()
+
+def _utc_now_iso() -> str:
+    """Current time as naive UTC ISO, the format played_at values are stored in."""
+    return datetime.now(timezone.utc).replace(tzinfo=None).isoformat()
+
+def connect(db_path: str) -> sqlite3.Connection:
+    """Open a SQLite connection with the performance PRAGMAs applied."""
+    conn = sqlite3.connect(db_path)
+    for pragma in _CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+_thread_local = threading.local()
+
+def get_thread_connection(db_path: str) -> sqlite3.Connection:
+    """
+    Return this thread's persistent connection to db_path, opening it on first use.
+
+    Callers must not close the returned connection and must commit any writes
+    before returning, since the next request on this thread reuses it.
+    """
+    connections = getattr(_thread_local, 'connections', None)
+    if connections is None:
+        connections = _thread_local.connections = {}
+
+    # User databases can be deleted and recreated (clear-all-data), so reopen if the
+    # file behind the cached connection has been replaced
+    try:
+        inode = os.stat(db_path).st_ino
+    except OSError:
+        inode = None
+    cached = connections.get(db_path)
+    if cached is not None:
+        if inode is not None and cached[1] == inode:
+            return cached[0]
+        cached[0].close()
+
+    conn = connect(db_path)
+    connections[db_path] = (conn, os.stat(db_path).st_ino)
+    return conn
+
+# Per-request queries on thread connections; constant text lets sqlite3 reuse the compiled statements
+# Track upserts keep the row's rowid, so track writes are counted in track_changes
+# by the triggers below instead
+_DATA_VERSION_SQL = '''
+    SELECT (SELECT MAX(history_id) FROM listening_history),
+           (SELECT version FROM track_changes WHERE id = 1)
+'''
+# Bump track_changes.version on any write to tracks, whichever code path makes it
+_TRACK_CHANGES_DDL = (
+    '''CREATE TABLE IF NOT EXISTS track_changes (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL DEFAULT 0
+    )''',
+    'INSERT OR IGNORE INTO track_changes (id, version) VALUES (1, 0)',
+    *(f'''CREATE TRIGGER IF NOT EXISTS tracks_{event.lower()}_version AFTER {event} ON tracks
+        BEGIN UPDATE track_changes SET version = version + 1 WHERE id = 1; END'''
+      for event in ('INSERT', 'UPDATE', 'DELETE')),
+)
+_LIBRARY_STATS_SQL = '''
+    SELECT COUNT(*), COUNT(DISTINCT artist), COUNT(DISTINCT album), SUM(duration_ms)
+    FROM tracks
+'''
+# Play totals for get_listening_statistics, unpacked positionally
+_LISTENING_STATS_SQL = '''
+    SELECT
+        COUNT(*) as total_plays,
+        COUNT(DISTINCT t.track_id) as unique_tracks,
+        COUNT(DISTINCT t.artist) as unique_artists,
+        SUM(t.duration_ms) as total_duration_ms,
+        AVG(t.duration_ms) as avg_track_duration_ms
+    FROM listening_history h
+    JOIN tracks t ON h.track_id = t.track_id
+    WHERE h.user_id = ?
+    AND h.source IN ('played', 'recently_played', 'current')
+    AND t.duration_ms IS NOT NULL
+    AND t.duration_ms > 0
+'''
+# julianday() parses the stored ISO text to millisecond precision (a Z suffix included),
+# so the epoch-ms cursor comes straight out of SQLite without a Python datetime round-trip
+_LATEST_PLAYED_MS_SQL = '''
+    SELECT CAST(ROUND((julianday(MAX(played_at)) - 2440587.5) * 86400000) AS INTEGER)
+    FROM listening_history
+    WHERE user_id = ?
+    AND source IN ('played', 'recently_played', 'current')
+'''
+
+def get_data_version(cursor):
+    """Return a cheap fingerprint that changes whenever history or tracks are written."""
+    try:
+        cursor.execute(_DATA_VERSION_SQL)
+        return cursor.fetchone()
+    except sqlite3.Error:
+        return None
+
+# One background writer: request threads hand off ingest writes instead of waiting on
+# disk, and a single worker keeps them ordered without contending for the write lock
+_db_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-writer')
+
+def _log_write_failure(future):
+    error = future.exception()
+    if error is not None:
+        logger.error(f"Background database write failed: {error}")
+
+def submit_write(fn, *args, **kwargs):
+    """
+    Run a database write on the background writer thread.
+
+    Args:
+        fn: Callable performing the write
+        *args, **kwargs: Arguments passed to fn
+
+    Returns:
+        Future for the write; failures are also logged
+    """
+    future = _db_writer.submit(fn, *args, **kwargs)
+    future.add_done_callback(_log_write_failure)
+    return future
+
+# Database files already created/migrated/tuned by this process; SpotifyDatabase is
+# constructed on every request, so the schema check only needs to run once per file
+_prepared_paths = set()
+_prepared_paths_lock = threading.Lock()
+
+# Library aggregates per database, shared by the stats and wrapped endpoints
+_library_stats_cache = {}
+_library_stats_lock = threading.Lock()
+
+def get_library_stats(db_path: str, data_version=None) -> dict:
+    """
+    Return track/artist/album counts and total duration for the tracks table.
+
+    Args:
+        db_path: Path to the user's database
+        data_version: Result of get_data_version(); when given, the aggregates are
+            reused until it changes
+
+    Returns:
+        Dict with total_tracks, total_artists, total_albums and total_duration_ms
+    """
+    if data_version is not None:
+        with _library_stats_lock:
+            cached = _library_stats_cache.get(db_path)
+        if cached and cached[0] == data_version:
+            return cached[1]
+
+    cursor = get_thread_connection(db_path).cursor()
+    cursor.execute(_LIBRARY_STATS_SQL)
+    total_tracks, total_artists, total_albums, total_duration_ms = cursor.fetchone()
+    stats = {
+        'total_tracks': total_tracks or 0,
+        'total_artists': total_artists or 0,
+        'total_albums': total_albums or 0,
+        'total_duration_ms': total_duration_ms or 0
+    }
+
+    if data_version is not None:
+        with _library_stats_lock:
+            _library_stats_cache[db_path] = (data_version, stats)
+    return stats
+
 class SpotifyDatabase:
+    # Upsert in place rather than INSERT OR REPLACE, which deletes and re-inserts the
+    # row (and its index entries) on every re-save. Audio features are only ever
+    # filled in, so a source without them doesn't wipe features already stored.
+    _TRACK_INSERT_SQL = '''
+        INSERT INTO tracks (
+            track_id, name, artist, album,
+            duration_ms, popularity, preview_url,
+            image_url, added_at, last_seen,
+            danceability, energy, key, loudness, mode,
+            speechiness, acousticness, instrumentalness,
+            liveness, valence, tempo
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP,
+                  ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(track_id) DO UPDATE SET
+            name = excluded.name,
+            artist = excluded.artist,
+            album = excluded.album,
+            duration_ms = excluded.duration_ms,
+            popularity = excluded.popularity,
+            preview_url = excluded.preview_url,
+            image_url = excluded.image_url,
+            added_at = excluded.added_at,
+            last_seen = excluded.last_seen,
+            danceability = COALESCE(excluded.danceability, danceability),
+            energy = COALESCE(excluded.energy, energy),
+            key = COALESCE(excluded.key, key),
+            loudness = COALESCE(excluded.loudness, loudness),
+            mode = COALESCE(excluded.mode, mode),
+            speechiness = COALESCE(excluded.speechiness, speechiness),
+            acousticness = COALESCE(excluded.acousticness, acousticness),
+            instrumentalness = COALESCE(excluded.instrumentalness, instrumentalness),
+            liveness = COALESCE(excluded.liveness, liveness),
+            valence = COALESCE(excluded.valence, valence),
+            tempo = COALESCE(excluded.tempo, tempo)
+    '''
+
     def __init__(self, db_path='/tmp/spotify_data.db'):
         """Initialize database with schema."""
         # Ensure data directory exists
@@ -18,14 +238,34 @@ class SpotifyDatabase:
         # Initialize the database if it doesn't exist
         if not os.path.exists(db_path):
             self.initialize_db()
+        elif db_path in _prepared_paths:
+            # Schema and tuning were already applied to this file by this process
+            return
         else:
             # Make sure all tables exist
             self.ensure_tables_exist()
 
+        self._tune_database()
+        with _prepared_paths_lock:
+            _prepared_paths.add(db_path)
+
+    def _tune_database(self):
+        """Switch the file to WAL so readers and the writer don't block each other, and refresh planner stats."""
+        try:
+            conn = connect(self.db_path)
+            try:
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute('PRAGMA optimize')
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not apply SQLite tuning: {e}")
+
     def ensure_tables_exist(self):
         """Make sure all necessary tables exist in the database."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            conn = connect(self.db_path)
+            try:
                 cursor = conn.cursor()
                 
                 # Check if the genres table exists
@@ -37,7 +277,11 @@ class SpotifyDatabase:
                 else:
                     logger.info("All tables exist in database")
 
+                self._migrate_schema(conn)
+
                 conn.commit()
+            finally:
+                conn.close()
         except sqlite3.Error as e:
             logger.error(f"Error ensuring tables exist: {e}")
             raise
@@ -52,7 +296,8 @@ class SpotifyDatabase:
                 user_id TEXT PRIMARY KEY,
                 display_name TEXT NOT NULL,
                 followers INTEGER DEFAULT 0,
-                last_updated TIMESTAMP
+                last_updated TIMESTAMP,
+                historical_collected_at TIMESTAMP
             )
         ''')
 
@@ -105,6 +350,7 @@ class SpotifyDatabase:
                 artist_name TEXT,
                 count INTEGER DEFAULT 1,
                 added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 UNIQUE(genre_name, artist_name)
             )
         ''')
@@ -123,19 +369,99 @@ class SpotifyDatabase:
         # Create indexes for better query performance
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_listening_history_user_time ON listening_history (user_id, played_at)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_listening_history_track ON listening_history (track_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_listening_history_user_source_time ON listening_history (user_id, source, played_at)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_tracks_artist ON tracks (artist)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_tracks_album_artist ON tracks (album, artist)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_genres_name ON genres (genre_name)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_genres_artist ON genres (artist_name)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_genres_composite ON genres (genre_name, artist_name)')
 
+        for statement in _TRACK_CHANGES_DDL:
+            cursor.execute(statement)
+
         logger.info("Created all database tables")
 
+    def _migrate_schema(self, conn):
+        """Bring databases created by older versions up to the current schema."""
+        cursor = conn.cursor()
+
+        cursor.execute('PRAGMA user_version')
+        version = cursor.fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+
+        if version < 1:
+            # genres.last_updated drives the 30 day freshness check for artist genres
+            cursor.execute("PRAGMA table_info(genres)")
+            genre_columns = {row[1] for row in cursor.fetchall()}
+            if 'last_updated' not in genre_columns:
+                cursor.execute('ALTER TABLE genres ADD COLUMN last_updated TIMESTAMP')
+                cursor.execute('UPDATE genres SET last_updated = COALESCE(added_at, CURRENT_TIMESTAMP)')
+                logger.info("Added last_updated column to genres table")
+
+            # Indexes added after the initial schema
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_tracks_album_artist ON tracks (album, artist)')
+
+        if version < 2:
+            # Older rows kept Spotify's 'Z' suffix while others were stored as naive UTC,
+            # so the same play could slip past UNIQUE(user_id, track_id, played_at)
+            cursor.execute('''
+                SELECT history_id, played_at FROM listening_history
+                WHERE played_at LIKE '%Z' OR played_at LIKE '%+__:__'
+            ''')
+            merged = 0
+            for history_id, played_at in cursor.fetchall():
+                canonical = _canonical_timestamp(played_at)
+                if canonical is None or canonical == played_at:
+                    continue
+                cursor.execute(
+                    'UPDATE OR IGNORE listening_history SET played_at = ? WHERE history_id = ?',
+                    (canonical, history_id)
+                )
+                if cursor.rowcount == 0:
+                    # The canonical row already exists, so this one is a duplicate play
+                    cursor.execute('DELETE FROM listening_history WHERE history_id = ?', (history_id,))
+                    merged += 1
+            if merged:
+                logger.info(f"Removed {merged} duplicate listening history rows")
+
+        if version < 3:
+            # One-shot data fix for future timestamps written before inserts were clamped;
+            # new rows go through _normalize_played_at so this never has to run per request.
+            # Stored values are naive UTC, so the cut-off must be too
+            now = _utc_now_iso()
+            cursor.execute(
+                'UPDATE OR IGNORE listening_history SET played_at = ? WHERE played_at > ?',
+                (now, now)
+            )
+            cursor.execute('DELETE FROM listening_history WHERE played_at > ?', (now,))
+
+        if version < 4:
+            # Serves the source IN (...) filters combined with a played_at range or MAX()
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_listening_history_user_source_time ON listening_history (user_id, source, played_at)')
+
+        if version < 5:
+            # Marks when a user's historical collection last finished
+            cursor.execute("PRAGMA table_info(users)")
+            user_columns = {row[1] for row in cursor.fetchall()}
+            if 'historical_collected_at' not in user_columns:
+                cursor.execute('ALTER TABLE users ADD COLUMN historical_collected_at TIMESTAMP')
+                logger.info("Added historical_collected_at column to users table")
+
+        if version < 6:
+            # Change counter behind get_data_version; upserts don't move MAX(rowid)
+            for statement in _TRACK_CHANGES_DDL:
+                cursor.execute(statement)
+
+        cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
     def initialize_db(self):
         """Create all necessary database tables."""
-        conn = sqlite3.connect(self.db_path)
+        conn = connect(self.db_path)
 
         try:
             self._create_tables(conn)
+            conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
             conn.commit()
             logger.info("Database initialized successfully")
         except sqlite3.Error as e:
@@ -146,13 +472,18 @@ class SpotifyDatabase:
 
     def save_user(self, user_data: dict):
         """Save basic user information."""
-        conn = sqlite3.connect(self.db_path)
+        conn = connect(self.db_path)
         cursor = conn.cursor()
 
         try:
+            # Upsert so columns not in the profile (historical_collected_at) survive
             cursor.execute('''
-                INSERT OR REPLACE INTO users (user_id, display_name, followers, last_updated)
+                INSERT INTO users (user_id, display_name, followers, last_updated)
                 VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    display_name = excluded.display_name,
+                    followers = excluded.followers,
+                    last_updated = excluded.last_updated
             ''', (
                 user_data.get('id'),
                 user_data.get('display_name', 'Unknown'),
@@ -175,92 +506,95 @@ class SpotifyDatabase:
         finally:
             conn.close()
 
+    def _build_track_row(self, track_data: dict):
+        """Validate track data and build the parameter tuple for the tracks insert.
+
+        Returns:
+            Tuple of column values, or None if the track has no ID
+        """
+        # Check for required fields and provide defaults if missing
+        track_id = track_data.get('id')
+        if not track_id:
+            return None
+
+        # Get name from either 'name' or 'track' field
+        name = track_data.get('name') or track_data.get('track')
+        if not name:
+            name = f"Unknown Track ({track_id})"
+
+        # Get artist with default and validation
+        artist = track_data.get('artist')
+        if not artist or not str(artist).strip():
+            artist = "Unknown Artist"
+        else:
+            artist = str(artist).strip()
+
+        # Validate and clean other string fields
+        album = track_data.get('album')
+        if album:
+            album = str(album).strip()
+            if not album:
+                album = None
+
+        # Validate numeric fields
+        duration_ms = track_data.get('duration_ms')
+        if duration_ms is not None:
+            try:
+                duration_ms = int(duration_ms)
+                if duration_ms < 0:
+                    duration_ms = None
+            except (ValueError, TypeError):
+                duration_ms = None
+
+        popularity = track_data.get('popularity')
+        if popularity is not None:
+            try:
+                popularity = int(popularity)
+                if not (0 <= popularity <= 100):
+                    popularity = None
+            except (ValueError, TypeError):
+                popularity = None
+
+        return (
+            track_id,
+            name,
+            artist,
+            album,
+            duration_ms,
+            popularity,
+            str(track_data.get('preview_url', '')).strip() if track_data.get('preview_url') else None,
+            str(track_data.get('image_url', '')).strip() if track_data.get('image_url') else None,
+            track_data.get('added_at'),
+            track_data.get('danceability'),
+            track_data.get('energy'),
+            track_data.get('key'),
+            track_data.get('loudness'),
+            track_data.get('mode'),
+            track_data.get('speechiness'),
+            track_data.get('acousticness'),
+            track_data.get('instrumentalness'),
+            track_data.get('liveness'),
+            track_data.get('valence'),
+            track_data.get('tempo'),
+        )
+
     def save_track(self, track_data: dict):
         """Save track data and its timestamp."""
-        conn = sqlite3.connect(self.db_path)
+        conn = connect(self.db_path)
         cursor = conn.cursor()
+        track_id = track_data.get('id')
 
         try:
-            # Check for required fields and provide defaults if missing
-            track_id = track_data.get('id')
-            if not track_id:
+            row = self._build_track_row(track_data)
+            if row is None:
                 logger.warning("Cannot save track without ID")
                 return
 
-            # Get name from either 'name' or 'track' field
-            name = track_data.get('name') or track_data.get('track')
-            if not name:
-                name = f"Unknown Track ({track_id})"
-
-            # Get artist with default and validation
-            artist = track_data.get('artist')
-            if not artist or not str(artist).strip():
-                artist = "Unknown Artist"
-            else:
-                artist = str(artist).strip()
-
-            # Validate and clean other string fields
-            album = track_data.get('album')
-            if album:
-                album = str(album).strip()
-                if not album:
-                    album = None
-
-            # Validate numeric fields
-            duration_ms = track_data.get('duration_ms')
-            if duration_ms is not None:
-                try:
-                    duration_ms = int(duration_ms)
-                    if duration_ms < 0:
-                        duration_ms = None
-                except (ValueError, TypeError):
-                    duration_ms = None
-
-            popularity = track_data.get('popularity')
-            if popularity is not None:
-                try:
-                    popularity = int(popularity)
-                    if not (0 <= popularity <= 100):
-                        popularity = None
-                except (ValueError, TypeError):
-                    popularity = None
-
             # Special logging for genre tracks
             if track_id.startswith('genre-'):
-                print(f"DATABASE: Saving genre track: {track_id}, name: {name}, artist: {artist}")
+                logger.debug(f"Saving genre track: {track_id}, name: {row[1]}, artist: {row[2]}")
 
-            cursor.execute('''
-                INSERT OR REPLACE INTO tracks (
-                    track_id, name, artist, album,
-                    duration_ms, popularity, preview_url,
-                    image_url, added_at, last_seen,
-                    danceability, energy, key, loudness, mode,
-                    speechiness, acousticness, instrumentalness,
-                    liveness, valence, tempo
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP,
-                          ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                track_id,
-                name,
-                artist,
-                album,
-                duration_ms,
-                popularity,
-                str(track_data.get('preview_url', '')).strip() if track_data.get('preview_url') else None,
-                str(track_data.get('image_url', '')).strip() if track_data.get('image_url') else None,
-                track_data.get('added_at'),
-                track_data.get('danceability'),
-                track_data.get('energy'),
-                track_data.get('key'),
-                track_data.get('loudness'),
-                track_data.get('mode'),
-                track_data.get('speechiness'),
-                track_data.get('acousticness'),
-                track_data.get('instrumentalness'),
-                track_data.get('liveness'),
-                track_data.get('valence'),
-                track_data.get('tempo'),
-            ))
+            cursor.execute(self._TRACK_INSERT_SQL, row)
 
             conn.commit()
 
@@ -269,80 +603,113 @@ class SpotifyDatabase:
                 cursor.execute("SELECT track_id FROM tracks WHERE track_id = ?", (track_id,))
                 track_exists = cursor.fetchone() is not None
                 if track_exists:
-                    print(f"DATABASE: Successfully saved genre track: {track_id}")
+                    logger.debug(f"Successfully saved genre track: {track_id}")
                 else:
-                    print(f"DATABASE: WARNING - Genre track {track_id} was not found after save attempt")
+                    logger.warning(f"Genre track {track_id} was not found after save attempt")
 
         except sqlite3.Error as e:
-            logger.error(f"Error saving track data: {e}")
-            if track_id and track_id.startswith('genre-'):
-                print(f"DATABASE ERROR saving genre track {track_id}: {e}")
+            logger.error(f"Error saving track data for {track_id}: {e}")
             raise
         finally:
             conn.close()
 
-    def save_listening_history(self, user_id: str, track_id: str, played_at: str, source: str = 'played'):
-        """Save a listening history entry with validation."""
-        # Validate required parameters
-        if not user_id or not isinstance(user_id, str):
-            logger.error("Invalid user_id: must be a non-empty string")
-            return False
+    def _build_track_rows(self, tracks: list) -> list:
+        """Build insert rows for a batch of tracks, skipping any without an ID.
 
-        if not track_id or not isinstance(track_id, str):
-            logger.error("Invalid track_id: must be a non-empty string")
-            return False
+        The same track often arrives from several sources in one batch (top tracks
+        are usually recently played too). INSERT OR REPLACE keeps the last copy, so
+        only that copy's row is written.
+        """
+        rows = {}
+        for track_data in tracks:
+            row = self._build_track_row(track_data)
+            if row is None:
+                logger.warning("Cannot save track without ID")
+                continue
+            rows[row[0]] = row
+        return list(rows.values())
 
-        if not played_at or not isinstance(played_at, str):
-            logger.error("Invalid played_at: must be a non-empty string")
-            return False
+    def save_tracks_bulk(self, tracks: list) -> int:
+        """Save a batch of tracks in a single transaction.
+
+        Args:
+            tracks: List of track dictionaries as accepted by save_track
+
+        Returns:
+            Number of tracks written
+        """
+        rows = self._build_track_rows(tracks)
+        if not rows:
+            return 0
+
+        conn = connect(self.db_path)
+
+        try:
+            with conn:
+                conn.executemany(self._TRACK_INSERT_SQL, rows)
+            logger.info(f"Saved {len(rows)} tracks in one transaction")
+            return len(rows)
+
+        except sqlite3.Error as e:
+            logger.error(f"Error saving track batch: {e}")
+            raise
+        finally:
+            conn.close()
+
+    def _normalize_played_at(self, played_at: str) -> str:
+        """Store played_at as naive UTC ISO so duplicates hit the UNIQUE constraint, and never in the future."""
+        canonical = _canonical_timestamp(played_at)
+        if canonical is None:
+            # If parsing fails, use current time
+            logger.warning(f"Invalid timestamp format ({played_at}), using current time instead")
+            return _utc_now_iso()
+
+        # Check if timestamp is in the future; canonical is naive UTC, so compare against UTC now
+        current_time = _utc_now_iso()
+        if datetime.fromisoformat(canonical) > datetime.fromisoformat(current_time):
+            # If in the future, use current time instead
+            logger.warning(f"Future timestamp detected ({canonical}), using current time instead")
+            return current_time
+
+        return canonical
+
+    def _validate_history_args(self, user_id, track_id, played_at, source) -> bool:
+        """Check that all listening history fields are non-empty strings."""
+        for field_name, value in (('user_id', user_id), ('track_id', track_id),
+                                  ('played_at', played_at), ('source', source)):
+            if not value or not isinstance(value, str):
+                logger.error(f"Invalid {field_name}: must be a non-empty string")
+                return False
+        return True
 
-        if not source or not isinstance(source, str):
-            logger.error("Invalid source: must be a non-empty string")
+    def save_listening_history(self, user_id: str, track_id: str, played_at: str, source: str = 'played'):
+        """Save a listening history entry with validation."""
+        # Validate required parameters
+        if not self._validate_history_args(user_id, track_id, played_at, source):
             return False
 
-        conn = sqlite3.connect(self.db_path)
+        conn = connect(self.db_path)
         cursor = conn.cursor()
 
         try:
             # Validate timestamp - ensure it's not in the future
-            try:
-                # Parse the timestamp
-                if 'Z' in played_at:
-                    dt = datetime.fromisoformat(played_at.replace('Z', '+00:00'))
-                elif 'T' in played_at and ('+' in played_at or '-' in played_at.split('T')[1]):
-                    dt = datetime.fromisoformat(played_at)
-                else:
-                    dt = datetime.fromisoformat(played_at)
-
-                # Remove timezone info for comparison
-                dt = dt.replace(tzinfo=None)
-
-                # Check if timestamp is in the future
-                current_time = datetime.now()
-                if dt > current_time:
-                    # If in the future, use current time instead
-                    played_at = current_time.isoformat()
-                    logger.warning(f"Future timestamp detected ({dt}), using current time instead")
-            except ValueError:
-                # If parsing fails, use current time
-                played_at = datetime.now().isoformat()
-                logger.warning(f"Invalid timestamp format ({played_at}), using current time instead")
+            played_at = self._normalize_played_at(played_at)
 
             # Special logging for genre tracks
             if track_id.startswith('genre-') or source == 'genre':
-                print(f"DATABASE: Saving listening history for genre: track_id={track_id}, user_id={user_id}, source={source}")
+                logger.debug(f"Saving listening history for genre: track_id={track_id}, user_id={user_id}, source={source}")
 
                 # Check if the track exists in the tracks table
                 cursor.execute("SELECT track_id FROM tracks WHERE track_id = ?", (track_id,))
                 track_exists = cursor.fetchone() is not None
                 if not track_exists:
-                    print(f"DATABASE WARNING: Track {track_id} does not exist in tracks table")
+                    logger.warning(f"Track {track_id} does not exist in tracks table")
 
                 # Check if the user exists in the users table
                 cursor.execute("SELECT user_id FROM users WHERE user_id = ?", (user_id,))
                 user_exists = cursor.fetchone() is not None
                 if not user_exists:
-                    print(f"DATABASE WARNING: User {user_id} does not exist in users table")
+                    logger.warning(f"User {user_id} does not exist in users table")
 
             cursor.execute('''
                 INSERT OR IGNORE INTO listening_history
@@ -369,23 +736,121 @@ class SpotifyDatabase:
                 )
                 history_exists = cursor.fetchone() is not None
                 if history_exists:
-                    print(f"DATABASE: Successfully saved listening history for genre: {track_id}")
+                    logger.debug(f"Successfully saved listening history for genre: {track_id}")
                 else:
-                    print(f"DATABASE WARNING: Listening history for genre {track_id} was not found after save attempt")
+                    logger.warning(f"Listening history for genre {track_id} was not found after save attempt")
 
             return True
 
         except sqlite3.Error as e:
-            logger.error(f"Error saving listening history: {e}")
-            if track_id.startswith('genre-') or source == 'genre':
-                print(f"DATABASE ERROR saving listening history for genre {track_id}: {e}")
+            logger.error(f"Error saving listening history for {track_id}: {e}")
             return False
         finally:
             conn.close()
 
+    def _build_history_rows(self, rows: list) -> list:
+        """Validate listening history tuples and normalize their played_at values."""
+        valid_rows = []
+        seen = set()
+        for user_id, track_id, played_at, source in rows:
+            if not self._validate_history_args(user_id, track_id, played_at, source):
+                continue
+            row = (user_id, track_id, self._normalize_played_at(played_at), source)
+            # Drop repeats within the batch before they reach the insert
+            if row in seen:
+                continue
+            seen.add(row)
+            valid_rows.append(row)
+        return valid_rows
+
+    def _insert_history_rows(self, conn, valid_rows: list):
+        """Insert prepared history rows and widen each user's collection status, inside the caller's transaction."""
+        conn.executemany('''
+            INSERT OR IGNORE INTO listening_history
+            (user_id, track_id, played_at, source)
+            VALUES (?, ?, ?, ?)
+        ''', valid_rows)
+
+        # Collapse the collection status update to one statement per user
+        time_ranges = {}
+        for user_id, _, played_at, _ in valid_rows:
+            earliest, latest = time_ranges.get(user_id, (played_at, played_at))
+            time_ranges[user_id] = (min(earliest, played_at), max(latest, played_at))
+
+        conn.executemany('''
+            UPDATE collection_status
+            SET earliest_known_timestamp = MIN(COALESCE(earliest_known_timestamp, ?), ?),
+                latest_known_timestamp = MAX(COALESCE(latest_known_timestamp, ?), ?),
+                last_collection_timestamp = CURRENT_TIMESTAMP
+            WHERE user_id = ?
+        ''', [(earliest, earliest, latest, latest, user_id)
+              for user_id, (earliest, latest) in time_ranges.items()])
+
+    def save_listening_history_bulk(self, rows: list) -> int:
+        """Save a batch of listening history entries in a single transaction.
+
+        Args:
+            rows: List of (user_id, track_id, played_at, source) tuples
+
+        Returns:
+            Number of rows handed to the insert (duplicates are ignored by SQLite)
+        """
+        valid_rows = self._build_history_rows(rows)
+        if not valid_rows:
+            return 0
+
+        conn = connect(self.db_path)
+
+        try:
+            with conn:
+                self._insert_history_rows(conn, valid_rows)
+
+            logger.info(f"Saved {len(valid_rows)} listening history entries in one transaction")
+            return len(valid_rows)
+
+        except sqlite3.Error as e:
+            logger.error(f"Error saving listening history batch: {e}")
+            return 0
+        finally:
+            conn.close()
+
+    def save_tracks_with_history_bulk(self, tracks: list, history_rows: list) -> int:
+        """Save a batch of tracks and their listening history in one transaction.
+
+        Args:
+            tracks: List of track dictionaries as accepted by save_track
+            history_rows: List of (user_id, track_id, played_at, source) tuples
+
+        Returns:
+            Number of history rows handed to the insert (duplicates are ignored by SQLite)
+        """
+        track_rows = self._build_track_rows(tracks)
+        history_rows = self._build_history_rows(history_rows)
+        if not track_rows and not history_rows:
+            return 0
+
+        conn = connect(self.db_path)
+
+        try:
+            # Tracks first so the history rows reference existing tracks
+            with conn:
+                if track_rows:
+                    conn.executemany(self._TRACK_INSERT_SQL, track_rows)
+                if history_rows:
+                    self._insert_history_rows(conn, history_rows)
+
+            logger.info(f"Saved {len(track_rows)} tracks and {len(history_rows)} listening history entries in one transaction")
+            return len(history_rows)
+
+        except sqlite3.Error as e:
+            logger.error(f"Error saving track and listening history batch: {e}")
+            raise
+        finally:
+            conn.close()
+
     def cleanup_listening_history(self, user_id: str) -> dict:
         """Clean up listening history data to remove duplicates and fix data quality issues."""
-        conn = sqlite3.connect(self.db_path)
+        conn = connect(self.db_path)
         cursor = conn.cursor()
 
         try:
@@ -393,25 +858,15 @@ class SpotifyDatabase:
             cursor.execute('SELECT COUNT(*) FROM listening_history WHERE user_id = ?', (user_id,))
             initial_count = cursor.fetchone()[0]
 
-            # 1. Remove exact duplicates (same user, track, and timestamp)
-            cursor.execute('''
-                DELETE FROM listening_history
-                WHERE history_id NOT IN (
-                    SELECT MIN(history_id)
-                    FROM listening_history
-                    WHERE user_id = ?
-                    GROUP BY user_id, track_id, played_at
-                )
-                AND user_id = ?
-            ''', (user_id, user_id))
-
-            duplicates_removed = cursor.rowcount
+            # 1. Exact duplicates (same user, track, and timestamp) are rejected at insert time
+            # by UNIQUE(user_id, track_id, played_at) now that played_at is canonicalized
+            duplicates_removed = 0
 
             # 2. Remove entries with invalid timestamps (future dates)
             cursor.execute('''
                 DELETE FROM listening_history
                 WHERE user_id = ?
-                AND datetime(played_at) > datetime('now')
+                AND played_at > strftime('%Y-%m-%dT%H:%M:%S', 'now')
             ''', (user_id,))
 
             future_entries_removed = cursor.rowcount
@@ -458,33 +913,96 @@ class SpotifyDatabase:
 
     def get_collection_status(self, user_id: str) -> dict:
         """Get the current data collection status for a user."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        # Read-only lookup on this thread's persistent connection
+        cursor = get_thread_connection(self.db_path).cursor()
+
+        cursor.execute('''
+            SELECT last_collection_timestamp,
+                   earliest_known_timestamp,
+                   latest_known_timestamp
+            FROM collection_status
+            WHERE user_id = ?
+        ''', (user_id,))
+
+        row = cursor.fetchone()
+        if row:
+            return {
+                'last_collection': row[0],
+                'earliest_known': row[1],
+                'latest_known': row[2]
+            }
+        return None
+
+    def historical_collection_is_fresh(self, user_id: str, max_age_seconds: int) -> bool:
+        """
+        Check whether a historical collection finished for a user recently.
+
+        Args:
+            user_id: The Spotify user ID
+            max_age_seconds: How long a finished collection counts as fresh
+
+        Returns:
+            True if a collection finished within max_age_seconds
+        """
+        cursor = get_thread_connection(self.db_path).cursor()
 
         try:
+            # historical_collected_at is written by CURRENT_TIMESTAMP, so datetime('now')
+            # compares in the same UTC text format
             cursor.execute('''
-                SELECT last_collection_timestamp,
-                       earliest_known_timestamp,
-                       latest_known_timestamp
-                FROM collection_status
+                SELECT 1 FROM users
                 WHERE user_id = ?
-            ''', (user_id,))
+                AND historical_collected_at >= datetime('now', ?)
+            ''', (user_id, f'-{int(max_age_seconds)} seconds'))
+            return cursor.fetchone() is not None
 
-            row = cursor.fetchone()
-            if row:
-                return {
-                    'last_collection': row[0],
-                    'earliest_known': row[1],
-                    'latest_known': row[2]
-                }
-            return None
+        except sqlite3.Error as e:
+            logger.error(f"Error checking historical collection marker: {e}")
+            return False
+
+    def mark_historical_collected(self, user_id: str):
+        """Record that a historical collection just finished for a user."""
+        conn = connect(self.db_path)
+
+        try:
+            with conn:
+                conn.execute(
+                    'UPDATE users SET historical_collected_at = CURRENT_TIMESTAMP WHERE user_id = ?',
+                    (user_id,)
+                )
 
+        except sqlite3.Error as e:
+            logger.error(f"Error marking historical collection: {e}")
         finally:
             conn.close()
 
+    def get_latest_played_at_ms(self, user_id: str):
+        """
+        Get the newest known play for a user as a Spotify pagination cursor.
+
+        Args:
+            user_id: The Spotify user ID
+
+        Returns:
+            Unix timestamp in milliseconds, or None if nothing has been played yet
+        """
+        # Read-only lookup on this thread's persistent connection
+        cursor = get_thread_connection(self.db_path).cursor()
+
+        try:
+            # Stored timestamps are UTC, either naive or with a Z suffix
+            cursor.execute(_LATEST_PLAYED_MS_SQL, (user_id,))
+            row = cursor.fetchone()
+            return row[0] if row else None
+
+        except sqlite3.Error as e:
+            logger.error(f"Error getting latest played timestamp: {e}")
+            return None
+
     def get_listening_history(self, user_id: str, start_date: str = None, end_date: str = None) -> list:
         """Get listening history for a user within a date range."""
-        conn = sqlite3.connect(self.db_path)
+        # Read-only, on this thread's persistent connection
+        conn = get_thread_connection(self.db_path)
         cursor = conn.cursor()
 
         query = '''
@@ -504,12 +1022,9 @@ class SpotifyDatabase:
 
         query += ' ORDER BY h.played_at DESC'
 
-        try:
-            cursor.execute(query, params)
-            return [dict(zip(['played_at', 'name', 'artist', 'album', 'source'], row))
-                   for row in cursor.fetchall()]
-        finally:
-            conn.close()
+        cursor.execute(query, params)
+        return [dict(zip(['played_at', 'name', 'artist', 'album', 'source'], row))
+                for row in cursor.fetchall()]
 
     def save_genre(self, genre_name: str, artist_name: str = None):
         """Save a genre to the database, incrementing count if it already exists."""
@@ -518,10 +1033,10 @@ class SpotifyDatabase:
 
         # If correction returns None, it means this genre should be filtered out
         if corrected_genre is None:
-            print(f"DATABASE: Filtered out genre '{genre_name}' for {artist_name} (incorrect classification)")
+            logger.debug(f"Filtered out genre '{genre_name}' for {artist_name} (incorrect classification)")
             return True  # Return True as this is intentional filtering, not an error
 
-        conn = sqlite3.connect(self.db_path)
+        conn = connect(self.db_path)
         cursor = conn.cursor()
 
         try:
@@ -538,33 +1053,110 @@ class SpotifyDatabase:
                 genre_id, count = existing
                 cursor.execute('''
                     UPDATE genres
-                    SET count = count + 1, added_at = CURRENT_TIMESTAMP
+                    SET count = count + 1, added_at = CURRENT_TIMESTAMP,
+                        last_updated = CURRENT_TIMESTAMP
                     WHERE genre_id = ?
                 ''', (genre_id,))
                 if corrected_genre != genre_name:
-                    print(f"DATABASE: Corrected '{genre_name}' to '{corrected_genre}' for {artist_name}")
-                print(f"DATABASE: Incremented count for genre '{corrected_genre}' to {count + 1}")
+                    logger.debug(f"Corrected '{genre_name}' to '{corrected_genre}' for {artist_name}")
+                logger.debug(f"Incremented count for genre '{corrected_genre}' to {count + 1}")
             else:
                 # Insert new genre
                 cursor.execute('''
-                    INSERT INTO genres (genre_name, artist_name, count)
-                    VALUES (?, ?, 1)
+                    INSERT INTO genres (genre_name, artist_name, count, last_updated)
+                    VALUES (?, ?, 1, CURRENT_TIMESTAMP)
                 ''', (corrected_genre, artist_name))
                 if corrected_genre != genre_name:
-                    print(f"DATABASE: Corrected '{genre_name}' to '{corrected_genre}' for {artist_name}")
-                print(f"DATABASE: Added new genre '{corrected_genre}'")
+                    logger.debug(f"Corrected '{genre_name}' to '{corrected_genre}' for {artist_name}")
+                logger.debug(f"Added new genre '{corrected_genre}'")
 
             conn.commit()
             return True
 
         except sqlite3.Error as e:
             logger.error(f"Error saving genre data: {e}")
-            print(f"DATABASE ERROR saving genre '{corrected_genre}': {e}")
             conn.rollback()
             return False
         finally:
             conn.close()
 
+    def save_genres_bulk(self, pairs: list) -> int:
+        """
+        Save several (genre_name, artist_name) pairs in one transaction.
+
+        Applies the same corrections and count increments as save_genre.
+
+        Args:
+            pairs: List of (genre_name, artist_name) tuples
+
+        Returns:
+            Number of pairs handled (filtered genres count as handled, like save_genre)
+        """
+        rows = []
+        handled = 0
+        for genre_name, artist_name in pairs:
+            if artist_name is None:
+                # NULL artists never conflict on the UNIQUE key, so keep save_genre's explicit lookup
+                handled += 1 if self.save_genre(genre_name, artist_name) else 0
+                continue
+
+            corrected_genre = self._correct_genre_for_artist(genre_name, artist_name)
+            handled += 1
+            if corrected_genre is None:
+                continue  # Intentionally filtered out
+            rows.append((corrected_genre, artist_name))
+
+        if not rows:
+            return handled
+
+        conn = connect(self.db_path)
+
+        try:
+            with conn:
+                conn.executemany('''
+                    INSERT INTO genres (genre_name, artist_name, count, last_updated)
+                    VALUES (?, ?, 1, CURRENT_TIMESTAMP)
+                    ON CONFLICT(genre_name, artist_name) DO UPDATE SET
+                        count = count + 1,
+                        added_at = CURRENT_TIMESTAMP,
+                        last_updated = CURRENT_TIMESTAMP
+                ''', rows)
+            return handled
+
+        except sqlite3.Error as e:
+            logger.error(f"Error saving genre batch: {e}")
+            return handled - len(rows)
+        finally:
+            conn.close()
+
+    def get_artist_genre_map(self, max_age_days: int = 30) -> dict:
+        """
+        Get genres already stored for each artist, skipping stale entries.
+
+        Args:
+            max_age_days: Entries last updated longer ago than this are treated as stale
+
+        Returns:
+            Dictionary mapping artist name to a list of genre names
+        """
+        # Read-only lookup on this thread's persistent connection
+        cursor = get_thread_connection(self.db_path).cursor()
+
+        try:
+            cursor.execute('''
+                SELECT artist_name, GROUP_CONCAT(genre_name, '|')
+                FROM genres
+                WHERE artist_name IS NOT NULL
+                AND last_updated >= datetime('now', ?)
+                GROUP BY artist_name
+            ''', (f'-{int(max_age_days)} days',))
+
+            return {artist: genres.split('|') for artist, genres in cursor.fetchall() if genres}
+
+        except sqlite3.Error as e:
+            logger.error(f"Error loading artist genres: {e}")
+            return {}
+
     def _correct_genre_for_artist(self, genre_name: str, artist_name: str) -> str:
         """
         Correct genre misclassifications for specific Kenyan artists.
@@ -642,8 +1234,8 @@ class SpotifyDatabase:
         Returns:
             List of genre dictionaries with genre and count
         """
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        # Read-only, on this thread's persistent connection
+        conn = get_thread_connection(self.db_path)
         cursor = conn.cursor()
 
         try:
@@ -664,7 +1256,7 @@ class SpotifyDatabase:
                     ORDER BY count DESC
                 ''')
 
-            raw_genres = [dict(row) for row in cursor.fetchall()]
+            raw_genres = [{'genre': genre, 'count': count} for genre, count in cursor.fetchall()]
 
             if categorize and raw_genres:
                 # Group similar genres together
@@ -676,8 +1268,6 @@ class SpotifyDatabase:
         except sqlite3.Error as e:
             logger.error(f"Error getting top genres: {e}")
             return []
-        finally:
-            conn.close()
 
     def get_user_top_genres(self, user_id: str, limit: int = 10, exclude_unknown: bool = True,
                            include_sources: list = None, date_filter: str = None, fast_mode: bool = False) -> list:
@@ -696,8 +1286,8 @@ class SpotifyDatabase:
         Returns:
             List of genre dictionaries with 'genre' and 'count' keys
         """
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        # Read-only, on this thread's persistent connection
+        conn = get_thread_connection(self.db_path)
         cursor = conn.cursor()
 
         try:
@@ -706,7 +1296,7 @@ class SpotifyDatabase:
                 query = '''
                     SELECT
                         g.genre_name as genre,
-                        COUNT(DISTINCT h.history_id) as play_count,
+                        COUNT(*) as play_count,
                         COUNT(DISTINCT t.artist) as artist_count
                     FROM genres g
                     JOIN tracks t ON g.artist_name = t.artist
@@ -727,9 +1317,10 @@ class SpotifyDatabase:
                     query += f" AND h.source IN ({placeholders})"
                     params.extend(include_sources)
 
-                # Add date filter
+                # Add date filter; played_at is ISO text, so comparing against the next day
+                # is the same as date(played_at) <= ? without parsing every row
                 if date_filter:
-                    query += " AND date(h.played_at) <= ?"
+                    query += " AND h.played_at < date(?, '+1 day')"
                     params.append(date_filter)
 
                 # Complete the query - simple count-based ordering
@@ -741,16 +1332,12 @@ class SpotifyDatabase:
                 params.append(limit)
 
                 cursor.execute(query, params)
-                raw_results = [dict(row) for row in cursor.fetchall()]
 
-                # Process results
-                genres = []
-                for row in raw_results:
-                    genres.append({
-                        'genre': row['genre'],
-                        'count': int(row['play_count']),
-                        'artist_count': row['artist_count']
-                    })
+                # Process results straight from the row tuples
+                genres = [
+                    {'genre': genre, 'count': int(play_count), 'artist_count': artist_count}
+                    for genre, play_count, artist_count in cursor.fetchall()
+                ]
 
             else:
                 # Build the improved time-weighted query (Spotify-like approach)
@@ -759,13 +1346,13 @@ class SpotifyDatabase:
                         g.genre_name as genre,
                         SUM(
                             CASE
-                                WHEN date(h.played_at) >= date('now', '-30 days') THEN 3.0
-                                WHEN date(h.played_at) >= date('now', '-90 days') THEN 2.0
-                                WHEN date(h.played_at) >= date('now', '-180 days') THEN 1.0
+                                WHEN h.played_at >= ? THEN 3.0
+                                WHEN h.played_at >= ? THEN 2.0
+                                WHEN h.played_at >= ? THEN 1.0
                                 ELSE 0.5
                             END
                         ) as weighted_score,
-                        COUNT(DISTINCT h.history_id) as play_count,
+                        COUNT(*) as play_count,
                         COUNT(DISTINCT t.artist) as artist_count
                     FROM genres g
                     JOIN tracks t ON g.artist_name = t.artist
@@ -774,7 +1361,11 @@ class SpotifyDatabase:
                     AND g.genre_name IS NOT NULL
                     AND g.genre_name != ''
                 '''
-                params = [user_id]
+                # Recency cut-offs are computed once here rather than by date('now', ...)
+                # in the CASE for every joined row
+                today = datetime.now(timezone.utc).date()
+                params = [(today - timedelta(days=days)).isoformat() for days in (30, 90, 180)]
+                params.append(user_id)
 
                 # Add unknown genre filter
                 if exclude_unknown:
@@ -786,9 +1377,10 @@ class SpotifyDatabase:
                     query += f" AND h.source IN ({placeholders})"
                     params.extend(include_sources)
 
-                # Add date filter
+                # Add date filter; played_at is ISO text, so comparing against the next day
+                # is the same as date(played_at) <= ? without parsing every row
                 if date_filter:
-                    query += " AND date(h.played_at) <= ?"
+                    query += " AND h.played_at < date(?, '+1 day')"
                     params.append(date_filter)
 
                 # Complete the query - order by weighted score for better recency bias
@@ -800,17 +1392,17 @@ class SpotifyDatabase:
                 params.append(limit)
 
                 cursor.execute(query, params)
-                raw_results = [dict(row) for row in cursor.fetchall()]
 
                 # Process results to maintain backward compatibility
-                genres = []
-                for row in raw_results:
-                    genres.append({
-                        'genre': row['genre'],
-                        'count': int(row['play_count']),  # Keep original count for compatibility
-                        'weighted_score': round(row['weighted_score'], 2),
-                        'artist_count': row['artist_count']
-                    })
+                genres = [
+                    {
+                        'genre': genre,
+                        'count': int(play_count),  # Keep original count for compatibility
+                        'weighted_score': round(weighted_score, 2),
+                        'artist_count': artist_count
+                    }
+                    for genre, weighted_score, play_count, artist_count in cursor.fetchall()
+                ]
 
             logger.info(f"Retrieved {len(genres)} top genres for user {user_id} ({'fast' if fast_mode else 'time-weighted'} mode)")
             if genres:
@@ -820,8 +1412,6 @@ class SpotifyDatabase:
         except sqlite3.Error as e:
             logger.error(f"Error getting user top genres: {e}")
             return []
-        finally:
-            conn.close()
 
     def _categorize_genres(self, genres):
         """
@@ -896,7 +1486,8 @@ class SpotifyDatabase:
 
     def get_all_listening_history_artists(self):
         """Get all unique artists from the listening history."""
-        conn = sqlite3.connect(self.db_path)
+        # Read-only, on this thread's persistent connection
+        conn = get_thread_connection(self.db_path)
         cursor = conn.cursor()
 
         try:
@@ -910,8 +1501,6 @@ class SpotifyDatabase:
         except sqlite3.Error as e:
             logger.error(f"Error getting listening history artists: {e}")
             return []
-        finally:
-            conn.close()
 
     def get_listening_statistics(self, user_id: str):
         """
@@ -923,38 +1512,23 @@ class SpotifyDatabase:
         Returns:
             Dictionary with listening statistics
         """
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        # Read-only, on this thread's persistent connection
+        cursor = get_thread_connection(self.db_path).cursor()
 
         try:
             # Get total listening time and track count
-            cursor.execute('''
-                SELECT
-                    COUNT(DISTINCT h.history_id) as total_plays,
-                    COUNT(DISTINCT t.track_id) as unique_tracks,
-                    COUNT(DISTINCT t.artist) as unique_artists,
-                    SUM(t.duration_ms) as total_duration_ms,
-                    AVG(t.duration_ms) as avg_track_duration_ms
-                FROM listening_history h
-                JOIN tracks t ON h.track_id = t.track_id
-                WHERE h.user_id = ?
-                AND h.source IN ('played', 'recently_played', 'current')
-                AND t.duration_ms IS NOT NULL
-                AND t.duration_ms > 0
-            ''', (user_id,))
-
-            stats = dict(cursor.fetchone())
+            cursor.execute(_LISTENING_STATS_SQL, (user_id,))
+            total_plays, unique_tracks, unique_artists, total_duration_ms, avg_track_duration_ms = cursor.fetchone()
 
             # Calculate derived statistics
-            total_minutes = round((stats['total_duration_ms'] or 0) / 60000, 2)
+            total_minutes = round((total_duration_ms or 0) / 60000, 2)
             total_hours = round(total_minutes / 60, 2)
-            avg_track_minutes = round((stats['avg_track_duration_ms'] or 0) / 60000, 2)
+            avg_track_minutes = round((avg_track_duration_ms or 0) / 60000, 2)
 
             return {
-                'total_plays': stats['total_plays'] or 0,
-                'unique_tracks': stats['unique_tracks'] or 0,
-                'unique_artists': stats['unique_artists'] or 0,
+                'total_plays': total_plays or 0,
+                'unique_tracks': unique_tracks or 0,
+                'unique_artists': unique_artists or 0,
                 'total_minutes': total_minutes,
                 'total_hours': total_hours,
                 'average_track_minutes': avg_track_minutes
@@ -970,5 +1544,3 @@ class SpotifyDatabase:
                 'total_hours': 0,
                 'average_track_minutes': 0
             }
-        finally:
-            conn.close()
\ No newline at end of file
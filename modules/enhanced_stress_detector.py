@@ -237,28 +237,27 @@ class EnhancedStressDetector:
         
         daily_data.columns = ['date', 'avg_energy', 'energy_std', 'avg_valence', 'valence_std', 'track_count']
         
-        for _, day in daily_data.iterrows():
-            # Calculate daily stress score
-            daily_stress = 0
-            
-            # High energy + low valence indicator
-            if day['avg_energy'] > 0.7 and day['avg_valence'] < 0.4:
-                daily_stress += 30
-            
-            # High volatility indicator
-            if day['valence_std'] > 0.3:
-                daily_stress += 25
-            
-            # Excessive listening indicator
-            if day['track_count'] > 50:
-                daily_stress += 20
-            
+        # Score every day at once: high energy + low valence (30), high volatility (25)
+        # and excessive listening (20), capped at 100
+        avg_energy = daily_data['avg_energy'].to_numpy()
+        avg_valence = daily_data['avg_valence'].to_numpy()
+        track_counts = daily_data['track_count'].to_numpy()
+        daily_stress = (
+            np.where((avg_energy > 0.7) & (avg_valence < 0.4), 30, 0)
+            + np.where(daily_data['valence_std'].to_numpy() > 0.3, 25, 0)
+            + np.where(track_counts > 50, 20, 0)
+        )
+        daily_stress = np.clip(daily_stress, 0, 100)
+
+        for date, stress, mood, energy, count in zip(
+                daily_data['date'].tolist(), daily_stress.tolist(),
+                avg_valence.tolist(), avg_energy.tolist(), track_counts.tolist()):
             timeline.append({
-                'date': day['date'],
-                'stress_score': min(daily_stress, 100),
-                'avg_mood': day['avg_valence'],
-                'avg_energy': day['avg_energy'],
-                'listening_intensity': day['track_count']
+                'date': date,
+                'stress_score': stress,
+                'avg_mood': mood,
+                'avg_energy': energy,
+                'listening_intensity': count
             })
         
         return sorted(timeline, key=lambda x: x['date'])
@@ -1,19 +1,24 @@
 """Simple in-memory cache for genre data to improve performance."""
+import threading
 import time
+from collections import OrderedDict
 from typing import Dict, List, Optional
 
 class GenreCache:
-    """Simple in-memory cache for artist genres."""
+    """Simple in-memory LRU cache for artist genres."""
     
-    def __init__(self, ttl_seconds: int = 3600):  # 1 hour TTL
+    def __init__(self, ttl_seconds: int = 3600, max_size: int = 4096):  # 1 hour TTL
         """
         Initialize the cache.
         
         Args:
             ttl_seconds: Time to live for cached entries in seconds
+            max_size: Maximum number of artists kept before the least recently used is evicted
         """
-        self.cache: Dict[str, Dict] = {}
+        self.cache: "OrderedDict[str, Dict]" = OrderedDict()
         self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._lock = threading.Lock()
     
     def get(self, artist_name: str) -> Optional[List[str]]:
         """
@@ -25,17 +30,19 @@ class GenreCache:
         Returns:
             List of genres or None if not cached or expired
         """
-        if artist_name not in self.cache:
-            return None
+        with self._lock:
+            if artist_name not in self.cache:
+                return None
+                
+            entry = self.cache[artist_name]
             
-        entry = self.cache[artist_name]
-        
-        # Check if entry has expired
-        if time.time() - entry['timestamp'] > self.ttl_seconds:
-            del self.cache[artist_name]
-            return None
-            
-        return entry['genres']
+            # Check if entry has expired
+            if time.time() - entry['timestamp'] > self.ttl_seconds:
+                del self.cache[artist_name]
+                return None
+                
+            self.cache.move_to_end(artist_name)
+            return entry['genres']
     
     def set(self, artist_name: str, genres: List[str]) -> None:
         """
@@ -45,14 +52,38 @@ class GenreCache:
             artist_name: Name of the artist
             genres: List of genres for the artist
         """
-        self.cache[artist_name] = {
-            'genres': genres,
-            'timestamp': time.time()
-        }
+        with self._lock:
+            self.cache[artist_name] = {
+                'genres': genres,
+                'timestamp': time.time()
+            }
+            self.cache.move_to_end(artist_name)
+            
+            # Evict least recently used entries
+            while len(self.cache) > self.max_size:
+                self.cache.popitem(last=False)
+    
+    def warm(self, artist_genres: Dict[str, List[str]]) -> int:
+        """
+        Pre-populate the cache with genres already persisted in the database.
+        
+        Args:
+            artist_genres: Mapping of artist name to list of genres
+            
+        Returns:
+            Number of artists added
+        """
+        added = 0
+        for artist_name, genres in artist_genres.items():
+            if artist_name and self.get(artist_name) is None:
+                self.set(artist_name, genres)
+                added += 1
+        return added
     
     def clear(self) -> None:
         """Clear all cached entries."""
-        self.cache.clear()
+        with self._lock:
+            self.cache.clear()
     
     def size(self) -> int:
         """Get the number of cached entries."""
@@ -66,15 +97,16 @@ class GenreCache:
             Number of entries removed
         """
         current_time = time.time()
-        expired_keys = []
-        
-        for artist_name, entry in self.cache.items():
-            if current_time - entry['timestamp'] > self.ttl_seconds:
-                expired_keys.append(artist_name)
         
-        for key in expired_keys:
-            del self.cache[key]
+        with self._lock:
+            expired_keys = [
+                artist_name for artist_name, entry in self.cache.items()
+                if current_time - entry['timestamp'] > self.ttl_seconds
+            ]
             
+            for key in expired_keys:
+                del self.cache[key]
+                
         return len(expired_keys)
 
 # Global cache instance
@@ -82,4 +114,4 @@ _genre_cache = GenreCache()
 
 def get_genre_cache() -> GenreCache:
     """Get the global genre cache instance."""
-    return _genre_cache
\ No newline at end of file
+    return _genre_cache
@@ -1,8 +1,8 @@
 """Genre evolution tracking and visualization for AI insights."""
-import sqlite3
 import pandas as pd
 from datetime import datetime, timedelta
 from typing import Dict, List
+from modules.database import get_thread_connection
 
 try:
     import plotly.graph_objects as go
@@ -23,7 +23,8 @@ class GenreEvolutionTracker:
     
     def get_genre_evolution_data(self, user_id: str, months_back: int = 12) -> Dict:
         """Get genre evolution data over time."""
-        conn = sqlite3.connect(self.db_path)
+        # Read-only, on this thread's persistent connection
+        conn = get_thread_connection(self.db_path)
         
         try:
             # First try with genres table
@@ -70,8 +71,6 @@ class GenreEvolutionTracker:
             except Exception as fallback_error:
                 print(f"Fallback also failed: {fallback_error}")
                 return self._get_insufficient_data_response()
-        finally:
-            conn.close()
     
     def _process_timeline_data(self, df: pd.DataFrame) -> List[Dict]:
         """Process data for timeline visualization."""
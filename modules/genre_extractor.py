@@ -1,20 +1,82 @@
 """Module for extracting genres from tracks."""
+import atexit
 import logging
 import time
-import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any
 
+from modules.database import get_thread_connection
+from modules.genre_cache import get_genre_cache
+
 logger = logging.getLogger(__name__)
 
+# Genre enrichment sleeps between Spotify calls, so it runs on a background
+# pool instead of the request thread. Jobs are keyed by database path so a
+# user never has more than one extraction in flight.
+_genre_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='genre-worker')
+_pending_jobs = set()
+_pending_lock = threading.Lock()
+
+# Set at interpreter exit; waits below use it instead of time.sleep so a job
+# stuck in a rate-limit pause wakes up immediately and stops between batches.
+_shutdown = threading.Event()
+
+# Artists per IN (...) lookup; older SQLite builds cap a statement at 999 variables
+_IN_CLAUSE_CHUNK = 500
+
+
+def _stop_genre_workers():
+    """Wake sleeping extraction jobs and drop queued ones on interpreter exit."""
+    _shutdown.set()
+    _genre_executor.shutdown(wait=False, cancel_futures=True)
+
+
+atexit.register(_stop_genre_workers)
+
+
+class RateLimiter:
+    """Thread-safe limiter that spaces calls evenly across every worker sharing it."""
+
+    def __init__(self, calls_per_second: float):
+        self.interval = 1.0 / calls_per_second
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until the caller's slot comes up."""
+        with self._lock:
+            now = time.monotonic()
+            wait_time = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+
+        if wait_time > 0:
+            _shutdown.wait(wait_time)
+
+
+# Shared by all extraction jobs so concurrent users don't multiply the request rate;
+# get_artist_genres backs off on its own when Spotify still answers 429
+_spotify_rate_limiter = RateLimiter(calls_per_second=4)
+
 class GenreExtractor:
     def __init__(self, spotify_api, database):
         """Initialize extractor with API and database instances."""
         self.api = spotify_api
         self.db = database
-        self.rate_limit_delay = 0.5  # Reduced base delay between API calls
-        self.batch_delay = 2.0  # Reduced delay every few requests
         self.request_count = 0  # Track number of requests made
         self.genre_cache = {}  # Cache for artist genres to avoid duplicate API calls
+        self.genre_max_age_days = 30  # Stored genres older than this are fetched again
+        self.max_workers = 5  # Concurrent artist lookups per batch
+        self._warm_genre_cache()
+
+    def _warm_genre_cache(self):
+        """Load fresh genres from the database into the shared in-memory cache."""
+        try:
+            warmed = get_genre_cache().warm(self.db.get_artist_genre_map(self.genre_max_age_days))
+            if warmed:
+                logger.info(f"Warmed genre cache with {warmed} artists from the database")
+        except Exception as e:
+            logger.error(f"Error warming genre cache: {e}")
 
     def extract_genres_from_recent_tracks(self, max_artists: int = 100):
         """
@@ -42,19 +104,17 @@ class GenreExtractor:
 
         # Process artists in optimized batches
         genres_count = 0
-        batch_size = 10  # Process 10 artists before taking a break
+        batch_size = 10  # Artists looked up per thread pool round
         
         for i in range(0, len(artists_to_process), batch_size):
+            if _shutdown.is_set():
+                logger.info("Shutting down, stopping genre extraction early")
+                break
             batch = artists_to_process[i:i + batch_size]
             logger.info(f"Processing batch {i//batch_size + 1}/{(len(artists_to_process) + batch_size - 1)//batch_size} ({len(batch)} artists)")
             
             batch_genres = self._process_artist_batch(batch)
             genres_count += batch_genres
-            
-            # Take a break between batches
-            if i + batch_size < len(artists_to_process):
-                logger.info(f"Taking a break after batch {i//batch_size + 1}...")
-                time.sleep(self.batch_delay)
 
         logger.info(f"Extracted and saved {genres_count} genres from {len(artists_to_process)} artists")
         return genres_count
@@ -85,19 +145,17 @@ class GenreExtractor:
 
         # Process artists in optimized batches
         genres_count = 0
-        batch_size = 10  # Process 10 artists before taking a break
+        batch_size = 10  # Artists looked up per thread pool round
         
         for i in range(0, len(artists_to_process), batch_size):
+            if _shutdown.is_set():
+                logger.info("Shutting down, stopping genre extraction early")
+                break
             batch = artists_to_process[i:i + batch_size]
             logger.info(f"Processing batch {i//batch_size + 1}/{(len(artists_to_process) + batch_size - 1)//batch_size} ({len(batch)} artists)")
             
             batch_genres = self._process_artist_batch(batch)
             genres_count += batch_genres
-            
-            # Take a break between batches
-            if i + batch_size < len(artists_to_process):
-                logger.info(f"Taking a break after batch {i//batch_size + 1}...")
-                time.sleep(self.batch_delay)
 
         logger.info(f"Extracted and saved {genres_count} genres from {len(artists_to_process)} artists")
         return genres_count
@@ -113,9 +171,8 @@ class GenreExtractor:
             List of unique artist names
         """
         try:
-            # Connect to the database
-            conn = sqlite3.connect(self.db.db_path)
-            cursor = conn.cursor()
+            # Read-only, on this worker thread's persistent connection
+            cursor = get_thread_connection(self.db.db_path).cursor()
 
             # Query for unique artists from recently played tracks
             cursor.execute('''
@@ -127,7 +184,6 @@ class GenreExtractor:
             ''', (max_artists,))
 
             artists = [row[0] for row in cursor.fetchall()]
-            conn.close()
 
             return artists
 
@@ -146,19 +202,24 @@ class GenreExtractor:
             List of artists that need genre extraction
         """
         try:
-            conn = sqlite3.connect(self.db.db_path)
-            cursor = conn.cursor()
-            
-            # Get artists that already have genres
-            placeholders = ','.join(['?' for _ in artists])
-            cursor.execute(f'''
-                SELECT DISTINCT artist_name 
-                FROM genres 
-                WHERE artist_name IN ({placeholders})
-            ''', artists)
-            
-            existing_artists = {row[0] for row in cursor.fetchall()}
-            conn.close()
+            cursor = get_thread_connection(self.db.db_path).cursor()
+
+            # Callers may pass the same artist more than once; look each up only once
+            artists = list(dict.fromkeys(artists))
+
+            # Get artists that already have genres which are not stale yet, in chunks
+            # that stay under SQLite's bound-variable limit
+            existing_artists = set()
+            for i in range(0, len(artists), _IN_CLAUSE_CHUNK):
+                chunk = artists[i:i + _IN_CLAUSE_CHUNK]
+                placeholders = ','.join('?' * len(chunk))
+                cursor.execute(f'''
+                    SELECT DISTINCT artist_name
+                    FROM genres
+                    WHERE artist_name IN ({placeholders})
+                    AND last_updated >= datetime('now', ?)
+                ''', [*chunk, f'-{self.genre_max_age_days} days'])
+                existing_artists.update(row[0] for row in cursor.fetchall())
             
             # Return artists that don't have genres yet
             return [artist for artist in artists if artist not in existing_artists]
@@ -171,6 +232,9 @@ class GenreExtractor:
         """
         Process a batch of artists for genre extraction.
         
+        Lookups run concurrently on a small thread pool; the shared rate limiter
+        keeps the aggregate request rate under Spotify's limits.
+        
         Args:
             artists: List of artist names to process
             
@@ -179,51 +243,88 @@ class GenreExtractor:
         """
         genres_count = 0
         
+        # Fetch genres for artists we haven't looked up yet
+        to_fetch = [artist_name for artist_name in artists if artist_name not in self.genre_cache]
+        if to_fetch:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for artist_name, genres in zip(to_fetch, executor.map(self._fetch_artist_genres, to_fetch)):
+                    if genres is not None:
+                        self.genre_cache[artist_name] = genres
+                        logger.info(f"Found {len(genres)} genres for artist {artist_name}: {genres}")
+            self.request_count += len(to_fetch)
+        
+        # Save the whole batch's genres in one transaction
+        pairs = []
         for artist_name in artists:
-            try:
-                # Check cache first
-                if artist_name in self.genre_cache:
-                    genres = self.genre_cache[artist_name]
-                    logger.info(f"Using cached genres for {artist_name}: {genres}")
-                else:
-                    # Get artist genres using the API method
-                    genres = self.api.get_artist_genres(artist_name)
-                    self.genre_cache[artist_name] = genres
-                    logger.info(f"Found {len(genres)} genres for artist {artist_name}: {genres}")
-
-                # Save each genre to the database
-                for genre in genres:
-                    if genre and genre.strip():  # Skip empty genres
-                        success = self.db.save_genre(genre.strip(), artist_name)
-                        if success:
-                            genres_count += 1
-                            logger.info(f"Saved genre '{genre}' for artist '{artist_name}'")
-                        else:
-                            logger.warning(f"Failed to save genre '{genre}' for artist '{artist_name}'")
-
-                if not genres:
-                    logger.warning(f"No genres found for artist {artist_name}")
-
-                # Shorter delay between artists in the same batch
-                time.sleep(self.rate_limit_delay)
-                self.request_count += 1
+            if artist_name not in self.genre_cache:
+                continue  # Lookup failed, already logged
 
+            genres = self.genre_cache[artist_name]
+            if not genres:
+                logger.warning(f"No genres found for artist {artist_name}")
+            pairs.extend((genre.strip(), artist_name) for genre in genres if genre and genre.strip())
+
+        if pairs:
+            try:
+                genres_count = self.db.save_genres_bulk(pairs)
+                logger.info(f"Saved {genres_count} genres for {len(artists)} artists")
+                if genres_count < len(pairs):
+                    logger.warning(f"Failed to save {len(pairs) - genres_count} genres in batch")
             except Exception as e:
-                logger.error(f"Error extracting genres for artist {artist_name}: {e}")
-                
+                logger.error(f"Error saving genres for batch: {e}")
+
         return genres_count
 
-    def _handle_rate_limit(self):
-        """Handle rate limiting with improved backoff strategy."""
-        # Base delay
-        time.sleep(self.rate_limit_delay)
+    def _fetch_artist_genres(self, artist_name: str):
+        """Look up one artist's genres, waiting for a rate limiter slot first. Returns None on failure."""
+        _spotify_rate_limiter.acquire()
+        if _shutdown.is_set():
+            return None
+        try:
+            return self.api.get_artist_genres(artist_name)
+        except Exception as e:
+            logger.error(f"Error extracting genres for artist {artist_name}: {e}")
+            return None
 
-        # Every 5 requests, take a longer break
-        if self.request_count % 5 == 0 and self.request_count > 0:
-            logger.info(f"Taking a longer break after {self.request_count} API calls...")
-            time.sleep(self.batch_delay)
 
-        # Every 20 requests, take an even longer break
-        if self.request_count % 20 == 0 and self.request_count > 0:
-            logger.info(f"Taking an extended break after {self.request_count} API calls...")
-            time.sleep(5)  # Reduced from 10 to 5 seconds
+def is_genre_extraction_running(database) -> bool:
+    """Return True if a background genre extraction is in flight for this database."""
+    with _pending_lock:
+        return database.db_path in _pending_jobs
+
+
+def submit_genre_extraction(spotify_api, database, artists: List[str] = None, max_artists: int = 50) -> bool:
+    """
+    Queue genre extraction on the background worker pool.
+
+    Args:
+        spotify_api: SpotifyAPI instance used for the artist lookups
+        database: SpotifyDatabase the genres are written to
+        artists: Specific artists to process (default: artists from recent tracks)
+        max_artists: Maximum number of recent-track artists to process
+
+    Returns:
+        True if a job was queued, False if one is already running for this database
+    """
+    job_key = database.db_path
+    with _pending_lock:
+        if job_key in _pending_jobs:
+            logger.info(f"Genre extraction already running for {job_key}")
+            return False
+        _pending_jobs.add(job_key)
+
+    def _run():
+        try:
+            extractor = GenreExtractor(spotify_api, database)
+            if artists:
+                return extractor.extract_genres_for_artists(artists)
+            return extractor.extract_genres_from_recent_tracks(max_artists=max_artists)
+        except Exception as e:
+            logger.error(f"Background genre extraction failed: {e}")
+            return 0
+        finally:
+            with _pending_lock:
+                _pending_jobs.discard(job_key)
+
+    _genre_executor.submit(_run)
+    return True
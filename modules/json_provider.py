@@ -0,0 +1,45 @@
+"""Flask JSON provider backed by orjson, used when orjson is installed."""
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    Encode API responses with orjson instead of the stdlib json module.
+
+    Output matches DefaultJSONProvider: keys are sorted, dates go through Flask's
+    default handler (HTTP date strings) and numpy values serialize natively.
+    Calls that pass stdlib json keyword arguments fall back to the default provider.
+    """
+
+    if ORJSON_AVAILABLE:
+        option = (orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS |
+                  orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME)
+
+    def _dumps_bytes(self, obj) -> bytes:
+        return orjson.dumps(obj, default=self.default, option=self.option)
+
+    def dumps(self, obj, **kwargs) -> str:
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return self._dumps_bytes(obj).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._dumps_bytes(obj), mimetype=self.mimetype)
+
+
+def install_json_provider(app):
+    """Switch the app to the orjson provider if orjson is available."""
+    if ORJSON_AVAILABLE:
+        app.json = OrjsonProvider(app)
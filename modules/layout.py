@@ -1,4 +1,5 @@
 import dash
+from functools import lru_cache
 from dash import html, dcc
 import dash_bootstrap_components as dbc
 from modules.visualizations import (
@@ -514,8 +515,12 @@ class DashboardLayout:
         # This is just a placeholder that returns an empty div
         return html.Div(id="css-container", style={"display": "none"})
 
+@lru_cache(maxsize=1)
 def create_onboarding_page():
-    """Create the layout for the onboarding page with futuristic cyberpunk styling."""
+    """
+    Create the layout for the onboarding page with futuristic cyberpunk styling.
+    The page has no per-user content, so the tree is built once and shared.
+    """
     return html.Div([
         # Animated background particles
         html.Div([
@@ -1029,8 +1034,9 @@ def create_onboarding_page():
         'overflow': 'hidden'
     })
 
+@lru_cache(maxsize=1)
 def create_settings_page():
-    """Create the layout for the settings page."""
+    """Create the layout for the settings page, built once since nothing in it is per-user."""
     return html.Div([
         html.Div([
             html.H2("⚙️ Settings", style={'color': SPOTIFY_GREEN, 'textAlign': 'center', 'marginBottom': '20px'}),
@@ -1,7 +1,7 @@
 """Module for collecting a larger number of recently played tracks."""
 import logging
 import time
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Any
 
 logger = logging.getLogger(__name__)
@@ -30,6 +30,11 @@ class RecentTracksCollector:
         all_tracks = []
         before_timestamp = None
         
+        # Plays at or before this point are already stored, so stop paginating once we reach them
+        latest_known_ms = self.db.get_latest_played_at_ms(user_id)
+        if latest_known_ms:
+            logger.info(f"Only fetching tracks played after {latest_known_ms}")
+        
         # Spotify API has a limit of 50 tracks per call, so we need to paginate
         while len(all_tracks) < max_tracks:
             try:
@@ -41,34 +46,31 @@ class RecentTracksCollector:
                     break
                 
                 logger.info(f"Retrieved {len(tracks)} tracks")
-                all_tracks.extend(tracks)
                 
                 # Update the timestamp for the next request
                 # We use the played_at time of the last track as the 'before' parameter
-                last_track = tracks[-1]
-                played_at = last_track.get('played_at')
+                last_played_ms = self._played_at_ms(tracks[-1])
+                if last_played_ms is None:
+                    logger.error("Last track has no usable played_at timestamp")
+                    all_tracks.extend(tracks)
+                    break
                 
-                if played_at:
-                    try:
-                        # Parse the timestamp
-                        if 'Z' in played_at:
-                            dt = datetime.fromisoformat(played_at.replace('Z', '+00:00'))
-                        elif 'T' in played_at and ('+' in played_at or '-' in played_at.split('T')[1]):
-                            dt = datetime.fromisoformat(played_at)
-                        else:
-                            dt = datetime.fromisoformat(played_at)
-                        
-                        # Convert to timestamp for the next request
-                        # Subtract 1 millisecond to avoid getting the same track again
-                        before_timestamp = dt.timestamp() * 1000 - 1
-                        logger.info(f"Next request will fetch tracks before {dt}")
-                    except ValueError as e:
-                        logger.error(f"Error parsing timestamp: {e}")
-                        break
-                else:
-                    logger.error("Last track has no played_at timestamp")
+                # Subtract 1 millisecond to avoid getting the same track again
+                before_timestamp = last_played_ms - 1
+                logger.info(f"Next request will fetch tracks before {before_timestamp}")
+                
+                # This page reaches back into plays we already have - keep only the new ones
+                if latest_known_ms and before_timestamp < latest_known_ms:
+                    new_tracks = [
+                        track for track in tracks
+                        if self._played_at_ms(track) is None or self._played_at_ms(track) > latest_known_ms
+                    ]
+                    all_tracks.extend(new_tracks)
+                    logger.info(f"Caught up with stored history after {len(new_tracks)} new tracks")
                     break
                 
+                all_tracks.extend(tracks)
+                
                 # Add a delay to avoid rate limiting
                 self._handle_rate_limit()
                 
@@ -85,16 +87,42 @@ class RecentTracksCollector:
         logger.info(f"Collected and saved {len(all_tracks)} recently played tracks")
         return len(all_tracks)
     
+    def _played_at_ms(self, track: Dict[str, Any]):
+        """
+        Return a track's played_at as a Unix timestamp in milliseconds, or None.
+        
+        The parsed value is cached on the track so pagination and filtering
+        only parse each timestamp once.
+        """
+        if '_played_at_ms' in track:
+            return track['_played_at_ms']
+        
+        played_at_ms = None
+        played_at = track.get('played_at')
+        if played_at:
+            try:
+                dt = datetime.fromisoformat(played_at.replace('Z', '+00:00'))
+                if dt.tzinfo is None:
+                    dt = dt.replace(tzinfo=timezone.utc)
+                played_at_ms = int(dt.timestamp() * 1000)
+            except ValueError as e:
+                logger.error(f"Error parsing timestamp: {e}")
+        
+        track['_played_at_ms'] = played_at_ms
+        return played_at_ms
+    
     def _save_tracks_batch(self, tracks: List[Dict[str, Any]], user_id: str, source: str):
-        """Save a batch of tracks and their listening history."""
+        """Save a batch of tracks and their listening history in a single transaction."""
+        tracks_buffer = []
+        history_buffer = []
+
         for track in tracks:
             try:
-                # Save track data
-                self.db.save_track(track)
-                
+                tracks_buffer.append(track)
+
                 # Get timestamp (played_at)
                 timestamp = track.get('played_at')
-                
+
                 # Normalize timestamp to ISO format without timezone info
                 if timestamp:
                     try:
@@ -105,7 +133,7 @@ class RecentTracksCollector:
                             dt = datetime.fromisoformat(timestamp)
                         else:
                             dt = datetime.fromisoformat(timestamp)
-                        
+
                         # Convert to naive datetime in ISO format
                         played_at = dt.replace(tzinfo=None).isoformat()
                     except ValueError:
@@ -114,18 +142,17 @@ class RecentTracksCollector:
                 else:
                     # If no timestamp, use current time
                     played_at = datetime.now().isoformat()
-                
-                # Save listening history
-                self.db.save_listening_history(
-                    user_id=user_id,
-                    track_id=track['id'],
-                    played_at=played_at,
-                    source=source
-                )
-                
+
+                history_buffer.append((user_id, track['id'], played_at, source))
+
             except Exception as e:
-                logger.error(f"Error saving track {track.get('id')}: {e}")
-    
+                logger.error(f"Error preparing track {track.get('id')}: {e}")
+
+        try:
+            self.db.save_tracks_with_history_bulk(tracks_buffer, history_buffer)
+        except Exception as e:
+            logger.error(f"Error saving batch of {len(tracks_buffer)} tracks: {e}")
+
     def _handle_rate_limit(self):
         """Handle rate limiting with exponential backoff."""
         time.sleep(self.rate_limit_delay)
@@ -546,36 +546,40 @@ class SampleDataGenerator:
                     user_profile['id'], user_profile['display_name'], user_profile['followers']
                 ))
 
-                # Insert tracks with audio features
-                for track in top_tracks:
-                    cursor.execute('''
-                        INSERT OR REPLACE INTO tracks (
-                            track_id, name, artist, album, duration_ms, popularity,
-                            preview_url, image_url, added_at, last_seen,
-                            danceability, energy, key, loudness, mode,
-                            speechiness, acousticness, instrumentalness,
-                            liveness, valence, tempo
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP,
-                                  ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
+                # Insert tracks with audio features; one executemany per table inside
+                # the connection's single transaction
+                added_at = datetime.now().isoformat()
+                cursor.executemany('''
+                    INSERT OR REPLACE INTO tracks (
+                        track_id, name, artist, album, duration_ms, popularity,
+                        preview_url, image_url, added_at, last_seen,
+                        danceability, energy, key, loudness, mode,
+                        speechiness, acousticness, instrumentalness,
+                        liveness, valence, tempo
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP,
+                              ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', [
+                    (
                         track['id'], track['track'], track['artist'], track['album'],
                         track['duration_ms'], track['popularity'], track.get('preview_url', ''),
-                        track.get('image_url', ''), datetime.now().isoformat(),
+                        track.get('image_url', ''), added_at,
                         track['danceability'], track['energy'], track['key'],
                         track['loudness'], track['mode'], track['speechiness'],
                         track['acousticness'], track['instrumentalness'],
                         track['liveness'], track['valence'], track['tempo']
-                    ))
+                    )
+                    for track in top_tracks
+                ])
 
                 # Insert listening history (matching existing schema)
-                for entry in listening_history:
-                    cursor.execute('''
-                        INSERT OR REPLACE INTO listening_history (
-                            user_id, track_id, played_at, source
-                        ) VALUES (?, ?, ?, ?)
-                    ''', (
-                        entry['user_id'], entry['track_id'], entry['played_at'], 'sample'
-                    ))
+                cursor.executemany('''
+                    INSERT OR REPLACE INTO listening_history (
+                        user_id, track_id, played_at, source
+                    ) VALUES (?, ?, ?, ?)
+                ''', [
+                    (entry['user_id'], entry['track_id'], entry['played_at'], 'sample')
+                    for entry in listening_history
+                ])
 
                 conn.commit()
                 print(f"✅ Sample database populated with {len(top_tracks)} tracks and {len(listening_history)} listening entries")
@@ -10,6 +10,29 @@ from modules.visualizations import create_spotify_card, SPOTIFY_GREEN, SPOTIFY_B
 LIGHT_GRAY = '#B3B3B3'  # Much lighter than SPOTIFY_GRAY for better readability
 MEDIUM_GRAY = '#9B9B9B'  # Medium gray for secondary text
 
+# Static styles for the trigger/recommendation lists, shared by every item instead of rebuilt per render
+_TRIGGER_CARD_STYLE = {
+    'padding': '10px',
+    'backgroundColor': 'rgba(255, 255, 255, 0.05)',
+    'borderRadius': '8px',
+    'marginBottom': '10px',
+    'border': '1px solid rgba(255, 255, 255, 0.1)'
+}
+_TRIGGER_TEXT_STYLE = {'color': LIGHT_GRAY, 'fontSize': '0.9rem', 'margin': '5px 0 0 0'}
+_REC_ICONS = {'calming': '🧘', 'sleep': '😴', 'stability': '⚖️', 'focus': '🎯', 'motivation': '⚡', 'general': '💡'}
+_REC_CARD_STYLE = {
+    'padding': '12px',
+    'backgroundColor': 'rgba(29, 185, 84, 0.1)',
+    'borderRadius': '8px',
+    'marginBottom': '10px',
+    'border': '1px solid rgba(29, 185, 84, 0.3)'
+}
+_REC_TITLE_STYLE = {'fontWeight': 'bold', 'color': SPOTIFY_GREEN}
+_REC_DESCRIPTION_STYLE = {'color': SPOTIFY_WHITE, 'fontSize': '0.9rem', 'margin': '5px 0'}
+_REC_EVIDENCE_STYLE = {'color': '#00D4FF', 'fontSize': '0.8rem', 'fontStyle': 'italic', 'margin': '5px 0'}
+_REC_EVIDENCE_ICON_STYLE = {'marginRight': '5px', 'color': '#00D4FF'}
+_REC_ACTION_STYLE = {'color': LIGHT_GRAY, 'fontSize': '0.8rem', 'margin': '0'}
+
 def create_enhanced_stress_analysis_card(stress_data: dict) -> html.Div:
     """Create an enhanced stress analysis card with visualizations."""
     
@@ -397,15 +420,8 @@ def create_personal_triggers_display(triggers: list) -> html.Div:
                     html.Span("⚠️", style={'marginRight': '8px'}),
                     html.Span(trigger.get('trigger', ''), style={'fontWeight': 'bold'})
                 ]),
-                html.P(trigger.get('recommendation', ''),
-                      style={'color': LIGHT_GRAY, 'fontSize': '0.9rem', 'margin': '5px 0 0 0'})
-            ], style={
-                'padding': '10px',
-                'backgroundColor': 'rgba(255, 255, 255, 0.05)',
-                'borderRadius': '8px',
-                'marginBottom': '10px',
-                'border': '1px solid rgba(255, 255, 255, 0.1)'
-            })
+                html.P(trigger.get('recommendation', ''), style=_TRIGGER_TEXT_STYLE)
+            ], style=_TRIGGER_CARD_STYLE)
         )
     
     return html.Div(trigger_items)
@@ -417,11 +433,10 @@ def create_stress_recommendations_display(recommendations: list) -> html.Div:
                        style={'color': SPOTIFY_GRAY, 'textAlign': 'center', 'padding': '10px'})
 
     rec_items = []
-    icons = {'calming': '🧘', 'sleep': '😴', 'stability': '⚖️', 'focus': '🎯', 'motivation': '⚡', 'general': '💡'}
 
     for rec in recommendations[:3]:  # Limit to 3 recommendations
         rec_type = rec.get('type', 'general')
-        icon = icons.get(rec_type, '💡')
+        icon = _REC_ICONS.get(rec_type, '💡')
         confidence = rec.get('confidence', 0.5)
 
         # Confidence indicator color
@@ -431,26 +446,19 @@ def create_stress_recommendations_display(recommendations: list) -> html.Div:
             html.Div([
                 html.Div([
                     html.Span(icon, style={'marginRight': '8px'}),
-                    html.Span(rec.get('title', ''), style={'fontWeight': 'bold', 'color': SPOTIFY_GREEN}),
+                    html.Span(rec.get('title', ''), style=_REC_TITLE_STYLE),
                     html.Span(f" ({confidence:.0%} confidence)",
                              style={'fontSize': '0.8rem', 'color': conf_color, 'marginLeft': '8px'})
                 ]),
-                html.P(rec.get('description', ''),
-                      style={'color': SPOTIFY_WHITE, 'fontSize': '0.9rem', 'margin': '5px 0'}),
+                html.P(rec.get('description', ''), style=_REC_DESCRIPTION_STYLE),
                 # Evidence-based information
                 html.P([
-                    html.I(className="fas fa-flask", style={'marginRight': '5px', 'color': '#00D4FF'}),
+                    html.I(className="fas fa-flask", style=_REC_EVIDENCE_ICON_STYLE),
                     rec.get('evidence', 'Based on music therapy research')
-                ], style={'color': '#00D4FF', 'fontSize': '0.8rem', 'fontStyle': 'italic', 'margin': '5px 0'}),
+                ], style=_REC_EVIDENCE_STYLE),
                 html.P(f"Action: {rec.get('action', 'Apply this technique during identified stress periods')}",
-                      style={'color': LIGHT_GRAY, 'fontSize': '0.8rem', 'margin': '0'})
-            ], style={
-                'padding': '12px',
-                'backgroundColor': 'rgba(29, 185, 84, 0.1)',
-                'borderRadius': '8px',
-                'marginBottom': '10px',
-                'border': '1px solid rgba(29, 185, 84, 0.3)'
-            })
+                      style=_REC_ACTION_STYLE)
+            ], style=_REC_CARD_STYLE)
         )
 
     return html.Div(rec_items)
@@ -22,7 +22,7 @@ def get_top_albums(spotify_api, limit=10, user_db=None):
     Returns:
         DataFrame with enhanced album data including completion rates and listening time
     """
-    from modules.database import SpotifyDatabase
+    from modules.database import SpotifyDatabase, get_thread_connection
     import sqlite3
     from datetime import datetime
 
@@ -33,8 +33,8 @@ def get_top_albums(spotify_api, limit=10, user_db=None):
             print("❌ ERROR: get_top_albums called without user_db parameter")
             return pd.DataFrame()
 
-        conn = sqlite3.connect(user_db.db_path)
-        conn.row_factory = sqlite3.Row
+        # Read-only, on this thread's persistent connection
+        conn = get_thread_connection(user_db.db_path)
         cursor = conn.cursor()
 
         current_date = datetime.now().strftime('%Y-%m-%d')
@@ -47,25 +47,24 @@ def get_top_albums(spotify_api, limit=10, user_db=None):
             return pd.DataFrame()
         user_id = user_result[0]
 
-        # Enhanced album ranking query with completion rate and listening time
-        cursor.execute('''
-            WITH album_stats AS (
+        # Enhanced album ranking query with completion rate and listening time,
+        # read straight into a typed DataFrame instead of via per-row dicts.
+        # Cover URLs stay out of the ranking so the sorter only carries short
+        # columns; they are looked up for the top rows afterwards
+        albums_df = pd.read_sql_query('''
+            WITH track_plays AS (
+                -- One row per played track; album/artist/duration are bare columns
+                -- that SQLite takes from the track row, so no DISTINCT is needed
                 SELECT
+                    t.track_id,
                     t.album,
                     t.artist,
-                    MAX(t.image_url) as image_url,
-                    COUNT(DISTINCT h.history_id) as total_plays,
-                    COUNT(DISTINCT t.track_id) as unique_tracks_played,
-                    SUM(CASE
+                    t.popularity,
+                    COUNT(*) as plays,
+                    COUNT(*) * (CASE
                         WHEN t.duration_ms > 0 THEN t.duration_ms
                         ELSE 180000
-                    END) as total_listening_time_ms,
-                    AVG(CASE
-                        WHEN t.duration_ms > 0 THEN t.duration_ms
-                        ELSE 180000
-                    END) as avg_track_duration_ms,
-                    MAX(t.popularity) as max_popularity,
-                    AVG(t.popularity) as avg_popularity
+                    END) as listening_time_ms
                 FROM tracks t
                 JOIN listening_history h ON t.track_id = h.track_id
                 WHERE h.user_id = ?
@@ -73,9 +72,24 @@ def get_top_albums(spotify_api, limit=10, user_db=None):
                 AND t.album != ''
                 AND t.track_id NOT LIKE 'artist-%'
                 AND t.track_id NOT LIKE 'genre-%'
-                AND date(h.played_at) <= ?
+                AND h.played_at < date(?, '+1 day')
                 AND h.source IN ('played', 'recently_played', 'current', 'saved')
-                GROUP BY t.album, t.artist
+                GROUP BY t.track_id
+            ),
+            album_stats AS (
+                SELECT
+                    album,
+                    artist,
+                    SUM(plays) as total_plays,
+                    COUNT(*) as unique_tracks_played,
+                    SUM(listening_time_ms) as total_listening_time_ms,
+                    SUM(listening_time_ms) * 1.0 / SUM(plays) as avg_track_duration_ms,
+                    MAX(popularity) as max_popularity,
+                    -- Play-weighted average, matching AVG() over the joined play rows
+                    SUM(popularity * plays) * 1.0 /
+                        SUM(CASE WHEN popularity IS NOT NULL THEN plays END) as avg_popularity
+                FROM track_plays
+                GROUP BY album, artist
                 HAVING total_plays >= 2  -- Minimum 2 plays per album
             ),
             album_completion AS (
@@ -114,7 +128,6 @@ def get_top_albums(spotify_api, limit=10, user_db=None):
             SELECT
                 album,
                 artist,
-                image_url,
                 total_plays,
                 unique_tracks_played,
                 completion_rate,
@@ -125,14 +138,27 @@ def get_top_albums(spotify_api, limit=10, user_db=None):
             FROM album_completion
             ORDER BY weighted_score DESC
             LIMIT ?
-        ''', (user_id, current_date, limit))
-
-        albums_data = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-
-        # Convert to DataFrame and add rank
-        if albums_data:
-            albums_df = pd.DataFrame(albums_data)
+        ''', conn, params=(user_id, current_date, limit),
+            dtype={'total_plays': 'int64', 'unique_tracks_played': 'int64'})
+
+        # Second phase: cover art for just the ranked albums
+        image_urls = {}
+        if not albums_df.empty:
+            albums = albums_df['album'].unique().tolist()
+            cursor.execute(f'''
+                SELECT album, artist, MAX(image_url)
+                FROM tracks
+                WHERE album IN ({','.join('?' * len(albums))})
+                AND track_id NOT LIKE 'artist-%'
+                AND track_id NOT LIKE 'genre-%'
+                GROUP BY album, artist
+            ''', albums)
+            image_urls = {(album, artist): image_url for album, artist, image_url in cursor.fetchall()}
+        albums_df.insert(2, 'image_url', [image_urls.get(key) for key in
+                                          zip(albums_df['album'], albums_df['artist'])])
+
+        # Add rank
+        if not albums_df.empty:
             albums_df['rank'] = range(1, len(albums_df) + 1)
 
             # Rename normalized_score to total_count for compatibility
@@ -140,10 +166,10 @@ def get_top_albums(spotify_api, limit=10, user_db=None):
 
             print(f"Enhanced album ranking returned {len(albums_df)} albums")
             if len(albums_df) > 0:
-                for i, album in albums_df.head(5).iterrows():
-                    print(f"  {album['rank']}. {album['album']} by {album['artist']}")
-                    print(f"     Plays: {album['total_plays']}, Tracks: {album['unique_tracks_played']}, "
-                          f"Completion: {album['completion_rate']:.1%}, Time: {album['total_listening_minutes']:.1f}min")
+                for album in albums_df.head(5).itertuples(index=False):
+                    print(f"  {album.rank}. {album.album} by {album.artist}")
+                    print(f"     Plays: {album.total_plays}, Tracks: {album.unique_tracks_played}, "
+                          f"Completion: {album.completion_rate:.1%}, Time: {album.total_listening_minutes:.1f}min")
 
             return albums_df
         else:
@@ -168,41 +194,24 @@ def get_top_albums_legacy(spotify_api, limit=10):
     # Get top tracks to extract their albums
     top_tracks = spotify_api.get_top_tracks(limit=50)
 
-    # Combine all data sources
+    # Combine all data sources as plain tuples; from_records builds the columns
+    # directly instead of hashing the same five keys for every track
     all_tracks = []
-
-    if recently_played:
-        for track in recently_played:
-            all_tracks.append({
-                'album': track.get('album_name', track.get('album', '')),
-                'artist': track.get('album_artist', track.get('artist', '')),
-                'count': 1,
-                'source': 'recently_played',
-                'image_url': track.get('album_image_url', track.get('image_url', ''))
-            })
-
-    if saved_tracks:
-        for track in saved_tracks:
-            all_tracks.append({
-                'album': track.get('album_name', track.get('album', '')),
-                'artist': track.get('album_artist', track.get('artist', '')),
-                'count': 2,  # Give saved tracks higher weight
-                'source': 'saved_tracks',
-                'image_url': track.get('album_image_url', track.get('image_url', ''))
-            })
-
-    if top_tracks:
-        for track in top_tracks:
-            all_tracks.append({
-                'album': track.get('album_name', track.get('album', '')),
-                'artist': track.get('album_artist', track.get('artist', '')),
-                'count': 3,  # Give top tracks highest weight
-                'source': 'top_tracks',
-                'image_url': track.get('album_image_url', track.get('image_url', ''))
-            })
+    # Top tracks weigh most, saved tracks indicate preference, plays count once
+    for source, tracks, count in (('recently_played', recently_played, 1),
+                                  ('saved_tracks', saved_tracks, 2),
+                                  ('top_tracks', top_tracks, 3)):
+        for track in tracks or []:
+            all_tracks.append((
+                track.get('album_name', track.get('album', '')),
+                track.get('album_artist', track.get('artist', '')),
+                count,
+                source,
+                track.get('album_image_url', track.get('image_url', ''))
+            ))
 
     # Create DataFrame
-    df = pd.DataFrame(all_tracks)
+    df = pd.DataFrame.from_records(all_tracks, columns=['album', 'artist', 'count', 'source', 'image_url'])
 
     if df.empty:
         return pd.DataFrame(columns=['album', 'artist', 'image_url', 'total_count', 'rank'])
@@ -1610,7 +1610,7 @@ class SpotifyVisualizations:
             elif df['day_of_week'].dtype != 'object':
                 # Convert numeric day_of_week to day names
                 day_names = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
-                df['day_of_week'] = df['day_of_week'].astype(int).map(lambda x: day_names[x])
+                df['day_of_week'] = df['day_of_week'].astype(int).map(dict(enumerate(day_names)))
 
             # Ensure hour_of_day is an integer
             if df['hour_of_day'].dtype == 'object':
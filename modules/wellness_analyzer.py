@@ -1,9 +1,9 @@
 """Wellness analysis and therapeutic music suggestions."""
-import sqlite3
 import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 from typing import Dict, List
+from modules.database import get_thread_connection
 
 class WellnessAnalyzer:
     """Analyze listening patterns for wellness insights and therapeutic recommendations."""
@@ -23,7 +23,8 @@ class WellnessAnalyzer:
     
     def analyze_wellness_patterns(self, user_id: str) -> Dict:
         """Analyze user's listening patterns for wellness insights."""
-        conn = sqlite3.connect(self.db_path)
+        # Read-only, on this thread's persistent connection
+        conn = get_thread_connection(self.db_path)
         
         try:
             # Get recent listening data (last 30 days)
@@ -86,8 +87,6 @@ class WellnessAnalyzer:
         except Exception as e:
             print(f"Error analyzing wellness patterns: {e}")
             return self._default_wellness_response()
-        finally:
-            conn.close()
     
     def _detect_stress_patterns(self, df: pd.DataFrame) -> Dict:
         """Detect potential stress indicators in listening patterns."""
@@ -291,7 +290,8 @@ class WellnessAnalyzer:
     
     def _get_focus_recommendations(self, user_id: str) -> List[Dict]:
         """Get music recommendations for focus and concentration."""
-        conn = sqlite3.connect(self.db_path)
+        # Read-only, on this thread's persistent connection
+        conn = get_thread_connection(self.db_path)
         
         try:
             # Find instrumental tracks with moderate energy
@@ -315,12 +315,11 @@ class WellnessAnalyzer:
         except Exception as e:
             print(f"Error getting focus recommendations: {e}")
             return []
-        finally:
-            conn.close()
     
     def _get_relaxation_recommendations(self, user_id: str) -> List[Dict]:
         """Get music recommendations for relaxation."""
-        conn = sqlite3.connect(self.db_path)
+        # Read-only, on this thread's persistent connection
+        conn = get_thread_connection(self.db_path)
         
         try:
             # Find calm, acoustic tracks
@@ -344,8 +343,6 @@ class WellnessAnalyzer:
         except Exception as e:
             print(f"Error getting relaxation recommendations: {e}")
             return []
-        finally:
-            conn.close()
     
     def _default_wellness_response(self) -> Dict:
         """Return default wellness response when no data is available."""